@@ -1,2 +1,2 @@
 # CheckMyGrade package
-__all__ = ["models", "security", "storage", "reports"]
+__all__ = ["models", "security", "storage", "reports", "store", "aggregates", "csvio", "journal", "snapshot", "lazy", "views", "bench", "metrics", "concurrency", "server", "loadgen", "shards", "sqlstore", "backends", "batch", "names", "cache", "changes"]
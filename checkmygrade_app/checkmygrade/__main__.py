@@ -0,0 +1,23 @@
+"""python -m checkmygrade [apply OPS.jsonl ...]
+
+With no arguments, starts the interactive menu; `apply` runs a batch of
+operations without prompting (see checkmygrade/batch.py).
+"""
+import sys
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["apply"]:
+        from .batch import main as apply_main
+        return apply_main(argv[1:])
+    if argv:
+        print(__doc__.strip().splitlines()[0], file=sys.stderr)
+        return 2
+    from .main import main as menu_main
+    menu_main()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
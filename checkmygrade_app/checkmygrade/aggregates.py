@@ -0,0 +1,109 @@
+import bisect, math
+from collections import Counter
+from typing import Dict, List, Optional
+from .models import GRADE_LETTERS
+
+
+class CourseAggregate:
+    """Running count/sum, marks order statistics and grade distribution for one course.
+
+    Marks are kept as a count per distinct value plus a sorted list of those
+    values, so add/remove are O(log d) and median/percentile walk at most d
+    keys, where d is the number of distinct marks (<= 101 on a 0-100 scale)
+    rather than the number of students.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self._keys: List[int] = []
+        self._counts: Dict[int, int] = {}
+        self.grades: Counter = Counter()
+
+    @classmethod
+    def build(cls, records) -> "CourseAggregate":
+        # one pass over a course's records, for loads and index rebuilds
+        agg = cls()
+        marks = []
+        grades = []
+        for r in records:
+            marks.append(r.marks)
+            grades.append(r.grade)
+        agg.grades.update(grades)
+        counts = Counter(marks)
+        counts.pop(None, None)
+        agg._counts = dict(counts)
+        agg._keys = sorted(counts)
+        agg.count = sum(counts.values())
+        agg.total = sum(m * n for m, n in counts.items())
+        return agg
+
+    def __bool__(self) -> bool:
+        return self.count > 0 or bool(self.grades)
+
+    def add(self, marks: Optional[int], grade: str):
+        # the arithmetic goes first so a bad value raises before any counter moves
+        total = self.total + marks if marks is not None else self.total
+        self.grades[grade] += 1
+        if marks is None:
+            return
+        self.count += 1
+        self.total = total
+        n = self._counts.get(marks, 0)
+        if n == 0:
+            bisect.insort(self._keys, marks)
+        self._counts[marks] = n + 1
+
+    def remove(self, marks: Optional[int], grade: str):
+        total = self.total - marks if marks is not None else self.total
+        n = self._counts[marks] - 1 if marks is not None else 0
+        self.grades[grade] -= 1
+        if self.grades[grade] <= 0:
+            del self.grades[grade]
+        if marks is None:
+            return
+        self.count -= 1
+        self.total = total
+        if n == 0:
+            del self._counts[marks]
+            del self._keys[bisect.bisect_left(self._keys, marks)]
+        else:
+            self._counts[marks] = n
+
+    def kth(self, k: int) -> int:
+        # k-th smallest mark, 0-based
+        seen = 0
+        for m in self._keys:
+            seen += self._counts[m]
+            if k < seen:
+                return m
+        raise IndexError(k)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    @property
+    def median(self):
+        n = self.count
+        if not n:
+            return None
+        if n % 2:
+            return self.kth(n // 2)
+        return (self.kth(n // 2 - 1) + self.kth(n // 2)) / 2
+
+    def percentile(self, p: float) -> Optional[int]:
+        # nearest-rank percentile
+        if not self.count:
+            return None
+        if not 0 <= p <= 100:
+            raise ValueError("percentile must be between 0 and 100")
+        rank = max(1, math.ceil(p / 100 * self.count))
+        return self.kth(rank - 1)
+
+    def histogram(self) -> Dict[str, int]:
+        hist = {g: self.grades.get(g, 0) for g in GRADE_LETTERS}
+        for g, n in self.grades.items():
+            if g not in hist:
+                hist[g] = n
+        return hist
@@ -0,0 +1,30 @@
+import os
+from .cache import DEFAULT_RESULT_CACHE
+from .storage import CheckMyGradeDB
+
+BACKENDS = ("csv", "sqlite")
+
+
+def open_db(data_dir: str, backend: str = "csv", **options) -> CheckMyGradeDB:
+    # options go to the CSV backend (compact, journal, snapshot, sharded); sqlite takes path;
+    # both take result_cache (entries, 0 turns the result cache off) and change_log (entries kept, 0 = off)
+    if backend == "sqlite":
+        from .sqlstore import SqliteCheckMyGradeDB
+        return SqliteCheckMyGradeDB(data_dir, **options)
+    if backend != "csv":
+        raise ValueError("backend must be one of: " + ", ".join(BACKENDS))
+    return CheckMyGradeDB(data_dir, **options)
+
+
+def open_db_from_env(data_dir: str) -> CheckMyGradeDB:
+    # the CMG_* variables shared by the console app and the server
+    backend = os.environ.get("CMG_BACKEND", "csv")
+    result_cache = int(os.environ.get("CMG_RESULT_CACHE", DEFAULT_RESULT_CACHE))
+    change_log = int(os.environ.get("CMG_CHANGE_LOG", "0"))
+    if backend == "sqlite":
+        return open_db(data_dir, backend, result_cache=result_cache, change_log=change_log)
+    return open_db(data_dir, backend, result_cache=result_cache, change_log=change_log,
+                   compact=os.environ.get("CMG_COMPACT") == "1",
+                   journal=os.environ.get("CMG_JOURNAL") == "1",
+                   snapshot=os.environ.get("CMG_SNAPSHOT", "1") == "1",
+                   sharded=os.environ.get("CMG_SHARDED") == "1")
@@ -0,0 +1,174 @@
+"""Apply a stream of operations to the data directory in one process.
+
+    python -m checkmygrade apply ops.jsonl
+    python -m checkmygrade apply - < ops.jsonl
+
+One JSON call per line, in the server's format ({"op": ..., "args": {...}};
+see OPS in server.py). The data directory is loaded once, runs of
+consecutive add_student/update_student/delete_student calls go through the
+bulk methods, and everything is saved once at the end. Read results are
+written to stdout as JSON lines, errors and the per-op throughput summary
+to stderr. Data directory and backend come from the same CMG_* variables
+as the console app.
+"""
+import argparse, json, os, sys, time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from .backends import open_db_from_env
+from .models import Student
+from .server import OPS
+
+DEFAULT_BATCH_SIZE = 10000
+
+# single-row ops whose consecutive runs are applied with one bulk call
+BULK_OPS = {
+    "add_student": lambda db, rows: db.add_students(Student(**{"grade": "", **r}) for r in rows),
+    "update_student": lambda db, rows: db.update_students(
+        [(r["email"], {k: v for k, v in r.items() if k != "email"}) for r in rows]),
+    "delete_student": lambda db, rows: db.delete_students([r["email"] for r in rows]),
+}
+ERRORS = (ValueError, TypeError, KeyError)
+
+
+def read_calls(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    # (line number, decoded call); undecodable lines come back as the ValueError
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError as e:
+            yield n, e
+
+
+class BatchRunner:
+    """Runs calls against one db, batching student writes and tallying per op."""
+
+    def __init__(self, db, out: Optional[TextIO] = None, err: Optional[TextIO] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.db = db
+        self.out = out
+        self.err = err
+        self.batch_size = batch_size
+        # op -> {"count", "errors", "seconds"}
+        self.tally: Dict[str, Dict[str, float]] = {}
+        self.writes = 0
+        self._op: Optional[str] = None
+        self._pending: List[Tuple[int, dict]] = []
+        self._keys = set()
+
+    def _count(self, op: str, n: int, seconds: float, errors: int = 0):
+        t = self.tally.setdefault(op, {"count": 0, "errors": 0, "seconds": 0.0})
+        t["count"] += n
+        t["errors"] += errors
+        t["seconds"] += seconds
+
+    def _error(self, lineno: int, op: str, message: str):
+        if self.err is not None:
+            print(f"line {lineno}: {op}: {message}", file=self.err)
+
+    def _call(self, lineno: int, op: str, args: dict) -> bool:
+        write, fn = OPS[op]
+        try:
+            result = fn(self.db, **args)
+        except ERRORS as e:
+            self._error(lineno, op, str(e) or type(e).__name__)
+            return False
+        if write:
+            if result is False:
+                # update/delete of a key that does not exist
+                self._error(lineno, op, "not found")
+                return False
+            self.writes += 1
+        elif self.out is not None:
+            self.out.write(json.dumps({"line": lineno, "op": op, "result": result}) + "\n")
+        return True
+
+    def flush(self):
+        op, pending = self._op, self._pending
+        if not pending:
+            return
+        self._op, self._pending, self._keys = None, [], set()
+        t0 = time.perf_counter()
+        try:
+            BULK_OPS[op](self.db, [args for _, args in pending])
+            errors = 0
+            self.writes += len(pending)
+        except ERRORS:
+            # bulk calls change nothing when they fail; redo row by row to apply the good
+            # rows and report the bad ones
+            errors = sum(not self._call(lineno, op, args) for lineno, args in pending)
+        self._count(op, len(pending), time.perf_counter() - t0, errors)
+
+    def run(self, lineno: int, call):
+        if isinstance(call, ValueError):
+            self.flush()
+            self._error(lineno, "<invalid>", f"not valid JSON ({call})")
+            self._count("<invalid>", 1, 0.0, 1)
+            return
+        op = call.get("op") if isinstance(call, dict) else None
+        args = call.get("args") or {} if isinstance(call, dict) else None
+        if op not in OPS or not isinstance(args, dict):
+            self.flush()
+            self._error(lineno, str(op), "unknown op" if isinstance(args, dict) else "args must be an object")
+            self._count("<invalid>", 1, 0.0, 1)
+            return
+        if op in BULK_OPS:
+            key = args.get("email", args.get("email_address"))
+            if op != self._op or len(self._pending) >= self.batch_size or key in self._keys:
+                self.flush()
+            self._op = op
+            self._pending.append((lineno, args))
+            self._keys.add(key)
+            return
+        self.flush()
+        t0 = time.perf_counter()
+        ok = self._call(lineno, op, args)
+        self._count(op, 1, time.perf_counter() - t0, 0 if ok else 1)
+
+    def run_all(self, calls: Iterable[Tuple[int, object]]) -> Dict[str, Dict[str, float]]:
+        for lineno, call in calls:
+            self.run(lineno, call)
+        self.flush()
+        return self.tally
+
+
+def format_summary(tally: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'operation':20s} {'count':>8s} {'errors':>7s} {'seconds':>9s} {'ops/s':>10s}"]
+    for op, t in sorted(tally.items(), key=lambda kv: -kv[1]["count"]):
+        rate = t["count"] / t["seconds"] if t["seconds"] > 0 else 0.0
+        lines.append(f"{op:20s} {t['count']:8d} {t['errors']:7d} {t['seconds']:9.3f} {rate:10.0f}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m checkmygrade apply", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("ops", help="JSON-lines file of calls, or - for stdin")
+    ap.add_argument("--data-dir", default=os.environ.get("CMG_DATA_DIR", str(Path.cwd() / "data")))
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="most rows per bulk call")
+    ap.add_argument("--no-save", action="store_true", help="apply the calls but do not save")
+    args = ap.parse_args(argv)
+    t0 = time.perf_counter()
+    db = open_db_from_env(args.data_dir)
+    db.load_all()
+    t_load = time.perf_counter() - t0
+    runner = BatchRunner(db, sys.stdout, sys.stderr, max(1, args.batch_size))
+    t0 = time.perf_counter()
+    if args.ops == "-":
+        runner.run_all(read_calls(sys.stdin))
+    else:
+        with open(args.ops, "r", encoding="utf-8") as f:
+            runner.run_all(read_calls(f))
+    t_run = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    if runner.writes and not args.no_save:
+        db.save_all()
+    t_save = time.perf_counter() - t0
+    tally = runner.tally
+    total = sum(t["count"] for t in tally.values())
+    errors = sum(t["errors"] for t in tally.values())
+    print(format_summary(tally), file=sys.stderr)
+    print(f"{total} ops ({errors} errors) in {t_run:.3f}s, {total / t_run if t_run > 0 else 0:.0f} ops/s; "
+          f"load {t_load:.3f}s, save {t_save:.3f}s", file=sys.stderr)
+    return 1 if errors else 0
@@ -0,0 +1,193 @@
+"""Benchmark every CheckMyGradeDB operation on synthetic rosters.
+
+    python -m checkmygrade.bench --sizes 1000,10000,100000 --out bench.json
+    python -m checkmygrade.bench --sizes 1000,10000 --compare bench.json
+"""
+import argparse, json, platform, random, sys, tempfile, time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from .storage import CheckMyGradeDB
+from .models import Student, Course, Professor
+from .reports import render_course_report, render_professor_report, render_student_report
+
+FIRST_NAMES = ["Sam", "Alex", "Jamie", "Taylor", "Riley", "Jordan", "Cameron", "Avery", "Morgan", "Quinn"]
+LAST_NAMES = ["Kim", "Lopez", "Nguyen", "Carpenter", "Singh", "Patel", "Park", "Garcia", "Chen", "Okafor"]
+DEFAULT_SIZES = [1000, 10000, 100000]
+# slow whole-table operations get fewer samples on big rosters
+HEAVY_OPS = {"save_all", "load_all", "search_linear", "sort_email", "sort_marks", "sort_name", "sort_grade",
+             "login_cold"}
+
+
+def make_db(n: int, data_dir: str, courses: int = 40, seed: int = 7, **db_kwargs) -> CheckMyGradeDB:
+    rng = random.Random(seed)
+    db = CheckMyGradeDB(data_dir, **db_kwargs)
+    for c in range(courses):
+        db.add_course(Course(f"C{c:03d}", f"Course {c}", "", 3))
+        db.add_professor(Professor(f"prof{c}@mycsu.edu", f"Prof {c}", "Professor", f"C{c:03d}"))
+    for i in range(n):
+        db.add_student(Student(f"student{i}@mycsu.edu", rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                               f"C{i % courses:03d}", "", rng.randint(0, 100)))
+    return db
+
+
+def percentile(sorted_samples: List[float], p: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    k = min(len(sorted_samples) - 1, max(0, round(p / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[k]
+
+
+def measure(fn: Callable[[int], None], repeat: int, warmup: int) -> Dict[str, float]:
+    # fn(i) runs one sample; i lets it pick a fresh key each time
+    for i in range(warmup):
+        fn(-1 - i)
+    samples = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "n": len(samples),
+        "min": samples[0],
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 50),
+        "p90": percentile(samples, 90),
+        "p99": percentile(samples, 99),
+        "max": samples[-1],
+    }
+
+
+def bench_size(n: int, repeat: int, warmup: int, ops: Optional[List[str]] = None,
+               kdf_cost: Optional[int] = None, **db_kwargs) -> Dict[str, Dict[str, float]]:
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        # the result cache would turn repeated stats/report samples into lookups; time the computation
+        db = make_db(n, tmp.name, **{"result_cache": 0, **db_kwargs})
+        db.password_cost = kdf_cost
+        db.register_user("bench@mycsu.edu", "Bench12#_", role="professor")
+        db.save_all()
+        rng = random.Random(n)
+        emails = [f"student{rng.randrange(n)}@mycsu.edu" for _ in range(max(repeat, 1) + warmup + 1)]
+        heavy_repeat = repeat if n <= 10000 else max(3, repeat // 5)
+
+        def add(i):
+            db.add_student(Student(f"bench{i}@mycsu.edu", "Bench", "Mark", "C000", "", 50))
+
+        def update(i):
+            db.update_student(emails[i], marks=(i % 101))
+
+        def delete(i):
+            db.delete_student(f"bench{i}@mycsu.edu")
+
+        cases = [
+            ("add_student", add),
+            ("update_student", update),
+            ("delete_student", delete),
+            ("search_linear", lambda i: db.search_student_linear(emails[i])),
+            ("search_indexed", lambda i: db.search_student_indexed(emails[i])),
+            ("sort_email", lambda i: db.sort_students("email")),
+            ("sort_marks", lambda i: db.sort_students("marks", ascending=False)),
+            ("sort_name", lambda i: db.sort_students("name")),
+            ("sort_grade", lambda i: db.sort_students("grade")),
+            ("course_stats", lambda i: db.course_stats("C001")),
+            ("report_course", lambda i: render_course_report(db, "C001")),
+            ("report_professor", lambda i: render_professor_report(db, "prof2@mycsu.edu")),
+            ("report_student", lambda i: render_student_report(db, emails[i])),
+            ("save_all", lambda i: db.save_all()),
+            ("load_all", lambda i: db.load_all()),
+            ("login", lambda i: db.login("bench@mycsu.edu", "Bench12#_")),
+            ("login_cold", lambda i: (db._login_cache.clear(), db.login("bench@mycsu.edu", "Bench12#_"))),
+        ]
+        results = {}
+        for name, fn in cases:
+            if ops and name not in ops:
+                continue
+            r = heavy_repeat if name in HEAVY_OPS else repeat
+            results[name] = measure(fn, r, warmup)
+        return results
+    finally:
+        tmp.cleanup()
+
+
+def run(sizes: List[int], repeat: int = 20, warmup: int = 2, ops: Optional[List[str]] = None,
+        compact: bool = False, kdf_cost: Optional[int] = None, progress=None) -> dict:
+    out = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+            "warmup": warmup,
+            "compact": compact,
+            "kdf_cost": kdf_cost,
+        },
+        "results": {},
+    }
+    for n in sizes:
+        t0 = time.perf_counter()
+        out["results"][str(n)] = bench_size(n, repeat, warmup, ops, kdf_cost, compact=compact)
+        if progress:
+            progress(f"size {n}: done in {time.perf_counter() - t0:.1f}s")
+    return out
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2, stat: str = "p50") -> List[dict]:
+    # ops whose `stat` got slower than baseline by more than `threshold` (0.2 = 20%)
+    regressions = []
+    for size, ops in current["results"].items():
+        base_ops = baseline.get("results", {}).get(size, {})
+        for op, r in ops.items():
+            b = base_ops.get(op)
+            if not b or not b.get(stat):
+                continue
+            ratio = r[stat] / b[stat]
+            if ratio > 1 + threshold:
+                regressions.append({"size": int(size), "op": op, "baseline": b[stat],
+                                    "current": r[stat], "ratio": ratio})
+    return regressions
+
+
+def format_table(result: dict) -> str:
+    lines = [f"{'size':>8s} {'op':18s} {'p50 ms':>10s} {'p90 ms':>10s} {'p99 ms':>10s} {'n':>4s}"]
+    for size, ops in result["results"].items():
+        for op, r in ops.items():
+            lines.append(f"{size:>8s} {op:18s} {r['p50']*1000:10.3f} {r['p90']*1000:10.3f} "
+                         f"{r['p99']*1000:10.3f} {r['n']:4d}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m checkmygrade.bench", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                    help="comma-separated roster sizes (e.g. 1000,10000,100000,1000000)")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--ops", default="", help="comma-separated subset of operations")
+    ap.add_argument("--compact", action="store_true", help="use the column store")
+    ap.add_argument("--kdf-cost", type=int, help="password hashing cost for the login benchmarks")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", help="baseline JSON to check for regressions")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    args = ap.parse_args(argv)
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    ops = [x.strip() for x in args.ops.split(",") if x.strip()] or None
+    result = run(sizes, args.repeat, args.warmup, ops, args.compact, args.kdf_cost,
+                 progress=lambda msg: print(msg, file=sys.stderr))
+    print(format_table(result))
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION size={r['size']} {r['op']}: {r['baseline']*1000:.3f} ms -> "
+                  f"{r['current']*1000:.3f} ms ({r['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import functools, threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+DEFAULT_RESULT_CACHE = 128
+# version counters kept per table; names follow the journal's table names
+TABLES = ("students", "courses", "professors", "login_users", "grade_scales")
+
+_MISSING = object()
+
+
+class ResultCache:
+    """Bounded LRU of computed query/report results with hit/miss counts.
+
+    Keys carry the versions of the tables a result was computed from, so a
+    write never has to find and drop entries: it bumps a version, later
+    lookups build a different key, and the stale entries age out of the LRU.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_RESULT_CACHE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def _detached(value):
+    # lists and dicts are handed out as shallow copies so callers can't edit the cached one
+    t = type(value)
+    return value.copy() if t is list or t is dict else value
+
+
+def versioned(*tables: str):
+    """Cache a db method (or a function taking the db first) in db._results.
+
+    The key is the call's arguments plus the current versions of `tables`,
+    which must name every table the result reads. A result is only stored
+    if no version moved while it was computed.
+    """
+    def deco(fn):
+        name = fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(db, *args, **kwargs):
+            cache = db._results
+            if cache is None:
+                return fn(db, *args, **kwargs)
+            versions = db._table_versions(tables)
+            key = (name, args, tuple(kwargs.items()), versions)
+            try:
+                value = cache.get(key, _MISSING)
+            except TypeError:
+                # unhashable argument
+                return fn(db, *args, **kwargs)
+            if value is _MISSING:
+                value = fn(db, *args, **kwargs)
+                if db._table_versions(tables) == versions:
+                    cache.put(key, value)
+            return _detached(value)
+        return wrapper
+    return deco
@@ -0,0 +1,102 @@
+import csv, io, json, secrets
+from collections import deque
+from dataclasses import fields
+from itertools import islice
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+from .models import Course, Professor
+
+DEFAULT_RETENTION = 100_000
+CHANGE_FORMATS = ("jsonl", "csv")
+CHANGE_HEADERS = ["seq", "op", "table", "key", "data"]
+# tables whose row changes are captured (login_users holds password hashes and stays out)
+CHANGE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "students": ("email_address", "first_name", "last_name", "course_id", "grade", "marks"),
+    "courses": tuple(f.name for f in fields(Course)),
+    "professors": tuple(f.name for f in fields(Professor)),
+}
+
+# (seq, op, table, key, data): insert carries the whole row, update the changed fields, delete None
+Change = Tuple[int, str, str, str, Optional[dict]]
+
+
+class ChangeLog:
+    """Sequenced in-memory log of row changes, for mirrors that sync deltas.
+
+    seq grows by one per change and never goes back within a process. Only
+    the newest `retention` changes are kept, and reloading the data starts a
+    new log (new log_id) because the reload itself isn't a list of changes.
+    since() returns None whenever it can't give the complete delta: the seq
+    was trimmed, predates a reload, or belongs to another log_id (e.g.
+    before a restart). The caller then takes a full snapshot instead.
+    """
+
+    def __init__(self, retention: int = DEFAULT_RETENTION):
+        self.retention = retention
+        self._entries: "deque[Change]" = deque(maxlen=retention)
+        self.seq = 0
+        self.log_id = secrets.token_hex(8)
+        # seq at the last reset; nothing before it can be resumed from
+        self._base = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, op: str, table: str, key: str, data: Optional[dict] = None):
+        self.seq += 1
+        self._entries.append((self.seq, op, table, key, data))
+
+    def reset(self):
+        # skip a seq so cursors taken before the reset fall below the new floor
+        self._entries.clear()
+        self.log_id = secrets.token_hex(8)
+        self.seq += 1
+        self._base = self.seq
+
+    @property
+    def oldest(self) -> int:
+        # smallest seq that since() can still answer
+        return max(self._base, self.seq - len(self._entries))
+
+    def since(self, seq: int, log_id: Optional[str] = None) -> Optional[List[Change]]:
+        if (log_id is not None and log_id != self.log_id) or not self.oldest <= seq <= self.seq:
+            return None
+        # the delta is the newest seq - self.seq entries; walk from the right so this is O(delta)
+        delta = list(islice(reversed(self._entries), self.seq - seq))
+        delta.reverse()
+        return delta
+
+
+def change_dict(change: Change) -> dict:
+    seq, op, table, key, data = change
+    out = {"seq": seq, "op": op, "table": table, "key": key}
+    if data is not None:
+        out["row" if op == "insert" else "fields"] = data
+    return out
+
+
+def iter_change_lines(changes: Iterable[Change], fmt: str = "jsonl") -> Iterator[str]:
+    # one line per yield, without trailing newline; csv puts the row/fields in a JSON "data" column
+    if fmt == "jsonl":
+        for c in changes:
+            yield json.dumps(change_dict(c))
+    elif fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="")
+        writer.writerow(CHANGE_HEADERS)
+        yield buf.getvalue()
+        for seq, op, table, key, data in changes:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow((seq, op, table, key, "" if data is None else json.dumps(data)))
+            yield buf.getvalue()
+    else:
+        raise ValueError("fmt must be one of: " + ", ".join(CHANGE_FORMATS))
+
+
+def write_lines(lines: Iterable[str], sink: IO[str]) -> int:
+    n = 0
+    write = sink.write
+    for n, line in enumerate(lines, 1):
+        write(line)
+        write("\n")
+    return n
@@ -0,0 +1,135 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+# CheckMyGradeDB methods that never change table contents; anything else takes the write lock
+READ_OPS = frozenset({
+    "search_student_linear", "search_student_indexed", "sorted_students", "students_page", "top_n", "bottom_n",
+    "students_in_range", "count_in_range", "count_above", "count_below", "student_rank", "student_percentile",
+    "grade_scale", "course_stats", "course_percentile", "course_histogram", "report_course_wise",
+    "iter_course_wise", "report_student", "report_professor_wise", "iter_professor_wise", "login",
+    "export_students", "search_names", "fuzzy_search_names", "complete_name", "result_cache_stats",
+    "table_versions", "change_cursor", "changes_since", "export_changes",
+})
+
+
+class RWLock:
+    """Many readers or one writer; waiting writers block new readers.
+
+    Both sides are reentrant per thread, and a thread holding the write lock
+    may also take the read lock. Upgrading a read lock to a write lock would
+    deadlock, so it raises instead.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def acquire_read(self):
+        local = self._local
+        depth = getattr(local, "reads", 0)
+        if depth:
+            local.reads = depth + 1
+            return
+        if self._writer == threading.get_ident():
+            # nested inside our own write lock; not counted as a reader
+            local.reads, local.counted = 1, False
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        local.reads, local.counted = 1, True
+
+    def release_read(self):
+        local = self._local
+        local.reads -= 1
+        if local.reads or not local.counted:
+            return
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if getattr(self._local, "reads", 0):
+                raise RuntimeError("cannot upgrade a read lock to a write lock")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class SharedDB:
+    """Thread-safe facade over one in-memory CheckMyGradeDB.
+
+    Method calls are forwarded under the read lock (READ_OPS) or the write
+    lock (everything else). Iterators are drained while the lock is held, so
+    callers always get a list. Use `with shared.read() as db:` or
+    `with shared.write() as db:` to run several calls as one unit.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = RWLock()
+
+    @contextmanager
+    def read(self) -> Iterator:
+        with self.lock.read():
+            yield self.db
+
+    @contextmanager
+    def write(self) -> Iterator:
+        with self.lock.write():
+            yield self.db
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        section = self.lock.read if name in READ_OPS else self.lock.write
+
+        def call(*args, **kwargs):
+            with section():
+                result = attr(*args, **kwargs)
+                if hasattr(result, "__next__"):
+                    result = list(result)
+                return result
+        call.__name__ = name
+        return call
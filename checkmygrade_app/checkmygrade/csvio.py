@@ -0,0 +1,103 @@
+import csv, gc, os, sys, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+from .models import Student, grade_from_marks, parse_marks
+
+DEFAULT_BATCH_SIZE = 10000
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def iter_row_batches(path: Path, headers: Sequence[str],
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[list]]:
+    # Rows come back positionally in `headers` order, whatever the file's column order.
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [h.strip() for h in header]
+        width = len(headers)
+        cols: Optional[List[Optional[int]]] = None
+        if header[:width] != list(headers):
+            pos = {h: i for i, h in enumerate(header)}
+            cols = [pos.get(h) for h in headers]
+        batch = []
+        for row in reader:
+            if not row:
+                continue
+            if cols is not None:
+                n = len(row)
+                row = [row[i] if i is not None and i < n else "" for i in cols]
+            elif len(row) != width:
+                row = (row + [""] * width)[:width]
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def rows_to_students(rows: Iterable[list], grade_for: Optional[Callable[[str, int], str]] = None) -> List[Student]:
+    # grade_for(course_id, marks) fills in blank grades; defaults to the standard scale
+    # course ids and grades repeat across rows, so share one str object per value
+    intern = sys.intern
+    out = []
+    append = out.append
+    for email, first, last, course_id, grade, marks in rows:
+        marks = marks.strip()
+        marks = parse_marks(marks) if marks else None
+        course_id = course_id.strip()
+        grade = grade.strip() or ("" if marks is None else
+                                  grade_for(course_id, marks) if grade_for else grade_from_marks(marks))
+        append(Student(email.strip(), first.strip(), last.strip(),
+                       intern(course_id), intern(grade),
+                       marks if marks is not None else 0))
+    return out
+
+
+def iter_student_batches(path: Path, headers: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                         grade_for: Optional[Callable[[str, int], str]] = None) -> Iterator[List[Student]]:
+    for rows in iter_row_batches(path, headers, batch_size):
+        yield rows_to_students(rows, grade_for)
+
+
+def write_rows(path: Path, headers: Sequence[str], rows: Iterable[Sequence],
+               buffer_size: int = WRITE_BUFFER_SIZE) -> int:
+    # written to a temp file and renamed, so a crash never leaves a half-written table
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    count = 0
+    with open(tmp, "w", newline="", encoding="utf-8", buffering=buffer_size) as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return count
+
+
+def student_rows(students: Iterable[Student]) -> Iterator[tuple]:
+    for s in students:
+        yield (s.email_address, s.first_name, s.last_name, s.course_id, s.grade, s.marks)
+
+
+@contextmanager
+def gc_paused():
+    # bulk loads allocate millions of objects that all survive; letting the
+    # cyclic GC rescan them every few thousand allocations dominates load time
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def io_stats(rows: int, t0: float) -> dict:
+    seconds = time.perf_counter() - t0
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds > 0 else 0.0}
@@ -0,0 +1,75 @@
+import json, os
+from pathlib import Path
+from typing import Iterator, Optional
+
+# records after which save_all() folds the journal into the CSVs instead of only syncing it
+JOURNAL_COMPACT_AT = 10_000
+
+
+class Journal:
+    """Append-only JSON-lines change log kept next to the CSV snapshot.
+
+    Each record is one line: {"op": "add"|"update"|"delete", "table": ...,
+    "key": ..., "row"/"fields": ...}. Records only carry absolute values, so
+    replaying the log over a snapshot that already contains some of its
+    changes (a compaction that stopped before truncate()) converges to the
+    same state, as long as replay skips renames whose target already exists
+    (CheckMyGradeDB._replay_update).
+    """
+
+    def __init__(self, path: Path, fsync: bool = False):
+        self.path = Path(path)
+        self.fsync = fsync
+        self._f = None
+        # records in the file (replayed or appended) since it was last truncated
+        self.pending = 0
+
+    def _open(self):
+        if self._f is None:
+            self._f = open(self.path, "a", encoding="utf-8")
+        return self._f
+
+    def append(self, op: str, table: str, key: Optional[str] = None, **payload):
+        rec = {"op": op, "table": table}
+        if key is not None:
+            rec["key"] = key
+        rec.update(payload)
+        f = self._open()
+        f.write(json.dumps(rec, separators=(",", ":")) + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self.pending += 1
+
+    def sync(self):
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def replay(self) -> Iterator[dict]:
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # torn final write from a crash; nothing after it was acknowledged
+                    return
+
+    def truncate(self):
+        self.close()
+        with open(self.path, "w", encoding="utf-8") as f:
+            os.fsync(f.fileno())
+        self.pending = 0
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __len__(self) -> int:
+        if not self.path.exists():
+            return 0
+        with open(self.path, "rb") as f:
+            return sum(1 for _ in f)
@@ -0,0 +1,231 @@
+import csv, hashlib, mmap, os, struct, sys, time
+from array import array
+from pathlib import Path
+from typing import List, Optional, Tuple
+from .models import Student
+from .csvio import rows_to_students
+from .metrics import instrument
+from .storage import CheckMyGradeDB, STUDENT_HEADERS
+
+IDX_MAGIC = b"CMGIDX\x00\x00"
+IDX_VERSION = 1
+_IDX_HEADER = struct.Struct("<8sIQqQ")   # magic, version, csv size, csv mtime_ns, table slots
+_ENTRY = struct.Struct("<QQ")            # email hash, csv offset + 1 (0 = empty)
+
+
+def _email_hash(email: str) -> int:
+    return int.from_bytes(hashlib.blake2b(email.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _read_record(f) -> Tuple[int, bytes]:
+    # one CSV record starting at the current position; quoted newlines continue it
+    start = f.tell()
+    line = f.readline()
+    while line.count(b'"') % 2:
+        more = f.readline()
+        if not more:
+            break
+        line += more
+    return start, line
+
+
+def _column_map(header: List[str]) -> Optional[List[Optional[int]]]:
+    header = [h.strip() for h in header]
+    if header[:len(STUDENT_HEADERS)] == STUDENT_HEADERS:
+        return None
+    pos = {h: i for i, h in enumerate(header)}
+    return [pos.get(h) for h in STUDENT_HEADERS]
+
+
+def _split(line: bytes) -> List[str]:
+    return next(csv.reader([line.decode("utf-8")]), [])
+
+
+def _parse(line: bytes, cols) -> List[str]:
+    row = _split(line)
+    if cols is not None:
+        n = len(row)
+        return [row[i] if i is not None and i < n else "" for i in cols]
+    return (row + [""] * len(STUDENT_HEADERS))[:len(STUDENT_HEADERS)]
+
+
+def build_offset_index(csv_path: Path, idx_path: Path):
+    """Write an open-addressing email -> byte offset table for csv_path."""
+    st = csv_path.stat()
+    entries = []
+    with open(csv_path, "rb") as f:
+        _, header = _read_record(f)
+        cols = _column_map(_split(header))
+        while True:
+            off, line = _read_record(f)
+            if not line:
+                break
+            if not line.strip():
+                continue
+            email = _parse(line, cols)[0].strip()
+            if email:
+                entries.append((_email_hash(email), off))
+    size = 8
+    while size < 2 * len(entries):
+        size *= 2
+    mask = size - 1
+    table = array("Q", bytes(16 * size))
+    if table.itemsize != 8:
+        raise RuntimeError("array('Q') must be 64-bit")
+    for h, off in entries:
+        i = h & mask
+        # later duplicates replace earlier ones, matching load_students
+        while table[2 * i + 1] and table[2 * i] != h:
+            i = (i + 1) & mask
+        table[2 * i] = h
+        table[2 * i + 1] = off + 1
+    tmp = idx_path.with_name(idx_path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_IDX_HEADER.pack(IDX_MAGIC, IDX_VERSION, st.st_size, st.st_mtime_ns, size))
+        if sys.byteorder != "little":
+            table.byteswap()
+        f.write(table.tobytes())
+    os.replace(tmp, idx_path)
+
+
+class _LazyTable:
+    # attribute that runs its group's loader on first read
+    def __init__(self, group: str):
+        self.group = group
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, db, owner=None):
+        if db is None:
+            return self
+        if self.group not in db._loaded:
+            db._loaded.add(self.group)
+            getattr(db, "load_" + self.group)()
+        return db.__dict__[self.name]
+
+    def __set__(self, db, value):
+        db.__dict__[self.name] = value
+
+
+@instrument("lazy")
+class LazyCheckMyGradeDB(CheckMyGradeDB):
+    """CheckMyGradeDB that reads tables on first use.
+
+    Student point lookups (search_student_indexed, report_student and the
+    reports built on them) go through a persisted email -> byte offset index
+    (students.idx) and decode only the row they hit. Anything that needs the
+    whole roster (writes, sorting, course/professor reports, stats) loads
+    students.csv once on first use, after which the DB behaves normally.
+    """
+
+    students = _LazyTable("students")
+    _course_members = _LazyTable("students")
+    _course_aggs = _LazyTable("students")
+    _views = _LazyTable("students")
+    _marks_index = _LazyTable("students")
+    _names = _LazyTable("students")
+    courses = _LazyTable("courses")
+    _course_index = _LazyTable("courses")
+    professors = _LazyTable("professors")
+    _professor_courses = _LazyTable("professors")
+    _professor_index = _LazyTable("professors")
+    _course_professors = _LazyTable("professors")
+    login_users = _LazyTable("logins")
+    _login_index = _LazyTable("logins")
+    grade_ranges = _LazyTable("grade_ranges")
+    _grade_tables = _LazyTable("grade_ranges")
+
+    def __init__(self, data_dir: str, compact: bool = False):
+        self._loaded = set()
+        super().__init__(data_dir, compact=compact)
+        self._loaded.clear()
+        self._idx_map: Optional[mmap.mmap] = None
+        self._csv_file = None
+        self._cols = None
+        self._idx_stamp = None
+
+    @property
+    def student_idx(self): return self.data_dir / "students.idx"
+
+    def _csv_stamp(self):
+        st = self.student_csv.stat()
+        return st.st_size, st.st_mtime_ns
+
+    def _index_matches(self, stamp) -> bool:
+        if not self.student_idx.exists():
+            return False
+        with open(self.student_idx, "rb") as f:
+            head = f.read(_IDX_HEADER.size)
+        if len(head) != _IDX_HEADER.size:
+            return False
+        magic, version, size, mtime, _ = _IDX_HEADER.unpack(head)
+        return (magic, version, (size, mtime)) == (IDX_MAGIC, IDX_VERSION, stamp)
+
+    def _open_index(self) -> bool:
+        if not self.student_csv.exists():
+            return False
+        stamp = self._csv_stamp()
+        if self._idx_map is not None and self._idx_stamp == stamp:
+            return True
+        self.close()
+        if not self._index_matches(stamp):
+            build_offset_index(self.student_csv, self.student_idx)
+        with open(self.student_idx, "rb") as f:
+            self._idx_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._csv_file = open(self.student_csv, "rb")
+        self._cols = _column_map(_split(_read_record(self._csv_file)[1]))
+        self._idx_stamp = stamp
+        return True
+
+    def _lookup(self, email: str) -> Optional[Student]:
+        if not self._open_index():
+            return None
+        mm = self._idx_map
+        slots = _IDX_HEADER.unpack_from(mm, 0)[4]
+        mask = slots - 1
+        h = _email_hash(email)
+        i = h & mask
+        while True:
+            eh, off = _ENTRY.unpack_from(mm, _IDX_HEADER.size + 16 * i)
+            if not off:
+                return None
+            if eh == h:
+                self._csv_file.seek(off - 1)
+                row = _parse(_read_record(self._csv_file)[1], self._cols)
+                if row[0].strip() == email:
+                    return rows_to_students([row], self._grade_for)[0]
+            i = (i + 1) & mask
+
+    def search_student_indexed(self, email: str) -> Tuple[Optional[Student], float]:
+        if "students" in self._loaded:
+            return super().search_student_indexed(email)
+        t0 = time.perf_counter()
+        s = self._lookup(email)
+        return s, time.perf_counter() - t0
+
+    def load_all(self):
+        # forget what was read; each table reloads on its next access
+        self._loaded.clear()
+        self.close()
+
+    def save_all(self):
+        if "students" in self._loaded:
+            self.save_students()
+        if "courses" in self._loaded:
+            self.save_courses()
+        if "professors" in self._loaded:
+            self.save_professors()
+        if "logins" in self._loaded:
+            self.save_logins()
+        if "grade_ranges" in self._loaded:
+            self.save_grade_ranges()
+
+    def close(self):
+        if self._idx_map is not None:
+            self._idx_map.close()
+            self._idx_map = None
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+        self._idx_stamp = None
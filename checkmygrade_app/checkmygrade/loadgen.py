@@ -0,0 +1,128 @@
+"""Drive a CheckMyGrade server with concurrent clients and report throughput.
+
+    python -m checkmygrade.loadgen --url http://127.0.0.1:8080 --clients 8 --duration 10
+    python -m checkmygrade.loadgen --serve 50000 --clients 8 --duration 5 --batch 20
+"""
+import argparse, http.client, json, random, sys, tempfile, threading, time
+from typing import List
+from urllib.parse import urlsplit
+from .bench import make_db, percentile
+from .server import make_server
+
+
+def _sample_emails(conn: http.client.HTTPConnection, n: int = 1000) -> List[str]:
+    conn.request("POST", "/call", json.dumps({"op": "students_page", "args": {"page_size": n}}),
+                 {"Content-Type": "application/json"})
+    rows = json.loads(conn.getresponse().read())["result"]
+    if not rows:
+        raise SystemExit("server has no students to query")
+    return [r["email_address"] for r in rows]
+
+
+def _make_call(rng: random.Random, emails: List[str], write_ratio: float) -> dict:
+    email = rng.choice(emails)
+    if rng.random() < write_ratio:
+        return {"op": "update_student", "args": {"email": email, "marks": rng.randint(0, 100)}}
+    op = rng.randrange(4)
+    if op == 0:
+        return {"op": "get_student", "args": {"email": email}}
+    if op == 1:
+        return {"op": "student_rank", "args": {"email": email}}
+    if op == 2:
+        return {"op": "count_in_range", "args": {"lo": rng.randint(0, 50), "hi": rng.randint(50, 100)}}
+    return {"op": "top_n", "args": {"n": 10}}
+
+
+def run_load(url: str, clients: int = 8, duration: float = 5.0, batch: int = 1,
+             write_ratio: float = 0.1, seed: int = 0) -> dict:
+    """Hammer `url` from `clients` keep-alive connections for `duration` seconds."""
+    parts = urlsplit(url)
+    probe = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    emails = _sample_emails(probe)
+    probe.close()
+    latencies: List[List[float]] = [[] for _ in range(clients)]
+    ops = [0] * clients
+    errors = [0] * clients
+    start = threading.Barrier(clients + 1)
+    deadline = [0.0]
+
+    def client(k: int):
+        rng = random.Random(seed * 1000 + k)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        headers = {"Content-Type": "application/json"}
+        start.wait()
+        try:
+            while time.perf_counter() < deadline[0]:
+                calls = [_make_call(rng, emails, write_ratio) for _ in range(batch)]
+                path, body = ("/call", calls[0]) if batch == 1 else ("/batch", calls)
+                t0 = time.perf_counter()
+                conn.request("POST", path, json.dumps(body), headers)
+                resp = conn.getresponse()
+                payload = json.loads(resp.read())
+                latencies[k].append(time.perf_counter() - t0)
+                ops[k] += batch
+                if batch == 1:
+                    errors[k] += resp.status != 200
+                else:
+                    errors[k] += sum("error" in r for r in payload)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client, args=(k,), daemon=True) for k in range(clients)]
+    for t in threads:
+        t.start()
+    t0 = time.perf_counter()
+    deadline[0] = t0 + duration
+    start.wait()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - t0
+    lat = sorted(x for per in latencies for x in per)
+    return {
+        "clients": clients,
+        "batch": batch,
+        "write_ratio": write_ratio,
+        "seconds": seconds,
+        "requests": len(lat),
+        "ops": sum(ops),
+        "errors": sum(errors),
+        "requests_per_sec": len(lat) / seconds,
+        "ops_per_sec": sum(ops) / seconds,
+        "p50_ms": percentile(lat, 50) * 1000,
+        "p90_ms": percentile(lat, 90) * 1000,
+        "p99_ms": percentile(lat, 99) * 1000,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m checkmygrade.loadgen", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--url", help="server to load (default: start one with --serve)")
+    ap.add_argument("--serve", type=int, default=10000, help="roster size for the built-in server when no --url")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--batch", type=int, default=1, help="calls per request (>1 uses /batch)")
+    ap.add_argument("--write-ratio", type=float, default=0.1)
+    args = ap.parse_args(argv)
+    server = None
+    tmp = None
+    url = args.url
+    if not url:
+        tmp = tempfile.TemporaryDirectory()
+        server = make_server(make_db(args.serve, tmp.name), port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        r = run_load(url, args.clients, args.duration, max(1, args.batch), args.write_ratio)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            tmp.cleanup()
+    print(f"{r['requests']} requests / {r['ops']} ops in {r['seconds']:.2f}s from {r['clients']} clients: "
+          f"{r['requests_per_sec']:.0f} req/s, {r['ops_per_sec']:.0f} ops/s, "
+          f"p50 {r['p50_ms']:.2f} ms, p90 {r['p90_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms, {r['errors']} errors")
+    return 1 if r["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
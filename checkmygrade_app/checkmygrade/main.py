@@ -1,8 +1,11 @@
-import sys, os
+import sys, os, time
 from pathlib import Path
 from .storage import CheckMyGradeDB
+from .backends import open_db_from_env
 from .models import Student, Course, Professor
-from .reports import render_course_report, render_professor_report, render_student_report
+from .metrics import METRICS, Profiler
+from .reports import (render_student_report, iter_course_report, iter_professor_report,
+                      write_report)
 
 def seed_sample(db: CheckMyGradeDB):
     # only if empty
@@ -19,6 +22,30 @@ def seed_sample(db: CheckMyGradeDB):
     if not db.login_users:
         db.register_user("micheal@mycsu.edu", "Welcome12#_", role="professor")
 
+PAGE_SIZE = 20
+
+def print_metrics(top: int = 20):
+    ops = METRICS.snapshot()["ops"]
+    if not ops:
+        print("No calls recorded." if METRICS.enabled else "Metrics are off (set CMG_METRICS=1).")
+        return
+    print(f"{'operation':34s} {'calls':>7s} {'total ms':>10s} {'mean ms':>9s} {'p99 ms':>9s}")
+    for name, r in sorted(ops.items(), key=lambda kv: -kv[1]["total_ms"])[:top]:
+        print(f"{name:34s} {r['count']:7d} {r['total_ms']:10.3f} {r['mean_ms']:9.3f} {r['p99_ms']:9.3f}")
+
+def page_students(db: CheckMyGradeDB, by: str = "email", ascending: bool = True, course_id=None):
+    page = 0
+    while True:
+        t0 = time.perf_counter()
+        rows = db.students_page(page, PAGE_SIZE, by=by, ascending=ascending, course_id=course_id)
+        t = time.perf_counter() - t0
+        for s in rows:
+            print(f"{s.email_address:25s} | {s.first_name:10s} {s.last_name:12s} | {s.course_id:8s} | {s.grade:3s} | {s.marks:3d}")
+        print(f"-- page {page + 1} ({len(rows)} rows, {t*1000:.3f} ms) --")
+        if len(rows) < PAGE_SIZE or input("Next page? (y/n): ").strip().lower() != "y":
+            break
+        page += 1
+
 def print_menu():
     print("""
 ===== CheckMyGrade =====
@@ -26,19 +53,22 @@ def print_menu():
 2) Add student
 3) Update student
 4) Delete student
-5) Search student (linear vs indexed)
-6) Sort students (email/marks/name/grade)
-7) Course stats (avg, median)
+5) Search student (email / name / marks range / rank)
+6) Sorted listing / top-N (email/marks/name/grade)
+7) Course stats (avg, median, grade histogram)
 8) Reports (course/professor/student)
 9) Save to CSV
 10) Load from CSV
 11) Login test
+12) Metrics (calls, latency, JSON dump)
 0) Exit
 """)
 
 def main():
     data_dir = os.environ.get("CMG_DATA_DIR", str(Path.cwd() / "data"))
-    db = CheckMyGradeDB(data_dir)
+    mode = os.environ.get("CMG_PROFILE", "")
+    profiler = Profiler(mode).start() if mode and mode != "0" else None
+    db = open_db_from_env(data_dir)
     # load or seed
     if Path(data_dir).exists():
         db.load_all()
@@ -47,51 +77,120 @@ def main():
         print_menu()
         choice = input("Choose: ").strip()
         if choice == "1":
-            for s in db.students:
-                print(f"{s.email_address:25s} | {s.first_name:10s} {s.last_name:12s} | {s.course_id:8s} | {s.grade:3s} | {s.marks:3d}")
+            page_students(db)
         elif choice == "2":
             email = input("Email: ").strip()
             fn = input("First name: ").strip()
             ln = input("Last name: ").strip()
             cid = input("Course id: ").strip()
-            marks = int(input("Marks (0-100): ").strip())
-            db.add_student(Student(email,fn,ln,cid,"",marks))
-            print("Added.")
+            try:
+                marks = int(input("Marks (0-100): ").strip())
+                db.add_student(Student(email,fn,ln,cid,"",marks))
+                print("Added.")
+            except ValueError as e:
+                print(e)
         elif choice == "3":
             email = input("Student email to update: ").strip()
             field = input("Field (first_name,last_name,course_id,marks): ").strip()
             value = input("New value: ").strip()
-            if field == "marks":
-                value = int(value)
-            ok = db.update_student(email, **{field: value})
-            print("Updated." if ok else "Student not found.")
+            try:
+                if field == "marks":
+                    value = int(value)
+                ok = db.update_student(email, **{field: value})
+                print("Updated." if ok else "Student not found.")
+            except ValueError as e:
+                print(e)
         elif choice == "4":
             email = input("Student email to delete: ").strip()
             ok = db.delete_student(email)
             print("Deleted." if ok else "Student not found.")
         elif choice == "5":
-            email = input("Student email to search: ").strip()
-            s1, t1 = db.search_student_linear(email)
-            s2, t2 = db.search_student_indexed(email)
-            print(f"Linear search: {('FOUND' if s1 else 'not found')} in {t1*1000:.3f} ms")
-            print(f"Indexed search: {('FOUND' if s2 else 'not found')} in {t2*1000:.3f} ms")
+            how = input("Search by (email/name/range/rank) [email]: ").strip().lower() or "email"
+            if how == "name":
+                query = input("Name (end with * for prefix/autocomplete; typos are ok otherwise): ").strip()
+                t0 = time.perf_counter()
+                if query.endswith("*"):
+                    hits = db.search_names(query, PAGE_SIZE)
+                    suggestions = db.complete_name(query.rstrip("*"))
+                else:
+                    hits = db.fuzzy_search_names(query, PAGE_SIZE)
+                    suggestions = []
+                t = time.perf_counter() - t0
+                for s, score in hits:
+                    print(f"{score:4.2f} | {s.email_address:25s} | {s.first_name:10s} {s.last_name:12s} | {s.course_id:8s} | {s.grade:3s}")
+                if suggestions:
+                    print("Names: " + ", ".join(suggestions))
+                print(f"{len(hits)} matches ({t*1000:.3f} ms)")
+            elif how == "range":
+                cid = input("Course id (blank for all): ").strip() or None
+                lo = input("Min marks (blank for none): ").strip()
+                hi = input("Max marks (blank for none): ").strip()
+                try:
+                    lo, hi = int(lo) if lo else None, int(hi) if hi else None
+                except ValueError:
+                    print("Marks must be whole numbers.")
+                    continue
+                t0 = time.perf_counter()
+                rows = db.students_in_range(lo, hi, course_id=cid)
+                t = time.perf_counter() - t0
+                for s in rows[:PAGE_SIZE]:
+                    print(f"{s.email_address:25s} | {s.first_name:10s} {s.last_name:12s} | {s.course_id:8s} | {s.grade:3s} | {s.marks:3d}")
+                print(f"{len(rows)} students in range ({t*1000:.3f} ms)")
+            elif how == "rank":
+                email = input("Student email: ").strip()
+                cid = input("Course id (blank for all students): ").strip() or None
+                rank = db.student_rank(email, course_id=cid)
+                if rank is None:
+                    print("Student not found.")
+                else:
+                    pct = db.student_percentile(email, course_id=cid)
+                    print(f"Rank {rank[0]} of {rank[1]} (percentile {pct:.1f})")
+            else:
+                email = input("Student email to search: ").strip()
+                s1, t1 = db.search_student_linear(email)
+                s2, t2 = db.search_student_indexed(email)
+                print(f"Linear search: {('FOUND' if s1 else 'not found')} in {t1*1000:.3f} ms")
+                print(f"Indexed search: {('FOUND' if s2 else 'not found')} in {t2*1000:.3f} ms")
         elif choice == "6":
             by = input("Sort by (email/marks/name/grade): ").strip()
             asc = input("Ascending? (y/n): ").strip().lower() != "n"
-            t = db.sort_students(by=by, ascending=asc)
-            print(f"Sorted in {t*1000:.3f} ms")
+            cid = input("Course id (blank for all): ").strip() or None
+            n = input("Top/bottom N only (blank to page through all): ").strip()
+            try:
+                if n:
+                    t0 = time.perf_counter()
+                    rows = db.bottom_n(int(n), by=by, course_id=cid) if asc else db.top_n(int(n), by=by, course_id=cid)
+                    for s in rows:
+                        print(f"{s.email_address:25s} | {s.first_name:10s} {s.last_name:12s} | {s.course_id:8s} | {s.grade:3s} | {s.marks:3d}")
+                    print(f"{len(rows)} rows in {(time.perf_counter() - t0)*1000:.3f} ms")
+                else:
+                    page_students(db, by=by, ascending=asc, course_id=cid)
+            except ValueError as e:
+                print(e)
         elif choice == "7":
             cid = input("Course id: ").strip()
             stats = db.course_stats(cid)
             print(stats)
+            hist = db.course_histogram(cid)
+            width = max(hist.values()) or 1
+            for grade, n in hist.items():
+                print(f"{grade:3s} {n:6d} {'#' * round(40 * n / width)}")
         elif choice == "8":
             which = input("Report (course/professor/student): ").strip().lower()
-            if which == "course":
-                cid = input("Course id: ").strip()
-                print(render_course_report(db, cid))
-            elif which == "professor":
-                pid = input("Professor id (email): ").strip()
-                print(render_professor_report(db, pid))
+            if which in ("course", "professor"):
+                key = input("Course id: " if which == "course" else "Professor id (email): ").strip()
+                fmt = input("Format (text/csv/jsonl) [text]: ").strip().lower() or "text"
+                out = input("Output file (blank for screen): ").strip()
+                render = iter_course_report if which == "course" else iter_professor_report
+                try:
+                    if out:
+                        with open(out, "w", newline="", encoding="utf-8") as f:
+                            n = write_report(render(db, key, fmt), f)
+                        print(f"Wrote {n} lines to {out}")
+                    else:
+                        write_report(render(db, key, fmt), sys.stdout)
+                except (ValueError, OSError) as e:
+                    print(e)
             else:
                 email = input("Student email: ").strip()
                 print(render_student_report(db, email))
@@ -104,7 +203,23 @@ def main():
             pw = input("Password: ").strip()
             ok = db.login(email, pw)
             print("Login OK" if ok else "Login failed")
+        elif choice == "12":
+            print_metrics()
+            if profiler:
+                print(profiler.snapshot())
+            out = input("Dump JSON to file (blank to skip): ").strip()
+            if out:
+                try:
+                    METRICS.dump(out, profile=profiler.snapshot() if profiler else None)
+                    print(f"Wrote {out}")
+                except OSError as e:
+                    print(e)
         elif choice == "0":
+            if db.journal is not None and db.journal.pending:
+                db.compact_journal()
+            if profiler:
+                for p in profiler.stop(data_dir):
+                    print(f"Profile written to {p}")
             print("Bye")
             break
         else:
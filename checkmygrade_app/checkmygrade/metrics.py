@@ -0,0 +1,232 @@
+import cProfile, functools, inspect, io, json, os, pstats, threading, time, tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# bucket k counts calls that took under 2**k microseconds (bucket 0: under 1 µs)
+BUCKETS = 32
+PROFILE_MODES = {"cpu": (True, False), "mem": (False, True), "all": (True, True), "1": (True, True)}
+
+
+class OpStats:
+    __slots__ = ("count", "errors", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds: float, error: bool):
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1e6).bit_length(), BUCKETS - 1)] += 1
+
+    def merge(self, other: "OpStats"):
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def quantile(self, q: float) -> float:
+        # upper edge of the bucket holding the q-th call, capped at the slowest call seen
+        rank = q * self.count
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min((1 << k) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        ms = 1000.0
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_ms": self.total * ms,
+            "mean_ms": self.total / self.count * ms if self.count else 0.0,
+            "min_ms": self.min * ms if self.count else 0.0,
+            "max_ms": self.max * ms,
+            "p50_ms": self.quantile(0.5) * ms,
+            "p90_ms": self.quantile(0.9) * ms,
+            "p99_ms": self.quantile(0.99) * ms,
+            "histogram_us": {f"<{1 << k}": n for k, n in enumerate(self.buckets) if n},
+        }
+
+
+def _merge_into(dst: Dict[str, OpStats], src: Dict[str, OpStats]):
+    for name, s in list(src.items()):
+        d = dst.get(name)
+        if d is None:
+            d = dst[name] = OpStats()
+        d.merge(s)
+
+
+class Metrics:
+    """Call counts and log2 latency histograms per named operation.
+
+    Each thread records into its own dict, so record() takes no lock;
+    snapshot() merges them, folding in and dropping threads that have ended.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._local = threading.local()
+        self._threads: Dict[threading.Thread, Dict[str, OpStats]] = {}
+        # counters of threads that have finished
+        self._retired: Dict[str, OpStats] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def _register(self) -> Dict[str, OpStats]:
+        ops = self._local.ops = {}
+        with self._lock:
+            self._retire()
+            self._threads[threading.current_thread()] = ops
+        return ops
+
+    def _retire(self):
+        # caller holds _lock
+        for t in [t for t in self._threads if not t.is_alive()]:
+            _merge_into(self._retired, self._threads.pop(t))
+
+    def record(self, name: str, seconds: float, error: bool = False):
+        try:
+            ops = self._local.ops
+        except AttributeError:
+            ops = self._register()
+        stats = ops.get(name)
+        if stats is None:
+            stats = ops[name] = OpStats()
+        stats.add(seconds, error)
+
+    def reset(self):
+        with self._lock:
+            for ops in self._threads.values():
+                ops.clear()
+            self._retired.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        merged: Dict[str, OpStats] = {}
+        with self._lock:
+            self._retire()
+            _merge_into(merged, self._retired)
+            for ops in self._threads.values():
+                _merge_into(merged, ops)
+        ops = {name: s.to_dict() for name, s in sorted(merged.items())}
+        return {"enabled": self.enabled, "uptime_s": time.time() - self.started, "ops": ops}
+
+    def dump(self, path, **extra) -> Path:
+        path = Path(path)
+        snap = self.snapshot()
+        snap.update(extra)
+        path.write_text(json.dumps(snap, indent=2), encoding="utf-8")
+        return path
+
+
+# off unless CMG_METRICS=1; the console app and server read it at import
+METRICS = Metrics(os.environ.get("CMG_METRICS") == "1")
+
+
+def timed(name: str):
+    """Record every call of the wrapped function under `name`.
+
+    Generator functions are timed from the call until the generator is
+    exhausted or closed, so streamed reports count their whole render.
+    """
+    def deco(fn):
+        perf = time.perf_counter
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                if not METRICS.enabled:
+                    return (yield from fn(*args, **kwargs))
+                t0 = perf()
+                error = True
+                try:
+                    result = yield from fn(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    METRICS.record(name, perf() - t0, error)
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return fn(*args, **kwargs)
+            t0 = perf()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                METRICS.record(name, perf() - t0, error)
+        return wrapper
+    return deco
+
+
+def instrument(prefix: str):
+    """Class decorator: time every public method defined on the class as `prefix.method`."""
+    def deco(cls):
+        for attr, value in list(vars(cls).items()):
+            if not attr.startswith("_") and inspect.isfunction(value):
+                setattr(cls, attr, timed(f"{prefix}.{attr}")(value))
+        return cls
+    return deco
+
+
+class Profiler:
+    """cProfile and/or tracemalloc capture; mode is cpu, mem or all (CMG_PROFILE)."""
+
+    def __init__(self, mode: str = "all"):
+        if mode not in PROFILE_MODES:
+            raise ValueError("profile mode must be one of: " + ", ".join(PROFILE_MODES))
+        self.cpu, self.mem = PROFILE_MODES[mode]
+        self._profile: Optional[cProfile.Profile] = None
+
+    def start(self):
+        if self.mem and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.cpu:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def snapshot(self) -> dict:
+        out = {"cpu": self.cpu, "mem": self.mem}
+        if self.mem and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            out.update(traced_bytes=current, peak_bytes=peak)
+        return out
+
+    def stop(self, out_dir, top: int = 30) -> List[Path]:
+        # writes profile.pstats + profile.txt (cpu) and memory.txt (mem); returns the paths
+        out_dir = Path(out_dir)
+        written = []
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(out_dir / "profile.pstats")
+            buf = io.StringIO()
+            pstats.Stats(self._profile, stream=buf).sort_stats("cumulative").print_stats(top)
+            (out_dir / "profile.txt").write_text(buf.getvalue(), encoding="utf-8")
+            written += [out_dir / "profile.pstats", out_dir / "profile.txt"]
+            self._profile = None
+        if self.mem and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines = [f"traced {current} bytes, peak {peak} bytes", ""]
+            lines += [str(s) for s in tracemalloc.take_snapshot().statistics("lineno")[:top]]
+            tracemalloc.stop()
+            (out_dir / "memory.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+            written.append(out_dir / "memory.txt")
+        return written
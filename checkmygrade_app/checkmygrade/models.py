@@ -1,33 +1,24 @@
 from dataclasses import dataclass, asdict
 from typing import Optional, List
 
+GRADE_LETTERS = ["A+", "A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D", "F"]
 
 def grade_from_marks(marks: int) -> str:
     if marks is None:
         return ""
-    if marks >= 97:
-        return "A+"
-    if marks >= 93:
-        return "A"
-    if marks >= 90:
-        return "A-"
-    if marks >= 87:
-        return "B+"
-    if marks >= 83:
-        return "B"
-    if marks >= 80:
-        return "B-"
-    if marks >= 77:
-        return "C+"
-    if marks >= 73:
-        return "C"
-    if marks >= 70:
-        return "C-"
-    if marks >= 60:
-        return "D"
-    return "F"
+    marks = int(marks)
+    return DEFAULT_GRADE_TABLE[0 if marks < 0 else 100 if marks > 100 else marks]
 
-@dataclass
+def parse_marks(value) -> Optional[int]:
+    # marks come in as ints, numeric strings (CSV cells, form fields, JSON) or None
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"marks must be a whole number, not {value!r}") from None
+
+@dataclass(slots=True)
 class Student:
     email_address: str
     first_name: str
@@ -62,3 +53,28 @@ class GradeRange:
     grade: str
     min_marks: int
     max_marks: int
+
+
+DEFAULT_SCALE_ID = "default"
+DEFAULT_GRADE_RANGES = [
+    GradeRange(DEFAULT_SCALE_ID, g, lo, hi) for g, lo, hi in [
+        ("A+", 97, 100), ("A", 93, 96), ("A-", 90, 92), ("B+", 87, 89), ("B", 83, 86), ("B-", 80, 82),
+        ("C+", 77, 79), ("C", 73, 76), ("C-", 70, 72), ("D", 60, 69), ("F", 0, 59)]
+]
+
+def compile_grade_scale(ranges: List[GradeRange]) -> List[str]:
+    # 101-entry marks -> grade lookup table; ranges must cover 0..100 exactly once
+    table: List[Optional[str]] = [None] * 101
+    for r in ranges:
+        if not 0 <= r.min_marks <= r.max_marks <= 100:
+            raise ValueError(f"grade {r.grade}: range {r.min_marks}-{r.max_marks} is outside 0-100")
+        for m in range(r.min_marks, r.max_marks + 1):
+            if table[m] is not None:
+                raise ValueError(f"grade {r.grade} overlaps {table[m]} at {m}")
+            table[m] = r.grade
+    missing = [m for m, g in enumerate(table) if g is None]
+    if missing:
+        raise ValueError(f"grade scale leaves marks {missing[0]}..{missing[-1]} without a grade")
+    return table
+
+DEFAULT_GRADE_TABLE = compile_grade_scale(DEFAULT_GRADE_RANGES)
@@ -0,0 +1,189 @@
+import bisect, heapq, re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from .models import Student
+from .csvio import gc_paused
+
+_WORD = re.compile(r"\w+")
+
+
+def name_tokens(text: str) -> List[str]:
+    # case-folded words of a name or query ("Mary-Jane O'Neil" -> mary, jane, o, neil)
+    return _WORD.findall(text.casefold())
+
+
+def trigrams(word: str) -> Set[str]:
+    # padded like pg_trgm, so word starts weigh more and short words still have grams
+    w = f"  {word} "
+    return {w[i:i + 3] for i in range(len(w) - 2)}
+
+
+class NameIndex:
+    """Prefix and typo-tolerant search over student first/last names.
+
+    Index entries are distinct case-folded name words, not students: a
+    sorted key list answers prefixes with bisect, a trigram -> words map
+    finds near misses, and each word keeps an insertion-ordered dict of the
+    slots that carry it. Names repeat heavily, so queries touch a few
+    hundred keys at most even on a million-row roster, and the limit stops
+    the walk over postings early.
+    """
+
+    def __init__(self, records: Iterable[Tuple[int, Student]], get: Callable[[int], Student]):
+        self._get = get
+        self._postings: Dict[str, Dict[int, None]] = {}
+        self._display: Dict[str, str] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._gram_count: Dict[str, int] = {}
+        # distinct words in sorted order; sorted once after the initial build, then kept with insort
+        self._keys: List[str] = []
+        # first/last names repeat across students, so each distinct name is split once
+        split: Dict[str, List[Tuple[str, str]]] = {}
+        postings = self._postings
+        with gc_paused():
+            for slot, s in records:
+                for name in (s.first_name, s.last_name):
+                    words = split.get(name)
+                    if words is None:
+                        words = split[name] = self._split(name)
+                    for word, shown in words:
+                        posting = postings.get(word)
+                        if posting is None:
+                            posting = self._new_word(word, shown)
+                        posting[slot] = None
+        self._keys = sorted(postings)
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    @staticmethod
+    def _split(name: str) -> List[Tuple[str, str]]:
+        # (folded, as written) per word
+        return [(m.group().casefold(), m.group()) for m in _WORD.finditer(name)]
+
+    def _words(self, s: Student) -> List[Tuple[str, str]]:
+        return self._split(s.first_name) + self._split(s.last_name)
+
+    def _new_word(self, word: str, shown: str) -> Dict[int, None]:
+        posting = self._postings[word] = {}
+        self._display[word] = shown
+        grams = trigrams(word)
+        self._gram_count[word] = len(grams)
+        for g in grams:
+            self._grams.setdefault(g, set()).add(word)
+        return posting
+
+    def add(self, slot: int, s: Student):
+        for word, shown in self._words(s):
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._new_word(word, shown)
+                bisect.insort(self._keys, word)
+            posting[slot] = None
+
+    def remove(self, slot: int, s: Student):
+        for word, _ in self._words(s):
+            posting = self._postings.get(word)
+            if posting is None:
+                continue
+            posting.pop(slot, None)
+            if not posting:
+                del self._postings[word], self._display[word], self._gram_count[word]
+                for g in trigrams(word):
+                    words = self._grams.get(g)
+                    if words is not None:
+                        words.discard(word)
+                        if not words:
+                            del self._grams[g]
+                i = bisect.bisect_left(self._keys, word)
+                if i < len(self._keys) and self._keys[i] == word:
+                    del self._keys[i]
+
+    # per query word: {index word: score in (0, 1]}
+    def _prefix_scores(self, word: str) -> Dict[str, float]:
+        keys = self._keys
+        i = bisect.bisect_left(keys, word)
+        j = bisect.bisect_left(keys, word + "\U0010ffff")
+        return {k: len(word) / len(k) for k in keys[i:j]}
+
+    def _fuzzy_scores(self, word: str, min_score: float) -> Dict[str, float]:
+        grams = trigrams(word)
+        shared = Counter()
+        for g in grams:
+            shared.update(self._grams.get(g, ()))
+        n = len(grams)
+        out = {}
+        for k, c in shared.items():
+            score = c / (n + self._gram_count[k] - c)
+            if score >= min_score:
+                out[k] = score
+        return out
+
+    def _score_rest(self, slot: int, others: List[Dict[str, float]]) -> Optional[float]:
+        # summed best score of the student's words against each remaining query word; None on a miss
+        mine = [w for w, _ in self._words(self._get(slot))]
+        total = 0.0
+        for scores in others:
+            best = max((scores.get(w, 0.0) for w in mine), default=0.0)
+            if not best:
+                return None
+            total += best
+        return total
+
+    def completions(self, prefix: str, limit: int = 10) -> List[str]:
+        # distinct names starting with prefix, shortest first
+        words = name_tokens(prefix)
+        if not words:
+            return []
+        scores = self._prefix_scores(words[-1])
+        best = heapq.nsmallest(limit, scores, key=lambda k: (len(k), k))
+        return [self._display[k] for k in best]
+
+    def search(self, query: str, limit: int = 20, fuzzy: bool = False,
+               min_score: float = 0.3) -> List[Tuple[int, float]]:
+        """(slot, score) pairs, best first.
+
+        Every query word has to match one of the student's name words, by
+        prefix (score = share of the word typed) or, with fuzzy, by trigram
+        similarity. A student's score is the mean over the query words.
+        """
+        words = name_tokens(query)
+        if not words or limit <= 0:
+            return []
+        per_word = [self._fuzzy_scores(w, min_score) if fuzzy else self._prefix_scores(w) for w in words]
+        if not all(per_word):
+            return []
+        # drive from the query word with the fewest candidate slots; check the rest per student
+        k = len(words)
+        d = 0 if k == 1 else min(range(k), key=lambda i: sum(len(self._postings[w]) for w in per_word[i]))
+        others = per_word[:d] + per_word[d + 1:]
+        driver = per_word[d]
+        if fuzzy:
+            order = sorted(driver, key=lambda w: (-driver[w], len(w), w))
+        else:
+            # prefix scores only depend on length, and the keys arrive in sorted order
+            order = sorted(driver, key=len)
+        heap: List[Tuple[float, int, int]] = []  # (score, -seq, slot): the worst kept result on top
+        seen = set()
+        seq = 0
+        for key in order:
+            ks = driver[key]
+            bound = (ks + len(others)) / k
+            if len(heap) >= limit and bound <= heap[0][0]:
+                break
+            for slot in self._postings[key]:
+                if slot in seen:
+                    continue
+                rest = self._score_rest(slot, others) if others else 0.0
+                if rest is None:
+                    continue
+                score = (ks + rest) / k
+                seen.add(slot)
+                seq += 1
+                if len(heap) < limit:
+                    heapq.heappush(heap, (score, -seq, slot))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, -seq, slot))
+                if len(heap) >= limit and bound <= heap[0][0]:
+                    break
+        return [(slot, score) for score, _, slot in sorted(heap, key=lambda e: (-e[0], -e[1]))]
@@ -1,23 +1,83 @@
-from typing import List
+import csv, io, json
+from itertools import islice
+from typing import IO, Iterable, Iterator, Optional
 from .models import Student
-from .storage import CheckMyGradeDB
+from .storage import CheckMyGradeDB, STUDENT_HEADERS
+from .metrics import timed
+from .cache import versioned
+
+HEADER = "Email                     | Name                 | Course   | Grd | Mk"
+REPORT_FORMATS = ("text", "csv", "jsonl")
 
 def print_student(s: Student) -> str:
     return f"{s.email_address:25s} | {s.first_name:10s} {s.last_name:12s} | {s.course_id:8s} | {s.grade:3s} | {s.marks:3d}"
 
+def _page(rows: Iterable[Student], page: Optional[int], page_size: Optional[int]) -> Iterable[Student]:
+    # page is 0-based; without page_size every row is returned
+    if page_size is None:
+        return rows
+    start = (page or 0) * page_size
+    return islice(rows, start, start + page_size)
+
+def iter_report_lines(rows: Iterable[Student], fmt: str = "text") -> Iterator[str]:
+    # one line per yield, without trailing newline
+    if fmt == "text":
+        yield HEADER
+        yield "-" * len(HEADER)
+        for s in rows:
+            yield print_student(s)
+    elif fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="")
+        writer.writerow(STUDENT_HEADERS)
+        yield buf.getvalue()
+        for s in rows:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow((s.email_address, s.first_name, s.last_name, s.course_id, s.grade, s.marks))
+            yield buf.getvalue()
+    elif fmt == "jsonl":
+        for s in rows:
+            yield json.dumps({"email_address": s.email_address, "first_name": s.first_name,
+                              "last_name": s.last_name, "course_id": s.course_id,
+                              "grade": s.grade, "marks": s.marks})
+    else:
+        raise ValueError("fmt must be one of: " + ", ".join(REPORT_FORMATS))
+
+@timed("report.course")
+def iter_course_report(db: CheckMyGradeDB, course_id: str, fmt: str = "text",
+                       page: Optional[int] = None, page_size: Optional[int] = None) -> Iterator[str]:
+    yield from iter_report_lines(_page(db.iter_course_wise(course_id), page, page_size), fmt)
+
+@timed("report.professor")
+def iter_professor_report(db: CheckMyGradeDB, professor_id: str, fmt: str = "text",
+                          page: Optional[int] = None, page_size: Optional[int] = None) -> Iterator[str]:
+    yield from iter_report_lines(_page(db.iter_professor_wise(professor_id), page, page_size), fmt)
+
+@timed("report.write")
+def write_report(lines: Iterable[str], sink: IO[str], flush_every: int = 1000) -> int:
+    # streams lines to any text sink; returns how many lines were written
+    n = 0
+    write = sink.write
+    for n, line in enumerate(lines, 1):
+        write(line)
+        write("\n")
+        if flush_every and n % flush_every == 0 and hasattr(sink, "flush"):
+            sink.flush()
+    return n
+
+@versioned("students")
 def render_course_report(db: CheckMyGradeDB, course_id: str) -> str:
-    rows = [print_student(s) for s in db.report_course_wise(course_id)]
-    header = "Email                     | Name                 | Course   | Grd | Mk"
-    return "\n".join([header, "-"*len(header)] + rows)
+    return "\n".join(iter_course_report(db, course_id))
 
+@versioned("students", "professors")
 def render_professor_report(db: CheckMyGradeDB, professor_id: str) -> str:
-    rows = [print_student(s) for s in db.report_professor_wise(professor_id)]
-    header = "Email                     | Name                 | Course   | Grd | Mk"
-    return "\n".join([header, "-"*len(header)] + rows)
+    return "\n".join(iter_professor_report(db, professor_id))
 
+@versioned("students")
+@timed("report.student")
 def render_student_report(db: CheckMyGradeDB, email: str) -> str:
     s = db.report_student(email)
     if not s:
         return "Student not found."
-    header = "Email                     | Name                 | Course   | Grd | Mk"
-    return "\n".join([header, "-"*len(header), print_student(s)])
+    return "\n".join([HEADER, "-"*len(HEADER), print_student(s)])
@@ -1,17 +1,36 @@
-import base64, hashlib, secrets
+import base64, hashlib, hmac, secrets, threading, time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
 
 DEFAULT_APP_SECRET = "checkmygrade-lab1-secret-key"
 
+# password hashing (one-way); tokens are "<scheme>$<params...>$<salt>$<hash>"
+PBKDF2_ITERATIONS = 600_000
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+DEFAULT_SCHEME = "pbkdf2_sha256"
+HASH_SCHEMES = ("pbkdf2_sha256", "scrypt")
+
 def _derive_key(secret: str) -> bytes:
     return hashlib.sha256(secret.encode("utf-8")).digest()
 
+def _xor(data: bytes, key: bytes, iv: bytes) -> bytes:
+    # data ^ key-stream ^ iv-stream, done as one big-int XOR instead of per byte
+    n = len(data)
+    if not n:
+        return b""
+    ks = (key * (n // len(key) + 1))[:n]
+    ivs = (iv * (n // len(iv) + 1))[:n]
+    x = int.from_bytes(data, "big") ^ int.from_bytes(ks, "big") ^ int.from_bytes(ivs, "big")
+    return x.to_bytes(n, "big")
+
 def encrypt_password(plaintext: str, secret: str = DEFAULT_APP_SECRET) -> str:
     if not isinstance(plaintext, str):
         raise TypeError("plaintext must be str")
     key = _derive_key(secret)
     pt = plaintext.encode("utf-8")
     iv = secrets.token_bytes(16)
-    ct = bytes((pt[i] ^ key[i % len(key)] ^ iv[i % len(iv)]) for i in range(len(pt)))
+    ct = _xor(pt, key, iv)
     token = base64.b64encode(iv + ct).decode("ascii")
     return token
 
@@ -21,5 +40,97 @@ def decrypt_password(token: str, secret: str = DEFAULT_APP_SECRET) -> str:
     raw = base64.b64decode(token.encode("ascii"))
     iv, ct = raw[:16], raw[16:]
     key = _derive_key(secret)
-    pt = bytes((ct[i] ^ key[i % len(key)] ^ iv[i % len(iv)]) for i in range(len(ct)))
+    pt = _xor(ct, key, iv)
     return pt.decode("utf-8")
+
+def _b64(b: bytes) -> str:
+    return base64.b64encode(b).decode("ascii")
+
+def hash_password(plaintext: str, scheme: str = DEFAULT_SCHEME, cost: Optional[int] = None) -> str:
+    # cost is PBKDF2 iterations or the scrypt N parameter
+    if not isinstance(plaintext, str):
+        raise TypeError("plaintext must be str")
+    salt = secrets.token_bytes(16)
+    pw = plaintext.encode("utf-8")
+    if scheme == "pbkdf2_sha256":
+        it = cost or PBKDF2_ITERATIONS
+        dk = hashlib.pbkdf2_hmac("sha256", pw, salt, it)
+        return f"pbkdf2_sha256${it}${_b64(salt)}${_b64(dk)}"
+    if scheme == "scrypt":
+        n = cost or SCRYPT_N
+        dk = hashlib.scrypt(pw, salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P, maxmem=256 * n * SCRYPT_R)
+        return f"scrypt${n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(dk)}"
+    raise ValueError("scheme must be one of: " + ", ".join(HASH_SCHEMES))
+
+def is_hashed(token: str) -> bool:
+    return token.split("$", 1)[0] in HASH_SCHEMES
+
+def verify_password(token: str, plaintext: str, secret: str = DEFAULT_APP_SECRET) -> bool:
+    # accepts KDF hashes and legacy reversible tokens
+    parts = token.split("$")
+    pw = plaintext.encode("utf-8")
+    if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+        it, salt, dk = int(parts[1]), base64.b64decode(parts[2]), base64.b64decode(parts[3])
+        return hmac.compare_digest(hashlib.pbkdf2_hmac("sha256", pw, salt, it), dk)
+    if parts[0] == "scrypt" and len(parts) == 6:
+        n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+        salt, dk = base64.b64decode(parts[4]), base64.b64decode(parts[5])
+        got = hashlib.scrypt(pw, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=len(dk))
+        return hmac.compare_digest(got, dk)
+    return hmac.compare_digest(decrypt_password(token, secret).encode("utf-8"), pw)
+
+def _hash_job(job) -> str:
+    plaintext, scheme, cost = job
+    return hash_password(plaintext, scheme, cost)
+
+def hash_passwords(plaintexts: Iterable[str], scheme: str = DEFAULT_SCHEME, cost: Optional[int] = None,
+                   workers: Optional[int] = None) -> List[str]:
+    jobs = [(p, scheme, cost) for p in plaintexts]
+    if workers == 1 or len(jobs) < 4:
+        return [_hash_job(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_hash_job, jobs, chunksize=max(1, len(jobs) // 64)))
+
+class VerificationCache:
+    """Bounded, short-TTL memo of recent successful logins.
+
+    Entries hold a keyed HMAC of the password (key is random per process),
+    never the password itself, and are tied to the stored token so a password
+    change invalidates them.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._key = secrets.token_bytes(32)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _mac(self, token: str, plaintext: str) -> bytes:
+        return hmac.new(self._key, (token + "\0" + plaintext).encode("utf-8"), hashlib.sha256).digest()
+
+    def check(self, user_id: str, token: str, plaintext: str) -> bool:
+        hit = self._entries.get(user_id)
+        if hit is None:
+            return False
+        mac, expires = hit
+        if time.monotonic() > expires:
+            self.discard(user_id)
+            return False
+        return hmac.compare_digest(mac, self._mac(token, plaintext))
+
+    def add(self, user_id: str, token: str, plaintext: str):
+        entry = (self._mac(token, plaintext), time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
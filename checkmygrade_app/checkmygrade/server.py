@@ -0,0 +1,251 @@
+"""Serve one warm CheckMyGradeDB over HTTP/JSON.
+
+    python -m checkmygrade.server --port 8080
+
+    GET  /health                     -> {"ok": true, "students": n}
+    GET  /metrics                    -> METRICS snapshot
+    POST /call   {"op": ..., "args": {...}}          -> {"result": ...}
+    POST /batch  [{"op": ..., "args": {...}}, ...]   -> [{"result": ...} | {"error": ...}, ...]
+
+Bad calls get 400 with {"error": ...}; a call that fails on a bug gets 500
+and {"error": ..., "internal": true} (inside a batch, just that entry).
+
+A batch runs in order; consecutive reads share one read lock and
+consecutive writes one write lock. Data directory and options come from
+the same CMG_* variables as the console app.
+"""
+import argparse, io, json, os, sys, time, traceback
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from .concurrency import SharedDB
+from .metrics import METRICS
+from .models import Student, Course, Professor
+from .reports import iter_course_report, iter_professor_report
+from .backends import open_db_from_env
+from .storage import STUDENT_FIELDS
+
+MAX_BODY = 16 << 20
+MAX_BATCH = 10000
+
+
+def _student(s) -> dict:
+    return None if s is None else {f: getattr(s, f) for f in STUDENT_FIELDS}
+
+
+def _students(rows) -> List[dict]:
+    return [_student(s) for s in rows]
+
+
+def _report(render):
+    def op(db, key: str, fmt: str = "jsonl", page=None, page_size=None):
+        lines = render(db, key, fmt, page, page_size)
+        return [json.loads(line) for line in lines] if fmt == "jsonl" else list(lines)
+    return op
+
+
+def _changes(db, since=None, log_id=None) -> dict:
+    # the delta after since, or a full snapshot (see CheckMyGradeDB.export_changes), plus the next cursor
+    buf = io.StringIO()
+    cursor = db.export_changes(buf, since, log_id)
+    cursor["changes"] = [json.loads(line) for line in buf.getvalue().splitlines()]
+    return cursor
+
+
+# op name -> (needs the write lock, handler(db, **args))
+OPS: Dict[str, Tuple[bool, Callable]] = {
+    "get_student": (False, lambda db, email: _student(db.search_student_indexed(email)[0])),
+    "students_page": (False, lambda db, page=0, page_size=20, by="email", ascending=True, course_id=None:
+                      _students(db.students_page(page, page_size, by, ascending, course_id))),
+    "top_n": (False, lambda db, n=10, by="marks", course_id=None: _students(db.top_n(n, by, course_id))),
+    "bottom_n": (False, lambda db, n=10, by="marks", course_id=None: _students(db.bottom_n(n, by, course_id))),
+    "students_in_range": (False, lambda db, lo=None, hi=None, course_id=None:
+                          _students(db.students_in_range(lo, hi, course_id))),
+    "count_in_range": (False, lambda db, lo=None, hi=None, course_id=None: db.count_in_range(lo, hi, course_id)),
+    "search_names": (False, lambda db, query, limit=20:
+                     [[_student(s), score] for s, score in db.search_names(query, limit)]),
+    "fuzzy_search_names": (False, lambda db, query, limit=20, min_score=0.3:
+                           [[_student(s), score] for s, score in db.fuzzy_search_names(query, limit, min_score)]),
+    "complete_name": (False, lambda db, prefix, limit=10: db.complete_name(prefix, limit)),
+    "student_rank": (False, lambda db, email, course_id=None: db.student_rank(email, course_id)),
+    "student_percentile": (False, lambda db, email, course_id=None: db.student_percentile(email, course_id)),
+    "course_stats": (False, lambda db, course_id: db.course_stats(course_id)),
+    "course_histogram": (False, lambda db, course_id: db.course_histogram(course_id)),
+    "course_percentile": (False, lambda db, course_id, p: db.course_percentile(course_id, p)),
+    "cache_stats": (False, lambda db: db.result_cache_stats()),
+    "changes": (False, _changes),
+    "report_course": (False, _report(iter_course_report)),
+    "report_professor": (False, _report(iter_professor_report)),
+    "report_student": (False, lambda db, email: _student(db.report_student(email))),
+    "courses": (False, lambda db: [asdict(c) for c in db.courses]),
+    "professors": (False, lambda db: [asdict(p) for p in db.professors]),
+    "login": (False, lambda db, email, password: db.login(email, password)),
+    "add_student": (True, lambda db, **row: db.add_student(Student(**{"grade": "", **row})) or True),
+    "update_student": (True, lambda db, email, **fields: db.update_student(email, **fields)),
+    "delete_student": (True, lambda db, email: db.delete_student(email)),
+    "add_students": (True, lambda db, rows: db.add_students(Student(**{"grade": "", **r}) for r in rows)),
+    "update_students": (True, lambda db, updates: db.update_students(updates)),
+    "delete_students": (True, lambda db, emails, missing_ok=False: db.delete_students(emails, missing_ok)),
+    "add_course": (True, lambda db, **row: db.add_course(Course(**row)) or True),
+    "update_course": (True, lambda db, course_id, **fields: db.update_course(course_id, **fields)),
+    "delete_course": (True, lambda db, course_id, on_delete="restrict": db.delete_course(course_id, on_delete)),
+    "add_professor": (True, lambda db, **row: db.add_professor(Professor(**row)) or True),
+    "update_professor": (True, lambda db, professor_id, **fields: db.update_professor(professor_id, **fields)),
+    "delete_professor": (True, lambda db, professor_id: db.delete_professor(professor_id)),
+    "save": (True, lambda db: db.save_all() or True),
+}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _resolve(call) -> Tuple[bool, Callable, dict]:
+    if not isinstance(call, dict) or not isinstance(call.get("op"), str):
+        raise RequestError(400, 'each call must be an object like {"op": ..., "args": {...}}')
+    if call["op"] not in OPS:
+        raise RequestError(404, f"unknown op {call['op']!r}")
+    args = call.get("args") or {}
+    if not isinstance(args, dict):
+        raise RequestError(400, "args must be an object")
+    write, fn = OPS[call["op"]]
+    return write, fn, args
+
+
+def _run(db, fn, args) -> dict:
+    try:
+        return {"result": fn(db, **args)}
+    except (ValueError, TypeError, KeyError) as e:
+        return {"error": str(e) or type(e).__name__}
+    except Exception as e:
+        # a bug rather than a bad call; keep serving and report it as such
+        traceback.print_exc()
+        return {"error": f"internal error: {type(e).__name__}: {e}", "internal": True}
+
+
+def run_batch(shared: SharedDB, calls: list) -> List[dict]:
+    """Run calls in order, taking the lock once per run of reads or writes."""
+    resolved = []
+    for call in calls:
+        try:
+            resolved.append(_resolve(call))
+        except RequestError as e:
+            resolved.append((False, None, str(e)))
+    out: List[dict] = []
+    i = 0
+    while i < len(resolved):
+        write = resolved[i][0]
+        j = i
+        while j < len(resolved) and resolved[j][0] == write:
+            j += 1
+        with (shared.write() if write else shared.read()) as db:
+            for _, fn, args in resolved[i:j]:
+                out.append({"error": args} if fn is None else _run(db, fn, args))
+        i = j
+    return out
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "CheckMyGrade/1"
+    # headers and body go out as separate writes; without TCP_NODELAY each
+    # keep-alive response waits out the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    shared: SharedDB = None  # set by make_server
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        if n > MAX_BODY:
+            raise RequestError(413, "request body too large")
+        try:
+            return json.loads(self.rfile.read(n) or b"null")
+        except ValueError:
+            raise RequestError(400, "body is not valid JSON")
+
+    def do_GET(self):
+        if self.path == "/health":
+            with self.shared.read() as db:
+                n = len(db.students)
+            self._send(200, {"ok": True, "students": n})
+        elif self.path == "/metrics":
+            self._send(200, METRICS.snapshot())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        t0 = time.perf_counter()
+        route = self.path
+        try:
+            body = self._body()
+            if route == "/call":
+                write, fn, args = _resolve(body)
+                with (self.shared.write() if write else self.shared.read()) as db:
+                    result = _run(db, fn, args)
+                self._send(500 if result.get("internal") else 400 if "error" in result else 200, result)
+            elif route == "/batch":
+                if not isinstance(body, list):
+                    raise RequestError(400, "batch body must be a JSON array")
+                if len(body) > MAX_BATCH:
+                    raise RequestError(413, f"at most {MAX_BATCH} calls per batch")
+                self._send(200, run_batch(self.shared, body))
+            else:
+                raise RequestError(404, "not found")
+        except RequestError as e:
+            self._send(e.status, {"error": str(e)})
+        finally:
+            if route in ("/call", "/batch") and METRICS.enabled:
+                METRICS.record("http" + route.replace("/", "."), time.perf_counter() - t0)
+
+
+def make_server(db, host: str = "127.0.0.1", port: int = 8080, verbose: bool = False) -> ThreadingHTTPServer:
+    shared = db if isinstance(db, SharedDB) else SharedDB(db)
+    handler = type("BoundHandler", (Handler,), {"shared": shared})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.shared = shared
+    return server
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m checkmygrade.server", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--verbose", action="store_true", help="log every request")
+    args = ap.parse_args(argv)
+    data_dir = os.environ.get("CMG_DATA_DIR", str(Path.cwd() / "data"))
+    db = open_db_from_env(data_dir)
+    db.load_all()
+    server = make_server(db, args.host, args.port, args.verbose)
+    print(f"Serving {len(db.students)} students from {data_dir} on http://{args.host}:{server.server_port}",
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        with server.shared.write():
+            db.save_all()
+            if db.journal is not None and db.journal.pending:
+                db.compact_journal()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
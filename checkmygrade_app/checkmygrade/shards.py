@@ -0,0 +1,159 @@
+import hashlib, json, os, re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from .csvio import iter_row_batches, write_rows, gc_paused
+from .models import DEFAULT_SCALE_ID, DEFAULT_GRADE_TABLE
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+# below this many rows a process pool costs more than it saves
+PARALLEL_MIN_ROWS = 50000
+
+
+def shard_file_name(course_id: str) -> str:
+    # course ids become file names; anything unsafe (or empty) gets a hash suffix
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", course_id)
+    if safe == course_id and course_id and not course_id.startswith("."):
+        return course_id + ".csv"
+    digest = hashlib.blake2b(course_id.encode("utf-8"), digest_size=4).hexdigest()
+    return f"{safe}-{digest}.csv"
+
+
+def read_manifest(shard_dir: Path) -> Optional[dict]:
+    try:
+        manifest = json.loads((shard_dir / MANIFEST).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"unsupported shard manifest version {manifest.get('version')}")
+    return manifest
+
+
+def write_manifest(shard_dir: Path, shards: Dict[str, dict]):
+    path = shard_dir / MANIFEST
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "shards": shards}, f, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_shard(job) -> tuple:
+    """Parse one shard into columns (runs in a worker process).
+
+    job is (path, headers, grade_tables). Course ids and grades come back
+    dictionary-encoded so the parent can merge shards without touching rows.
+    """
+    path, headers, grade_tables = job
+    emails: List[str] = []
+    firsts: List[str] = []
+    lasts: List[str] = []
+    marks: List[int] = []
+    course_values: Dict[str, int] = {}
+    grade_values: Dict[str, int] = {}
+    course_codes = array("H")
+    grade_codes = array("H")
+    default = grade_tables.get(DEFAULT_SCALE_ID) or DEFAULT_GRADE_TABLE
+    with gc_paused():
+        for batch in iter_row_batches(path, headers):
+            for email, first, last, course_id, grade, mk in batch:
+                mk = mk.strip()
+                m = int(mk) if mk else None
+                course_id = course_id.strip()
+                grade = grade.strip()
+                if not grade and m is not None:
+                    grade = (grade_tables.get(course_id) or default)[0 if m < 0 else 100 if m > 100 else m]
+                emails.append(email.strip())
+                firsts.append(first.strip())
+                lasts.append(last.strip())
+                marks.append(m if m is not None else 0)
+                course_codes.append(course_values.setdefault(course_id, len(course_values)))
+                grade_codes.append(grade_values.setdefault(grade, len(grade_values)))
+    return emails, firsts, lasts, list(course_values), course_codes, list(grade_values), grade_codes, marks
+
+
+def write_shard(job) -> int:
+    path, headers, rows = job
+    return write_rows(path, headers, rows)
+
+
+def _pool_size(workers: Optional[int], jobs: int, rows: int) -> int:
+    workers = workers or os.cpu_count() or 1
+    return 1 if jobs < 2 or rows < PARALLEL_MIN_ROWS else min(workers, jobs)
+
+
+def _run(fn, jobs: list, workers: int) -> list:
+    if workers == 1:
+        return [fn(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, jobs))
+
+
+def merge_columns(parts: Sequence[tuple]) -> tuple:
+    # concatenate read_shard results, re-coding each shard's course/grade tables into shared ones
+    emails: List[str] = []
+    firsts: List[str] = []
+    lasts: List[str] = []
+    marks: List[int] = []
+    course_index: Dict[str, int] = {}
+    grade_index: Dict[str, int] = {}
+    course_codes = array("H")
+    grade_codes = array("H")
+    for e, f, l, cvals, ccodes, gvals, gcodes, m in parts:
+        emails += e
+        firsts += f
+        lasts += l
+        marks += m
+        for codes, values, index, out in ((ccodes, cvals, course_index, course_codes),
+                                          (gcodes, gvals, grade_index, grade_codes)):
+            lut = [index.setdefault(v, len(index)) for v in values]
+            if lut == list(range(len(lut))):
+                out.extend(codes)
+            else:
+                out.extend(map(lut.__getitem__, codes))
+    return emails, firsts, lasts, list(course_index), course_codes, list(grade_index), grade_codes, marks
+
+
+def load_shards(shard_dir: Path, headers: Sequence[str], grade_tables: dict,
+                workers: Optional[int] = None) -> Optional[tuple]:
+    """Read every shard in the manifest, in parallel when worthwhile; None if there is no manifest."""
+    manifest = read_manifest(shard_dir)
+    if manifest is None:
+        return None
+    entries = manifest["shards"].values()
+    jobs = [(shard_dir / e["file"], list(headers), grade_tables) for e in entries]
+    rows = sum(e.get("rows", 0) for e in entries)
+    return merge_columns(_run(read_shard, jobs, _pool_size(workers, len(jobs), rows)))
+
+
+def save_shards(shard_dir: Path, headers: Sequence[str], rows_by_course: Dict[str, Tuple[int, Iterable]],
+                workers: Optional[int] = None) -> int:
+    """Rewrite the shards for rows_by_course ({course_id: (row count, rows)}; 0 rows = course gone).
+
+    Returns rows written. Rows are only materialized when they have to be
+    shipped to worker processes.
+    """
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(shard_dir) or {"shards": {}}
+    shards = manifest["shards"]
+    jobs, gone = [], []
+    total = 0
+    for course_id, (count, rows) in rows_by_course.items():
+        if count:
+            name = shard_file_name(course_id)
+            shards[course_id] = {"file": name, "rows": count}
+            jobs.append((shard_dir / name, list(headers), rows))
+            total += count
+        elif course_id in shards:
+            gone.append(shard_dir / shards.pop(course_id)["file"])
+    pool = _pool_size(workers, len(jobs), total)
+    if pool > 1:
+        jobs = [(path, h, list(rows)) for path, h, rows in jobs]
+    _run(write_shard, jobs, pool)
+    write_manifest(shard_dir, shards)
+    for p in gone:
+        p.unlink(missing_ok=True)
+    return total
@@ -0,0 +1,148 @@
+import json, mmap, os, struct, sys
+from array import array
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List
+from .models import Course, Professor, LoginUser, GradeRange
+from .store import NO_MARKS
+from .aggregates import CourseAggregate
+from .metrics import timed
+
+MAGIC = b"CMGSNAP\x00"
+VERSION = 1
+SEP = "\x00"
+_HEADER = struct.Struct("<8sII")   # magic, version, toc length
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _codes(values: List[str]):
+    table: Dict[str, int] = {}
+    return table, [table.setdefault(v, len(table)) for v in values]
+
+
+@timed("snapshot.write")
+def write_snapshot(db, path: Path) -> bool:
+    """Write the whole database as one binary file; returns False if a field can't be encoded."""
+    students = list(db.students)
+    cols = {f: [getattr(s, f) for s in students]
+            for f in ("email_address", "first_name", "last_name", "course_id", "grade", "marks")}
+    for f in ("email_address", "first_name", "last_name"):
+        if any(SEP in v for v in cols[f]):
+            return False
+    course_table, course_codes = _codes(cols["course_id"])
+    grade_table, grade_codes = _codes(cols["grade"])
+    if len(course_table) > 0xFFFF or len(grade_table) > 0xFF:
+        return False
+    try:
+        marks = array("h", (NO_MARKS if m is None else m for m in cols["marks"]))
+    except (OverflowError, TypeError):
+        return False
+    # slots are renumbered 0..n-1, so group rows by course in that numbering
+    course_slots: Dict[str, array] = {c: array("I") for c in course_table}
+    for slot, c in enumerate(cols["course_id"]):
+        course_slots[c].append(slot)
+    aggs = {c: {"counts": [[m, n] for m, n in a._counts.items()], "grades": dict(a.grades)}
+            for c, a in db._course_aggs.items()}
+    sections = [
+        ("email", SEP.join(cols["email_address"]).encode("utf-8")),
+        ("first", SEP.join(cols["first_name"]).encode("utf-8")),
+        ("last", SEP.join(cols["last_name"]).encode("utf-8")),
+        ("course", array("H", course_codes).tobytes()),
+        ("grade", array("B", grade_codes).tobytes()),
+        ("marks", marks.tobytes()),
+        ("course_slots", b"".join(a.tobytes() for a in course_slots.values())),
+        ("meta", json.dumps({
+            "count": len(students),
+            "course_values": list(course_table),
+            "grade_values": list(grade_table),
+            "course_slot_counts": [len(a) for a in course_slots.values()],
+            "aggregates": aggs,
+            "courses": [asdict(c) for c in db.courses],
+            "professors": [asdict(p) for p in db.professors],
+            "login_users": [asdict(u) for u in db.login_users],
+            "grade_ranges": [asdict(r) for r in db.grade_ranges],
+        }).encode("utf-8")),
+    ]
+    toc, offset = {}, 0
+    for name, blob in sections:
+        toc[name] = [offset, len(blob)]
+        offset += len(blob)
+    toc_bytes = json.dumps({"byteorder": sys.byteorder, "sections": toc}).encode("utf-8")
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(toc_bytes)))
+        f.write(toc_bytes)
+        for _, blob in sections:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return True
+
+
+@timed("snapshot.read")
+def read_snapshot(db, path: Path):
+    """Replace db's contents with the snapshot at `path`."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if len(mm) < _HEADER.size:
+            raise SnapshotError("truncated snapshot")
+        magic, version, toc_len = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"unsupported snapshot (version {version})")
+        base = _HEADER.size + toc_len
+        toc = json.loads(mm[_HEADER.size:base])
+        swap = toc["byteorder"] != sys.byteorder
+
+        def section(name) -> bytes:
+            off, n = toc["sections"][name]
+            return mm[base + off: base + off + n]
+
+        def column(name, typecode) -> array:
+            a = array(typecode)
+            a.frombytes(section(name))
+            if swap:
+                a.byteswap()
+            return a
+
+        meta = json.loads(section("meta"))
+        n = meta["count"]
+
+        def strings(name) -> List[str]:
+            return section(name).decode("utf-8").split(SEP) if n else []
+
+        emails, firsts, lasts = strings("email"), strings("first"), strings("last")
+        course_codes, grade_codes, marks = column("course", "H"), column("grade", "B"), column("marks", "h")
+        all_slots = column("course_slots", "I")
+
+    db.courses[:] = [Course(**r) for r in meta["courses"]]
+    db._rebuild_course_index()
+    db.professors[:] = [Professor(**r) for r in meta["professors"]]
+    db.login_users[:] = [LoginUser(**r) for r in meta["login_users"]]
+    db._rebuild_login_index()
+    db.grade_ranges[:] = [GradeRange(**r) for r in meta.get("grade_ranges", ())]
+    db._rebuild_grade_tables()
+    db._rebuild_professor_index()
+    course_values = meta["course_values"]
+    db.students.load_columns(emails, firsts, lasts, course_values, course_codes,
+                             meta["grade_values"], grade_codes, marks)
+    db._course_members.clear()
+    db._course_aggs.clear()
+    db._views.clear()
+    db._marks_index.clear()
+    db._names = None
+    db._touch("students")
+    start = 0
+    for c, k in zip(course_values, meta["course_slot_counts"]):
+        db._course_members[c] = dict.fromkeys(all_slots[start:start + k])
+        start += k
+    for c, a in meta["aggregates"].items():
+        agg = CourseAggregate()
+        agg._counts = {m: k for m, k in a["counts"]}
+        agg._keys = sorted(agg._counts)
+        agg.count = sum(agg._counts.values())
+        agg.total = sum(m * k for m, k in agg._counts.items())
+        agg.grades.update(a["grades"])
+        db._course_aggs[c] = agg
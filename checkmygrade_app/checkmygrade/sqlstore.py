@@ -0,0 +1,969 @@
+"""SQLite-backed CheckMyGradeDB.
+
+    python -m checkmygrade.sqlstore migrate --data-dir data     # CSVs -> data/checkmygrade.sqlite3
+    python -m checkmygrade.sqlstore export --data-dir data      # database -> CSVs
+"""
+import argparse, json, math, secrets, sqlite3, sys, threading, time
+from contextlib import contextmanager
+from dataclasses import fields
+from itertools import starmap
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .models import (Student, Course, Professor, LoginUser, GradeRange, GRADE_LETTERS, parse_marks,
+                     DEFAULT_SCALE_ID, DEFAULT_GRADE_TABLE)
+from .security import DEFAULT_SCHEME, hash_passwords, verify_password, is_hashed, decrypt_password, VerificationCache
+from .views import sort_key
+from .cache import DEFAULT_RESULT_CACHE, TABLES, ResultCache, versioned
+from .changes import CHANGE_FIELDS, Change
+from .csvio import (DEFAULT_BATCH_SIZE, WRITE_BUFFER_SIZE, iter_row_batches, iter_student_batches,
+                    write_rows, student_rows, io_stats)
+from .metrics import instrument
+from .shards import load_shards, read_manifest, read_shard, save_shards
+from .storage import (CheckMyGradeDB, STUDENT_HEADERS, COURSE_HEADERS, PROF_HEADERS, LOGIN_HEADERS,
+                      GRADE_HEADERS, STUDENT_FIELDS)
+
+DB_FILE = "checkmygrade.sqlite3"
+COLS = ", ".join(STUDENT_FIELDS)
+# SQLite caps bound parameters per statement (999 on older builds)
+IN_CHUNK = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id            INTEGER PRIMARY KEY,
+    email_address TEXT NOT NULL UNIQUE,
+    first_name    TEXT NOT NULL,
+    last_name     TEXT NOT NULL,
+    course_id     TEXT NOT NULL,
+    grade         TEXT NOT NULL,
+    marks         INTEGER
+);
+CREATE INDEX IF NOT EXISTS students_email_ci ON students(email_address COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS students_course_marks ON students(course_id, marks);
+CREATE INDEX IF NOT EXISTS students_marks ON students(marks);
+CREATE INDEX IF NOT EXISTS students_name ON students(last_name COLLATE NOCASE, first_name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS courses (
+    course_id   TEXT PRIMARY KEY,
+    course_name TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    credits     INTEGER NOT NULL DEFAULT 3
+);
+CREATE TABLE IF NOT EXISTS professors (
+    professor_id   TEXT PRIMARY KEY,
+    professor_name TEXT NOT NULL,
+    rank           TEXT NOT NULL,
+    course_id      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS professors_course ON professors(course_id);
+CREATE TABLE IF NOT EXISTS login_users (
+    user_id  TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS grade_ranges (
+    grade_id  TEXT NOT NULL,
+    grade     TEXT NOT NULL,
+    min_marks INTEGER NOT NULL,
+    max_marks INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS grade_ranges_id ON grade_ranges(grade_id);
+"""
+
+# the change log: triggers append a row per changed student/course/professor, and trim to `retention`
+CHANGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq  INTEGER PRIMARY KEY AUTOINCREMENT,
+    op   TEXT NOT NULL,
+    tbl  TEXT NOT NULL,
+    key  TEXT NOT NULL,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS change_meta (
+    log_id    TEXT NOT NULL,
+    base      INTEGER NOT NULL,
+    retention INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS changes_trim AFTER INSERT ON changes BEGIN
+    DELETE FROM changes WHERE seq <= NEW.seq - (SELECT retention FROM change_meta);
+END;
+"""
+
+
+def _change_triggers(table: str, names: Tuple[str, ...]) -> str:
+    # insert -> whole row, update -> only the columns that changed (keyed by the old key), delete -> key
+    key = names[0]
+    row = ", ".join(f"'{f}', NEW.{f}" for f in names)
+    diff = " UNION ALL ".join(f"SELECT '{f}' AS k, NEW.{f} AS v WHERE OLD.{f} IS NOT NEW.{f}" for f in names)
+    return f"""
+CREATE TRIGGER IF NOT EXISTS {table}_change_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO changes (op, tbl, key, data) VALUES ('insert', '{table}', NEW.{key}, json_object({row}));
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_change_update AFTER UPDATE ON {table} BEGIN
+    INSERT INTO changes (op, tbl, key, data)
+    SELECT 'update', '{table}', OLD.{key}, d FROM (SELECT json_group_object(k, v) AS d, count(*) AS n FROM ({diff}))
+    WHERE n;
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_change_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO changes (op, tbl, key) VALUES ('delete', '{table}', OLD.{key});
+END;
+"""
+
+# ORDER BY terms matching views.SORT_KEYS; the row id breaks ties like the slot does in memory
+SORT_SQL = {
+    "email": ("email_address COLLATE NOCASE",),
+    "marks": ("marks",),
+    "name": ("last_name COLLATE NOCASE", "first_name COLLATE NOCASE"),
+    "grade": ("grade",),
+}
+
+
+def _order_by(by: str, ascending: bool = True) -> str:
+    sort_key(by)  # same ValueError as the in-memory sorts
+    d = "" if ascending else " DESC"
+    return ", ".join(t + d for t in SORT_SQL[by] + ("id",))
+
+
+def _course_filter(course_id: Optional[str]) -> Tuple[str, tuple]:
+    return ("", ()) if course_id is None else (" AND course_id = ?", (course_id,))
+
+
+class _ChangeTable:
+    """ChangeLog's interface over the changes table.
+
+    The triggers live in the database file, so writes from every connection
+    are captured and the log (log_id included) survives a restart. reset()
+    must run inside the transaction that replaced the rows.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, retention: int):
+        self.conn = conn
+        self.retention = retention
+        conn.executescript(CHANGE_SCHEMA + "".join(starmap(_change_triggers, CHANGE_FIELDS.items())))
+        if conn.execute("UPDATE change_meta SET retention = ?", (retention,)).rowcount == 0:
+            conn.execute("INSERT INTO change_meta VALUES (?, 0, ?)", (secrets.token_hex(8), retention))
+        conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT count(*) FROM changes").fetchone()[0]
+
+    @property
+    def log_id(self) -> str:
+        return self.conn.execute("SELECT log_id FROM change_meta").fetchone()[0]
+
+    @property
+    def seq(self) -> int:
+        return self.conn.execute("SELECT max(base, coalesce((SELECT seq FROM sqlite_sequence "
+                                 "WHERE name = 'changes'), 0)) FROM change_meta").fetchone()[0]
+
+    @property
+    def oldest(self) -> int:
+        base, first = self.conn.execute("SELECT base, (SELECT min(seq) FROM changes) FROM change_meta").fetchone()
+        return self.seq if first is None else max(base, first - 1)
+
+    def reset(self):
+        # same as ChangeLog.reset: empty, new log_id, and skip a seq
+        seq = self.seq + 1
+        self.conn.execute("DELETE FROM changes")
+        self.conn.execute("UPDATE change_meta SET log_id = ?, base = ?", (secrets.token_hex(8), seq))
+        if self.conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'changes'", (seq,)).rowcount == 0:
+            self.conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('changes', ?)", (seq,))
+
+    def since(self, seq: int, log_id: Optional[str] = None) -> Optional[List[Change]]:
+        if (log_id is not None and log_id != self.log_id) or not self.oldest <= seq <= self.seq:
+            return None
+        return [(n, op, table, key, None if data is None else json.loads(data)) for n, op, table, key, data in
+                self.conn.execute("SELECT seq, op, tbl, key, data FROM changes WHERE seq > ? ORDER BY seq", (seq,))]
+
+
+class _Students:
+    """Read-only roster view so len()/iteration/indexing on db.students keep working."""
+
+    def __init__(self, db: "SqliteCheckMyGradeDB"):
+        self._db = db
+
+    def __len__(self) -> int:
+        return self._db.conn.execute("SELECT count(*) FROM students").fetchone()[0]
+
+    def __bool__(self) -> bool:
+        return self._db.conn.execute("SELECT 1 FROM students LIMIT 1").fetchone() is not None
+
+    def __iter__(self) -> Iterator[Student]:
+        return self._db._query(f"SELECT {COLS} FROM students ORDER BY {self._db._roster_order}")
+
+    def __getitem__(self, i: int) -> Student:
+        if i < 0:
+            i += len(self)
+        rows = list(self._db._query(f"SELECT {COLS} FROM students ORDER BY {self._db._roster_order} "
+                                    "LIMIT 1 OFFSET ?", (i,)))
+        if i < 0 or not rows:
+            raise IndexError(i)
+        return rows[0]
+
+    def __contains__(self, email: str) -> bool:
+        return self._db._get(email) is not None
+
+    # row id stands in for the slot, for indexes built over the roster
+    def get(self, row_id: int) -> Student:
+        row = self._db.conn.execute(f"SELECT {COLS} FROM students WHERE id = ?", (row_id,)).fetchone()
+        return Student(*row)
+
+    def items(self) -> Iterator[Tuple[int, Student]]:
+        cur = self._db.conn.execute(f"SELECT id, {COLS} FROM students ORDER BY id")
+        return ((r[0], Student(*r[1:])) for r in cur)
+
+
+@instrument("sqlite")
+class SqliteCheckMyGradeDB(CheckMyGradeDB):
+    """CheckMyGradeDB whose tables live in one SQLite file (WAL mode).
+
+    Nothing but the grade scales is held in memory, so rosters can exceed
+    RAM and filtered queries run on indexes. Returned records are detached
+    copies; change them through update_student(). Every write method is its
+    own transaction (bulk methods included), so there is no journal and
+    save_all() just checkpoints. save_*/load_* exchange single tables with
+    the usual CSV files, and migrate_from_csv() imports all of them.
+    change_log=N keeps the change log in the file (see _ChangeTable).
+    """
+
+    def __init__(self, data_dir: str, path: Optional[str] = None, foreign_keys: bool = True,
+                 result_cache: int = DEFAULT_RESULT_CACHE, change_log: int = 0):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.path = Path(path) if path else self.data_dir / DB_FILE
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.compact = False
+        self.journal = None
+        self.snapshot = False
+        self.sharded = False
+        self.foreign_keys = foreign_keys
+        self.password_scheme = DEFAULT_SCHEME
+        self.password_cost: Optional[int] = None
+        self._login_cache = VerificationCache()
+        self._depth = 0
+        self._roster_order = "id"
+        self._cache_lock = threading.Lock()
+        # in-memory name index over row ids: patched by single-row writes, dropped by bulk loads
+        self._names = None
+        self._versions: Dict[str, int] = dict.fromkeys(TABLES, 0)
+        self._results: Optional[ResultCache] = ResultCache(result_cache) if result_cache > 0 else None
+        self._changes = _ChangeTable(self.conn, change_log) if change_log > 0 else None
+        self.students = _Students(self)
+        self._load_grade_tables()
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _tx(self):
+        # one transaction for the outermost call; nested calls join it
+        self._depth += 1
+        try:
+            yield self.conn
+            if self._depth == 1:
+                self.conn.commit()
+        except BaseException:
+            if self._depth == 1:
+                self.conn.rollback()
+                # results cached inside the transaction may have seen the rolled-back rows,
+                # and the name index may have been patched with them
+                self._names = None
+                self._touch(*TABLES)
+            raise
+        finally:
+            self._depth -= 1
+
+    def _students_changed(self, removed: Optional[List[Tuple[int, Student]]] = None,
+                          added: Optional[List[Tuple[int, Student]]] = None):
+        # removed/added come from _name_rows; without them the name index is rebuilt on the next name query
+        names = self._names
+        if names is not None:
+            if removed is None or added is None:
+                self._names = None
+            else:
+                for row_id, s in removed:
+                    names.remove(row_id, s)
+                for row_id, s in added:
+                    names.add(row_id, s)
+        self._touch("students")
+
+    def _name_rows(self, emails: List[str]) -> List[Tuple[int, Student]]:
+        # (row id, record) per email, to patch the name index with; nothing to fetch while there is none
+        if self._names is None:
+            return []
+        out = []
+        for i in range(0, len(emails), IN_CHUNK):
+            chunk = emails[i:i + IN_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            out.extend((r[0], Student(*r[1:])) for r in self.conn.execute(
+                f"SELECT id, {COLS} FROM students WHERE email_address IN ({marks})", chunk))
+        return out
+
+    def _table_versions(self, tables: Tuple[str, ...]) -> tuple:
+        # data_version moves when another connection commits to the file
+        return super()._table_versions(tables) + (self.conn.execute("PRAGMA data_version").fetchone()[0],)
+
+    def _query(self, sql: str, params: tuple = ()) -> Iterator[Student]:
+        cur = self.conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(1000)
+            if not rows:
+                return
+            yield from starmap(Student, rows)
+
+    def _get(self, email: str) -> Optional[Student]:
+        row = self.conn.execute(f"SELECT {COLS} FROM students WHERE email_address = ?", (email,)).fetchone()
+        return Student(*row) if row else None
+
+    def _existing(self, emails: List[str]) -> set:
+        found = set()
+        for i in range(0, len(emails), IN_CHUNK):
+            chunk = emails[i:i + IN_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            found.update(r[0] for r in self.conn.execute(
+                f"SELECT email_address FROM students WHERE email_address IN ({marks})", chunk))
+        return found
+
+    def _load_grade_tables(self):
+        self.grade_ranges = [GradeRange(*r) for r in self.conn.execute(
+            "SELECT grade_id, grade, min_marks, max_marks FROM grade_ranges ORDER BY rowid")]
+        self._rebuild_grade_tables()
+
+    def _check_course(self, course_id: str):
+        if self.foreign_keys and course_id and self.conn.execute(
+                "SELECT 1 FROM courses WHERE course_id = ?", (course_id,)).fetchone() is None:
+            raise ValueError(f"course {course_id} does not exist")
+
+    def _course_references(self, course_id: str) -> Tuple[int, int]:
+        return tuple(self.conn.execute(f"SELECT count(*) FROM {t} WHERE course_id = ?", (course_id,)).fetchone()[0]
+                     for t in ("students", "professors"))
+
+    @property
+    def courses(self) -> List[Course]:
+        return [Course(*r) for r in self.conn.execute(
+            "SELECT course_id, course_name, description, credits FROM courses ORDER BY rowid")]
+
+    @property
+    def professors(self) -> List[Professor]:
+        return [Professor(*r) for r in self.conn.execute(
+            "SELECT professor_id, professor_name, rank, course_id FROM professors ORDER BY rowid")]
+
+    @property
+    def login_users(self) -> List[LoginUser]:
+        return [LoginUser(*r) for r in self.conn.execute(
+            "SELECT user_id, password, role FROM login_users ORDER BY rowid")]
+
+    # ---------- Students ----------
+    def _with_grade(self, s: Student) -> tuple:
+        if (not s.grade or s.grade.strip() == "") and s.marks is not None:
+            s.grade = self._grade_for(s.course_id, s.marks)
+        return tuple(getattr(s, f) for f in STUDENT_FIELDS)
+
+    def add_student(self, s: Student):
+        self.add_students([s])
+
+    def add_students(self, records: Iterable[Student]) -> int:
+        records = list(records)
+        emails = [s.email_address for s in records]
+        if not all(emails):
+            raise ValueError("student email (id) cannot be empty")
+        taken = self._existing(emails)
+        seen = set()
+        for e in emails:
+            if e in taken or e in seen:
+                raise ValueError(f"student with email {e} already exists")
+            seen.add(e)
+        for course_id in {s.course_id for s in records}:
+            self._check_course(course_id)
+        for s in records:
+            s.marks = parse_marks(s.marks)
+        rows = [self._with_grade(s) for s in records]
+        with self._tx() as conn:
+            conn.executemany(f"INSERT INTO students ({COLS}) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            added = self._name_rows(emails)
+        self._students_changed([], added)
+        return len(rows)
+
+    def delete_student(self, email: str) -> bool:
+        with self._tx() as conn:
+            removed = self._name_rows([email])
+            deleted = conn.execute("DELETE FROM students WHERE email_address = ?", (email,)).rowcount > 0
+        if deleted:
+            self._students_changed(removed, [])
+        return deleted
+
+    def delete_students(self, emails: Iterable[str], missing_ok: bool = False) -> int:
+        emails = list(dict.fromkeys(emails))
+        found = self._existing(emails)
+        if not missing_ok:
+            missing = [e for e in emails if e not in found]
+            if missing:
+                raise ValueError(f"student with email {missing[0]} not found")
+        with self._tx() as conn:
+            removed = self._name_rows(list(found))
+            conn.executemany("DELETE FROM students WHERE email_address = ?", ((e,) for e in found))
+        self._students_changed(removed, [])
+        return len(found)
+
+    def _apply_fields(self, s: Student, updates: dict) -> Student:
+        old_course = s.course_id
+        for k, v in updates.items():
+            if k in STUDENT_FIELDS:
+                setattr(s, k, v)
+        if "marks" in updates and updates["marks"] is not None:
+            s.grade = self._grade_for(s.course_id, s.marks)
+        elif s.course_id != old_course and s.marks is not None and \
+                self._grade_table(s.course_id) is not self._grade_table(old_course):
+            s.grade = self._grade_for(s.course_id, s.marks)
+        return s
+
+    def update_student(self, email: str, **updates) -> bool:
+        s = self._get(email)
+        if s is None:
+            return False
+        new_email = updates.get("email_address")
+        if new_email is not None and new_email != email:
+            if not new_email:
+                raise ValueError("student email (id) cannot be empty")
+            if self._get(new_email) is not None:
+                raise ValueError(f"student with email {new_email} already exists")
+        if "course_id" in updates:
+            self._check_course(updates["course_id"])
+        if "marks" in updates:
+            updates["marks"] = parse_marks(updates["marks"])
+        s = self._apply_fields(s, updates)
+        with self._tx() as conn:
+            removed = self._name_rows([email])
+            conn.execute(f"UPDATE students SET {', '.join(f + ' = ?' for f in STUDENT_FIELDS)} "
+                         "WHERE email_address = ?", (*(getattr(s, f) for f in STUDENT_FIELDS), email))
+            added = self._name_rows([s.email_address])
+        self._students_changed(removed, added)
+        return True
+
+    def update_students(self, updates) -> int:
+        items = list(updates.items() if isinstance(updates, dict) else updates)
+        emails = [e for e, _ in items]
+        seen = set()
+        for e in emails:
+            if e in seen:
+                raise ValueError(f"student with email {e} is listed twice")
+            seen.add(e)
+        current = {}
+        for i in range(0, len(emails), IN_CHUNK):
+            chunk = emails[i:i + IN_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            for s in self._query(f"SELECT {COLS} FROM students WHERE email_address IN ({marks})", tuple(chunk)):
+                current[s.email_address] = s
+        renames = []
+        for email, flds in items:
+            if email not in current:
+                raise ValueError(f"student with email {email} not found")
+            unknown = set(flds) - set(STUDENT_FIELDS)
+            if unknown:
+                raise ValueError(f"unknown student fields: {', '.join(sorted(unknown))}")
+            if "marks" in flds:
+                parse_marks(flds["marks"])
+            if "course_id" in flds:
+                self._check_course(flds["course_id"])
+            new_email = flds.get("email_address")
+            if new_email is not None and new_email != email:
+                if not new_email:
+                    raise ValueError("student email (id) cannot be empty")
+                renames.append(new_email)
+        taken = self._existing(renames)
+        for e in renames:
+            if e in taken:
+                raise ValueError(f"student with email {e} already exists")
+            taken.add(e)
+        rows = []
+        for email, flds in items:
+            flds = dict(flds)
+            if "marks" in flds:
+                flds["marks"] = parse_marks(flds["marks"])
+            s = self._apply_fields(current[email], flds)
+            rows.append((*(getattr(s, f) for f in STUDENT_FIELDS), email))
+        with self._tx() as conn:
+            removed = self._name_rows(emails)
+            conn.executemany(f"UPDATE students SET {', '.join(f + ' = ?' for f in STUDENT_FIELDS)} "
+                             "WHERE email_address = ?", rows)
+            added = self._name_rows([r[0] for r in rows])
+        self._students_changed(removed, added)
+        return len(rows)
+
+    def search_student_linear(self, email: str) -> Tuple[Optional[Student], float]:
+        # full table scan, for comparison with the indexed lookup
+        t0 = time.perf_counter()
+        row = self.conn.execute(f"SELECT {COLS} FROM students NOT INDEXED WHERE email_address = ?",
+                                (email,)).fetchone()
+        return (Student(*row) if row else None), time.perf_counter() - t0
+
+    def search_student_indexed(self, email: str) -> Tuple[Optional[Student], float]:
+        t0 = time.perf_counter()
+        s = self._get(email)
+        return s, time.perf_counter() - t0
+
+    def sort_students(self, by: str = "email", ascending: bool = True) -> float:
+        # rows have no physical order here: this sets the order db.students iterates in
+        order = _order_by(by, ascending)
+        t0 = time.perf_counter()
+        self.conn.execute(f"SELECT id FROM students ORDER BY {order}").fetchall()
+        t1 = time.perf_counter()
+        self._roster_order = order
+        return t1 - t0
+
+    # ---------- Sorted listings / range and rank queries ----------
+    def sorted_students(self, by: str = "email", ascending: bool = True,
+                        course_id: Optional[str] = None) -> Iterator[Student]:
+        where, params = _course_filter(course_id)
+        return self._query(f"SELECT {COLS} FROM students WHERE 1{where} ORDER BY {_order_by(by, ascending)}",
+                           params)
+
+    def students_page(self, page: int, page_size: int = 20, by: str = "email", ascending: bool = True,
+                      course_id: Optional[str] = None) -> List[Student]:
+        where, params = _course_filter(course_id)
+        return list(self._query(f"SELECT {COLS} FROM students WHERE 1{where} "
+                                f"ORDER BY {_order_by(by, ascending)} LIMIT ? OFFSET ?",
+                                (*params, page_size, page * page_size)))
+
+    def top_n(self, n: int, by: str = "marks", course_id: Optional[str] = None) -> List[Student]:
+        return self.students_page(0, n, by, False, course_id)
+
+    def bottom_n(self, n: int, by: str = "marks", course_id: Optional[str] = None) -> List[Student]:
+        return self.students_page(0, n, by, True, course_id)
+
+    def _marks_where(self, lo, hi, course_id) -> Tuple[str, tuple]:
+        where, params = _course_filter(course_id)
+        if lo is not None:
+            where, params = where + " AND marks >= ?", params + (lo,)
+        if hi is not None:
+            where, params = where + " AND marks <= ?", params + (hi,)
+        return where, params
+
+    def students_in_range(self, lo: Optional[int] = None, hi: Optional[int] = None,
+                          course_id: Optional[str] = None) -> List[Student]:
+        where, params = self._marks_where(lo, hi, course_id)
+        return list(self._query(f"SELECT {COLS} FROM students WHERE 1{where} ORDER BY marks, id", params))
+
+    def count_in_range(self, lo: Optional[int] = None, hi: Optional[int] = None,
+                       course_id: Optional[str] = None) -> int:
+        where, params = self._marks_where(lo, hi, course_id)
+        return self.conn.execute(f"SELECT count(*) FROM students WHERE 1{where}", params).fetchone()[0]
+
+    def _rank_counts(self, email: str, course_id: Optional[str]) -> Optional[Tuple[int, int, int]]:
+        # (scoring below, tied, total) for the student within course_id (or everyone)
+        s = self._get(email)
+        if s is None or (course_id is not None and s.course_id != course_id):
+            return None
+        where, params = _course_filter(course_id)
+        m = s.marks if s.marks is not None else -1
+        below, tied, total = self.conn.execute(
+            "SELECT sum(coalesce(marks, -1) < ?), sum(coalesce(marks, -1) = ?), count(*) "
+            f"FROM students WHERE 1{where}", (m, m, *params)).fetchone()
+        return below, tied, total
+
+    def student_rank(self, email: str, course_id: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        counts = self._rank_counts(email, course_id)
+        if counts is None:
+            return None
+        below, tied, total = counts
+        return total - below - tied + 1, total
+
+    def student_percentile(self, email: str, course_id: Optional[str] = None) -> Optional[float]:
+        counts = self._rank_counts(email, course_id)
+        if counts is None:
+            return None
+        below, tied, total = counts
+        return 100.0 * (below + tied / 2) / total
+
+    # ---------- Grade scales ----------
+    def set_grade_scale(self, scale_id: str, ranges: List[GradeRange], regrade: bool = True) -> int:
+        with self._tx() as conn:
+            super().set_grade_scale(scale_id, ranges, regrade=False)
+            conn.execute("DELETE FROM grade_ranges WHERE grade_id = ?", (scale_id,))
+            conn.executemany("INSERT INTO grade_ranges VALUES (?, ?, ?, ?)",
+                             [(r.grade_id, r.grade, r.min_marks, r.max_marks)
+                              for r in self.grade_ranges if r.grade_id == scale_id])
+            return self._regrade_scale(scale_id) if regrade else 0
+
+    def clear_grade_scale(self, scale_id: str, regrade: bool = True) -> int:
+        with self._tx() as conn:
+            super().clear_grade_scale(scale_id, regrade=False)
+            conn.execute("DELETE FROM grade_ranges WHERE grade_id = ?", (scale_id,))
+            return self._regrade_scale(scale_id) if regrade else 0
+
+    def _rekey_grade_scale(self, course_id: str, new_id: Optional[str]):
+        if DEFAULT_SCALE_ID in (course_id, new_id):
+            return
+        with self._tx() as conn:
+            conn.execute("DELETE FROM grade_ranges WHERE grade_id = ?", (course_id if new_id is None else new_id,))
+            if new_id is not None:
+                conn.execute("UPDATE grade_ranges SET grade_id = ? WHERE grade_id = ?", (new_id, course_id))
+        self._load_grade_tables()
+
+    def _regrade_scale(self, scale_id: str) -> int:
+        if scale_id != DEFAULT_SCALE_ID:
+            return self.regrade_course(scale_id)
+        courses = [r[0] for r in self.conn.execute("SELECT DISTINCT course_id FROM students")]
+        return sum(self.regrade_course(cid) for cid in courses if cid not in self._grade_tables)
+
+    def regrade_course(self, course_id: str) -> int:
+        # one indexed UPDATE per distinct mark value, all in one transaction
+        table = self._grade_table(course_id) or DEFAULT_GRADE_TABLE
+        with self._tx() as conn:
+            n = conn.execute("SELECT count(*) FROM students WHERE course_id = ?", (course_id,)).fetchone()[0]
+            if n:
+                conn.executemany("UPDATE students SET grade = ? WHERE course_id = ? AND marks = ?",
+                                 [(table[m], course_id, m) for m in range(101)])
+                conn.execute("UPDATE students SET grade = ? WHERE course_id = ? AND marks < 0",
+                             (table[0], course_id))
+                conn.execute("UPDATE students SET grade = ? WHERE course_id = ? AND marks > 100",
+                             (table[100], course_id))
+                self._touch("students")
+        return n
+
+    # ---------- Courses / professors ----------
+    def add_course(self, c: Course):
+        if not c.course_id:
+            raise ValueError("course_id cannot be empty")
+        try:
+            with self._tx() as conn:
+                conn.execute("INSERT INTO courses VALUES (?, ?, ?, ?)",
+                             (c.course_id, c.course_name, c.description, c.credits))
+                self._touch("courses")
+        except sqlite3.IntegrityError:
+            raise ValueError(f"course {c.course_id} already exists")
+
+    def delete_course(self, course_id: str, on_delete: str = "restrict") -> bool:
+        if on_delete not in ("restrict", "cascade"):
+            raise ValueError("on_delete must be restrict or cascade")
+        with self._tx() as conn:
+            if conn.execute("SELECT 1 FROM courses WHERE course_id = ?", (course_id,)).fetchone() is None:
+                return False
+            if on_delete == "cascade":
+                conn.execute("DELETE FROM students WHERE course_id = ?", (course_id,))
+                self._students_changed()
+                conn.execute("DELETE FROM professors WHERE course_id = ?", (course_id,))
+                self._touch("professors")
+            elif self.foreign_keys:
+                n_students, n_profs = self._course_references(course_id)
+                if n_students or n_profs:
+                    raise ValueError(f"course {course_id} is referenced by {n_students} students "
+                                     f"and {n_profs} professors")
+            conn.execute("DELETE FROM courses WHERE course_id = ?", (course_id,))
+            self._rekey_grade_scale(course_id, None)
+            self._touch("courses")
+        return True
+
+    def _update_row(self, table: str, key: str, key_value: str, names, updates: dict) -> bool:
+        cols = [k for k in updates if k in names]
+        try:
+            with self._tx() as conn:
+                if not conn.execute(f"SELECT 1 FROM {table} WHERE {key} = ?", (key_value,)).fetchone():
+                    return False
+                if cols:
+                    conn.execute(f"UPDATE {table} SET {', '.join(c + ' = ?' for c in cols)} WHERE {key} = ?",
+                                 (*(updates[c] for c in cols), key_value))
+                    self._touch(table)
+        except sqlite3.IntegrityError:
+            raise ValueError(f"{table[:-1]} {updates.get(key)} already exists")
+        return True
+
+    def update_course(self, course_id: str, /, **updates) -> bool:
+        new_id = updates.get("course_id", course_id)
+        if new_id != course_id:
+            if not new_id:
+                raise ValueError("course_id cannot be empty")
+            if self.foreign_keys and any(self._course_references(course_id)):
+                raise ValueError(f"course {course_id} is still referenced; cannot rename it")
+        with self._tx():
+            found = self._update_row("courses", "course_id", course_id, [f.name for f in fields(Course)], updates)
+            if found and new_id != course_id:
+                self._rekey_grade_scale(course_id, new_id)
+        return found
+
+    def add_professor(self, p: Professor):
+        if not p.professor_id:
+            raise ValueError("professor_id cannot be empty")
+        self._check_course(p.course_id)
+        try:
+            with self._tx() as conn:
+                conn.execute("INSERT INTO professors VALUES (?, ?, ?, ?)",
+                             (p.professor_id, p.professor_name, p.rank, p.course_id))
+                self._touch("professors")
+        except sqlite3.IntegrityError:
+            raise ValueError(f"professor {p.professor_id} already exists")
+
+    def delete_professor(self, professor_id: str) -> bool:
+        with self._tx() as conn:
+            deleted = conn.execute("DELETE FROM professors WHERE professor_id = ?", (professor_id,)).rowcount > 0
+        if deleted:
+            self._touch("professors")
+        return deleted
+
+    def update_professor(self, professor_id: str, /, **updates) -> bool:
+        if "course_id" in updates:
+            self._check_course(updates["course_id"])
+        return self._update_row("professors", "professor_id", professor_id,
+                                [f.name for f in fields(Professor)], updates)
+
+    # ---------- Stats / reports ----------
+    def _kth_mark(self, course_id: str, k: int) -> int:
+        return self.conn.execute("SELECT marks FROM students WHERE course_id = ? AND marks IS NOT NULL "
+                                 "ORDER BY marks LIMIT 1 OFFSET ?", (course_id, k)).fetchone()[0]
+
+    @versioned("students")
+    def course_stats(self, course_id: str):
+        n, total = self.conn.execute("SELECT count(marks), sum(marks) FROM students WHERE course_id = ?",
+                                     (course_id,)).fetchone()
+        if not n:
+            return {"count": 0, "average": None, "median": None}
+        if n % 2:
+            median = self._kth_mark(course_id, n // 2)
+        else:
+            median = (self._kth_mark(course_id, n // 2 - 1) + self._kth_mark(course_id, n // 2)) / 2
+        return {"count": n, "average": total / n, "median": median}
+
+    def course_percentile(self, course_id: str, p: float) -> Optional[int]:
+        n = self.conn.execute("SELECT count(marks) FROM students WHERE course_id = ?", (course_id,)).fetchone()[0]
+        if not n:
+            return None
+        if not 0 <= p <= 100:
+            raise ValueError("percentile must be between 0 and 100")
+        return self._kth_mark(course_id, max(1, math.ceil(p / 100 * n)) - 1)
+
+    @versioned("students")
+    def course_histogram(self, course_id: str) -> Dict[str, int]:
+        hist = dict.fromkeys(GRADE_LETTERS, 0)
+        for grade, n in self.conn.execute("SELECT grade, count(*) FROM students WHERE course_id = ? "
+                                          "GROUP BY grade", (course_id,)):
+            hist[grade] = n
+        return hist
+
+    def iter_course_wise(self, course_id: str) -> Iterator[Student]:
+        return self._query(f"SELECT {COLS} FROM students WHERE course_id = ? ORDER BY id", (course_id,))
+
+    def iter_professor_wise(self, professor_id: str) -> Iterator[Student]:
+        for (course_id,) in self.conn.execute("SELECT course_id FROM professors WHERE professor_id = ?",
+                                              (professor_id,)).fetchall():
+            yield from self.iter_course_wise(course_id)
+
+    # ---------- Persistence ----------
+    def save_all(self):
+        # every write is already committed; fold the WAL back into the database file
+        self.conn.commit()
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def load_all(self):
+        self._load_grade_tables()
+        self._login_cache.clear()
+
+    def migrate_from_csv(self) -> Dict[str, int]:
+        """Replace every table with the CSVs in data_dir, in one transaction; returns row counts."""
+        with self._tx() as conn:
+            self.load_grade_ranges()
+            self.load_courses()
+            self.load_professors()
+            self.load_students()
+            self.load_logins()
+            return {t: conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0]
+                    for t in ("students", "courses", "professors", "login_users", "grade_ranges")}
+
+    def export_csv(self):
+        # write all five CSVs from the database
+        self.save_students()
+        self.save_courses()
+        self.save_professors()
+        self.save_logins()
+        self.save_grade_ranges()
+
+    def save_students(self):
+        return self.export_students(self.student_csv)
+
+    def load_students(self):
+        self._students_changed()
+        with self._tx() as conn:
+            conn.execute("DELETE FROM students")
+            if not self.student_csv.exists():
+                self._reset_changes()
+                return io_stats(0, time.perf_counter())
+            return self.import_students(self.student_csv)
+
+    def import_students(self, path, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+        # rows for emails already present replace them, as a later CSV row would
+        t0 = time.perf_counter()
+        rows = 0
+        with self._tx() as conn:
+            for batch in iter_student_batches(path, STUDENT_HEADERS, batch_size, self._grade_for):
+                conn.executemany(f"INSERT OR REPLACE INTO students ({COLS}) VALUES (?, ?, ?, ?, ?, ?)",
+                                 student_rows(batch))
+                rows += len(batch)
+            self._reset_changes()
+        self._students_changed()
+        return io_stats(rows, t0)
+
+    def export_students(self, path, buffer_size: int = WRITE_BUFFER_SIZE) -> dict:
+        t0 = time.perf_counter()
+        cur = self.conn.execute(f"SELECT {COLS} FROM students ORDER BY id")
+        rows = write_rows(path, STUDENT_HEADERS, cur, buffer_size)
+        return io_stats(rows, t0)
+
+    def _replace_table(self, table: str, path: Path, headers, convert):
+        with self._tx() as conn:
+            conn.execute(f"DELETE FROM {table}")
+            if path.exists():
+                marks = ", ".join("?" * len(headers))
+                for batch in iter_row_batches(path, headers):
+                    conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({marks})",
+                                     (convert([v.strip() for v in row]) for row in batch))
+            if table in CHANGE_FIELDS:
+                self._reset_changes()
+
+    def _export_table(self, table: str, path: Path, headers):
+        write_rows(path, headers, self.conn.execute(f"SELECT * FROM {table} ORDER BY rowid"))
+
+    def save_courses(self):
+        self._export_table("courses", self.course_csv, COURSE_HEADERS)
+
+    def load_courses(self):
+        self._replace_table("courses", self.course_csv, COURSE_HEADERS,
+                            lambda r: (r[0], r[1], r[2], int(r[3]) if r[3] else 3))
+        self._touch("courses")
+
+    def save_professors(self):
+        self._export_table("professors", self.professor_csv, PROF_HEADERS)
+
+    def load_professors(self):
+        self._replace_table("professors", self.professor_csv, PROF_HEADERS, tuple)
+        self._touch("professors")
+
+    def save_logins(self):
+        self._export_table("login_users", self.login_csv, LOGIN_HEADERS)
+
+    def load_logins(self):
+        self._replace_table("login_users", self.login_csv, LOGIN_HEADERS, tuple)
+        self._login_cache.clear()
+        self._touch("login_users")
+
+    def save_grade_ranges(self):
+        self._export_table("grade_ranges", self.grade_csv, GRADE_HEADERS)
+
+    def load_grade_ranges(self):
+        self._replace_table("grade_ranges", self.grade_csv, GRADE_HEADERS,
+                            lambda r: (r[0], r[1], int(r[2]), int(r[3])))
+        self._load_grade_tables()
+
+    def _course_rows(self, course_id: str) -> Iterator[tuple]:
+        # a generator, so no statement is open until the shard writer gets to this course
+        yield from self.conn.execute(f"SELECT {COLS} FROM students WHERE course_id = ? ORDER BY id", (course_id,))
+
+    def save_student_shards(self, full: bool = False, workers: Optional[int] = None) -> dict:
+        # nothing tracks dirty courses here, so every shard is rewritten (and emptied courses dropped)
+        t0 = time.perf_counter()
+        manifest = read_manifest(self.shard_dir)
+        counts = dict(self.conn.execute("SELECT course_id, count(*) FROM students GROUP BY course_id"))
+        courses = set(counts) | set(manifest["shards"] if manifest else ())
+        n = save_shards(self.shard_dir, STUDENT_HEADERS,
+                        {cid: (counts.get(cid, 0), self._course_rows(cid)) for cid in courses}, workers)
+        return io_stats(n, t0)
+
+    def _insert_columns(self, conn: sqlite3.Connection, cols: tuple) -> int:
+        emails, firsts, lasts, cvals, ccodes, gvals, gcodes, marks = cols
+        conn.executemany(f"INSERT OR REPLACE INTO students ({COLS}) VALUES (?, ?, ?, ?, ?, ?)",
+                         zip(emails, firsts, lasts, map(cvals.__getitem__, ccodes),
+                             map(gvals.__getitem__, gcodes), marks))
+        return len(emails)
+
+    def load_student_shards(self, workers: Optional[int] = None) -> Optional[dict]:
+        # replaces the students table with the shards; None when there is no manifest
+        t0 = time.perf_counter()
+        cols = load_shards(self.shard_dir, STUDENT_HEADERS, self._grade_tables, workers)
+        if cols is None:
+            return None
+        with self._tx() as conn:
+            conn.execute("DELETE FROM students")
+            n = self._insert_columns(conn, cols)
+            self._reset_changes()
+        self._students_changed()
+        return io_stats(n, t0)
+
+    def load_course(self, course_id: str) -> int:
+        # replace one course's rows with its shard (a course without a shard ends up empty)
+        manifest = read_manifest(self.shard_dir)
+        entry = manifest["shards"].get(course_id) if manifest else None
+        n = 0
+        with self._tx() as conn:
+            conn.execute("DELETE FROM students WHERE course_id = ?", (course_id,))
+            if entry is not None:
+                n = self._insert_columns(conn, read_shard(
+                    (self.shard_dir / entry["file"], STUDENT_HEADERS, self._grade_tables)))
+            self._reset_changes()
+        self._students_changed()
+        return n
+
+    # ---------- Login ----------
+    def _put_login(self, u: LoginUser):
+        with self._tx() as conn:
+            conn.execute("INSERT INTO login_users VALUES (?, ?, ?) ON CONFLICT(user_id) DO UPDATE "
+                         "SET password = excluded.password, role = excluded.role", (u.user_id, u.password, u.role))
+        self._login_cache.discard(u.user_id)
+        self._touch("login_users")
+
+    def register_users(self, users: Iterable[Tuple[str, str, str]], workers: Optional[int] = None) -> int:
+        with self._tx():
+            return super().register_users(users, workers)
+
+    def migrate_legacy_passwords(self, workers: Optional[int] = None) -> int:
+        legacy = []
+        for u in self.login_users:
+            if not is_hashed(u.password):
+                try:
+                    legacy.append((u, decrypt_password(u.password)))
+                except Exception:
+                    pass
+        tokens = hash_passwords((p for _, p in legacy), self.password_scheme, self.password_cost, workers)
+        with self._tx():
+            for (u, _), token in zip(legacy, tokens):
+                self._put_login(LoginUser(u.user_id, token, u.role))
+        return len(legacy)
+
+    def login(self, email: str, password_plain: str) -> bool:
+        row = self.conn.execute("SELECT password FROM login_users WHERE user_id = ?", (email,)).fetchone()
+        if row is None:
+            return False
+        token = row[0]
+        if self._login_cache.check(email, token, password_plain):
+            return True
+        try:
+            ok = verify_password(token, password_plain)
+        except Exception:
+            return False
+        if ok:
+            self._login_cache.add(email, token, password_plain)
+        return ok
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m checkmygrade.sqlstore", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("command", choices=("migrate", "export"))
+    ap.add_argument("--data-dir", default=str(Path.cwd() / "data"), help="directory holding the CSV files")
+    ap.add_argument("--db", help=f"database file (default: <data-dir>/{DB_FILE})")
+    args = ap.parse_args(argv)
+    db = SqliteCheckMyGradeDB(args.data_dir, args.db)
+    try:
+        t0 = time.perf_counter()
+        if args.command == "migrate":
+            counts = db.migrate_from_csv()
+            db.save_all()
+            print(", ".join(f"{n} {t}" for t, n in counts.items()) + f" imported into {db.path} "
+                  f"in {time.perf_counter() - t0:.2f}s")
+        else:
+            db.export_csv()
+            print(f"CSV files written to {db.data_dir} in {time.perf_counter() - t0:.2f}s")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
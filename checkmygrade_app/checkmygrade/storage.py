@@ -1,23 +1,77 @@
-import csv, time, statistics
+import heapq, threading, time
+from collections import OrderedDict
+from dataclasses import asdict
 from pathlib import Path
-from typing import List, Optional, Tuple, Dict
-from .models import Student, Course, Professor, LoginUser, grade_from_marks
-from .security import encrypt_password, decrypt_password
+from itertools import chain
+from typing import IO, Iterable, Iterator, List, Optional, Tuple, Dict
+from .models import (Student, Course, Professor, LoginUser, GradeRange, grade_from_marks, parse_marks,
+                     compile_grade_scale, DEFAULT_SCALE_ID, DEFAULT_GRADE_RANGES, DEFAULT_GRADE_TABLE)
+from .security import (DEFAULT_SCHEME, hash_password, hash_passwords, verify_password, is_hashed,
+                       decrypt_password, VerificationCache)
+from .store import StudentStore, ColumnarStudentStore
+from .aggregates import CourseAggregate
+from .journal import JOURNAL_COMPACT_AT, Journal
+from .snapshot import write_snapshot, read_snapshot, SnapshotError
+from .views import SortedView, sort_key
+from .names import NameIndex
+from .cache import DEFAULT_RESULT_CACHE, TABLES, ResultCache, versioned
+from .changes import CHANGE_FIELDS, ChangeLog, Change, change_dict, iter_change_lines, write_lines
+from .metrics import instrument
+from .shards import MANIFEST, load_shards, read_manifest, read_shard, save_shards
+from .csvio import (DEFAULT_BATCH_SIZE, WRITE_BUFFER_SIZE, iter_row_batches, iter_student_batches,
+                    write_rows, student_rows, io_stats, gc_paused)
 
 STUDENT_HEADERS = ["Email_address","First_name","Last_name","Course.id","grades","Marks"]
 COURSE_HEADERS  = ["Course_id","Course_name","Description","Credits"]
 PROF_HEADERS    = ["Professor_id","Professor_Name","Rank","Course.id"]
 LOGIN_HEADERS   = ["User_id","Password","Role"]
+GRADE_HEADERS   = ["Grade_id","Grade","Min_marks","Max_marks"]
+STUDENT_FIELDS  = ("email_address", "first_name", "last_name", "course_id", "grade", "marks")
 
+@instrument("db")
 class CheckMyGradeDB:
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, compact: bool = False, journal: bool = False,
+                 snapshot: bool = False, sharded: bool = False, foreign_keys: bool = True,
+                 result_cache: int = DEFAULT_RESULT_CACHE, change_log: int = 0):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.students: List[Student] = []
+        self.compact = compact
+        self.students = ColumnarStudentStore() if compact else StudentStore()
         self.courses: List[Course] = []
         self.professors: List[Professor] = []
         self.login_users: List[LoginUser] = []
-        self._student_index: Dict[str, int] = {}
+        self.grade_ranges: List[GradeRange] = []
+        self._grade_tables: Dict[str, List[str]] = {}
+        self._login_index: Dict[str, int] = {}
+        self._login_cache = VerificationCache()
+        self.password_scheme = DEFAULT_SCHEME
+        self.password_cost: Optional[int] = None
+        self._course_members: Dict[str, Dict[int, None]] = {}
+        self._course_aggs: Dict[str, CourseAggregate] = {}
+        self._professor_courses: Dict[str, List[str]] = {}
+        # id -> position in courses/professors; course_id -> ids of professors teaching it
+        self._course_index: Dict[str, int] = {}
+        self._professor_index: Dict[str, int] = {}
+        self._course_professors: Dict[str, Dict[str, None]] = {}
+        # students.course_id and professors.course_id must name an existing course (blank is allowed)
+        self.foreign_keys = foreign_keys
+        self._views: "OrderedDict[Tuple[str, Optional[str]], SortedView]" = OrderedDict()
+        self._marks_index: Dict[Optional[str], SortedView] = {}
+        # name words -> slots, built on the first name search and patched by the index hooks
+        self._names: Optional[NameIndex] = None
+        # reads build and evict cached views, so concurrent readers serialize on that part
+        self._cache_lock = threading.Lock()
+        # bumped by every write to a table; stats/report results are cached against them
+        self._versions: Dict[str, int] = dict.fromkeys(TABLES, 0)
+        self._results: Optional[ResultCache] = ResultCache(result_cache) if result_cache > 0 else None
+        # row changes to students/courses/professors for changes_since(); change_log = entries kept, 0 = off
+        self._changes: Optional[ChangeLog] = ChangeLog(change_log) if change_log > 0 else None
+        self.journal: Optional[Journal] = Journal(self.journal_path) if journal else None
+        self.journal_compact_at = JOURNAL_COMPACT_AT
+        self.snapshot = snapshot
+        self.sharded = sharded
+        # courses whose shard no longer matches memory; maintained by the index hooks
+        self._dirty_courses = set()
 
     @property
     def student_csv(self): return self.data_dir / "students.csv"
@@ -27,44 +81,306 @@ class CheckMyGradeDB:
     def professor_csv(self): return self.data_dir / "professors.csv"
     @property
     def login_csv(self): return self.data_dir / "login.csv"
+    @property
+    def grade_csv(self): return self.data_dir / "grades.csv"
+    @property
+    def journal_path(self): return self.data_dir / "journal.log"
+    @property
+    def snapshot_path(self): return self.data_dir / "snapshot.bin"
+    @property
+    def shard_dir(self): return self.data_dir / "students"
+
+    def _log(self, op: str, table: str, key: Optional[str] = None, **payload):
+        self._touch(table)
+        if self._changes is not None and table in CHANGE_FIELDS:
+            self._capture(op, table, key, payload)
+        if self.journal is not None:
+            self.journal.append(op, table, key, **payload)
+
+    def _capture(self, op: str, table: str, key: Optional[str], payload: dict):
+        # journal records -> one change per row; updates keep the fields that exist on the table
+        record = self._changes.record
+        names = CHANGE_FIELDS[table]
+        if op in ("add", "add_many"):
+            for row in payload["rows"] if op == "add_many" else (payload["row"],):
+                record("insert", table, row[names[0]], row)
+        elif op in ("update", "update_many"):
+            for k, fields in payload["changes"] if op == "update_many" else ((key, payload["fields"]),):
+                fields = {f: v for f, v in fields.items() if f in names}
+                if table == "students" and ("marks" in fields or "course_id" in fields):
+                    # the grade follows marks/course; send the one that was computed
+                    s = self.students.get(self._student_index[fields.get("email_address", k)])
+                    fields["grade"] = s.grade
+                if fields:
+                    record("update", table, k, fields)
+        elif op in ("delete", "delete_many"):
+            for k in payload["keys"] if op == "delete_many" else (key,):
+                record("delete", table, k)
+
+    def _reset_changes(self):
+        # bulk loads aren't a list of changes; mirrors have to resync from a snapshot
+        if self._changes is not None:
+            self._changes.reset()
+
+    def _touch(self, *tables: str):
+        for t in tables:
+            self._versions[t] += 1
+
+    def _table_versions(self, tables: Tuple[str, ...]) -> tuple:
+        return tuple(map(self._versions.__getitem__, tables))
+
+    def table_versions(self) -> Dict[str, int]:
+        return dict(self._versions)
+
+    def result_cache_stats(self) -> dict:
+        return (self._results if self._results is not None else ResultCache(0)).stats()
+
+    @property
+    def _student_index(self) -> Dict[str, int]:
+        return self.students.index
 
     def _rebuild_index(self):
-        self._student_index = {s.email_address: i for i, s in enumerate(self.students)}
+        self._touch("students")
+        self.students.reindex()
+        self._views.clear()
+        self._marks_index.clear()
+        self._names = None
+        members = self._course_members
+        members.clear()
+        self._course_aggs.clear()
+        for slot, s in self.students.items():
+            m = members.get(s.course_id)
+            if m is None:
+                m = members[s.course_id] = {}
+            m[slot] = None
+        get = self.students.get
+        for course_id, slots in members.items():
+            self._course_aggs[course_id] = CourseAggregate.build(map(get, slots))
+
+    def _rebuild_course_index(self):
+        # first entry wins for duplicate ids, as the old linear scans did
+        self._touch("courses")
+        self._course_index.clear()
+        for i, c in enumerate(self.courses):
+            self._course_index.setdefault(c.course_id, i)
+
+    def _rebuild_professor_index(self):
+        self._touch("professors")
+        self._professor_courses.clear()
+        self._professor_index.clear()
+        self._course_professors.clear()
+        for i, p in enumerate(self.professors):
+            self._professor_index.setdefault(p.professor_id, i)
+            self._professor_courses.setdefault(p.professor_id, []).append(p.course_id)
+            self._course_professors.setdefault(p.course_id, {})[p.professor_id] = None
+
+    def _check_course(self, course_id: str):
+        if self.foreign_keys and course_id and course_id not in self._course_index:
+            raise ValueError(f"course {course_id} does not exist")
+
+    # ---------- Secondary indexes ----------
+    def _index_student(self, slot: int, s: Student):
+        self._dirty_courses.add(s.course_id)
+        self._course_members.setdefault(s.course_id, {})[slot] = None
+        agg = self._course_aggs.get(s.course_id)
+        if agg is None:
+            agg = self._course_aggs[s.course_id] = CourseAggregate()
+        agg.add(s.marks, s.grade)
+        for v in self._views.values():
+            if v.covers(s):
+                v.add(slot, s)
+        for cid in (None, s.course_id):
+            v = self._marks_index.get(cid)
+            if v is not None:
+                v.add(slot, s)
+        if self._names is not None:
+            self._names.add(slot, s)
+
+    def _unindex_student(self, slot: int, s: Student):
+        self._dirty_courses.add(s.course_id)
+        members = self._course_members.get(s.course_id)
+        if members is not None:
+            members.pop(slot, None)
+            if not members:
+                del self._course_members[s.course_id]
+        agg = self._course_aggs.get(s.course_id)
+        if agg is not None:
+            agg.remove(s.marks, s.grade)
+            if not agg:
+                del self._course_aggs[s.course_id]
+        for v in self._views.values():
+            if v.covers(s):
+                v.remove(slot, s)
+        for cid in (None, s.course_id):
+            v = self._marks_index.get(cid)
+            if v is not None:
+                v.remove(slot, s)
+        if self._names is not None:
+            self._names.remove(slot, s)
 
     def add_student(self, s: Student):
         if not s.email_address:
             raise ValueError("student email (id) cannot be empty")
         if s.email_address in self._student_index:
             raise ValueError(f"student with email {s.email_address} already exists")
-        if s.course_id and not any(c.course_id == s.course_id for c in self.courses):
-            pass
+        self._check_course(s.course_id)
+        s.marks = parse_marks(s.marks)
         if (not s.grade or s.grade.strip() == "") and s.marks is not None:
-            s.grade = grade_from_marks(int(s.marks))
-        self.students.append(s)
-        self._rebuild_index()
+            s.grade = self._grade_for(s.course_id, s.marks)
+        slot = self.students.insert(s)
+        self._index_student(slot, s)
+        self._log("add", "students", row={f: getattr(s, f) for f in STUDENT_FIELDS})
 
     def delete_student(self, email: str) -> bool:
-        idx = self._student_index.get(email)
-        if idx is None:
+        slot = self._student_index.get(email)
+        if slot is None:
             return False
-        self.students.pop(idx)
-        self._rebuild_index()
+        self._unindex_student(slot, self.students.remove(slot))
+        self._log("delete", "students", email)
         return True
 
     def update_student(self, email: str, **updates) -> bool:
-        idx = self._student_index.get(email)
-        if idx is None:
+        slot = self._student_index.get(email)
+        if slot is None:
             return False
-        s = self.students[idx]
-        for k, v in updates.items():
-            if hasattr(s, k):
-                setattr(s, k, v)
-        if "marks" in updates and updates["marks"] is not None:
-            s.grade = grade_from_marks(int(s.marks))
-        self.students[idx] = s
-        self._rebuild_index()
+        new_email = updates.get("email_address")
+        if new_email is not None and new_email != email:
+            if not new_email:
+                raise ValueError("student email (id) cannot be empty")
+            if new_email in self._student_index:
+                raise ValueError(f"student with email {new_email} already exists")
+        if "course_id" in updates:
+            self._check_course(updates["course_id"])
+        if updates.get("marks") is not None:
+            updates["marks"] = parse_marks(updates["marks"])
+        self._apply_update(slot, email, updates)
+        self._log("update", "students", email, fields={k: v for k, v in updates.items() if k in STUDENT_FIELDS})
         return True
 
+    def _apply_update(self, slot: int, email: str, updates: dict):
+        # callers validate first; if setting a field still fails, the old values go back in
+        s = self.students.get(slot)
+        old = {f: getattr(s, f) for f in STUDENT_FIELDS}
+        self._unindex_student(slot, s)
+        try:
+            for k, v in updates.items():
+                if hasattr(s, k):
+                    setattr(s, k, v)
+            if "marks" in updates and updates["marks"] is not None:
+                s.grade = self._grade_for(s.course_id, int(s.marks))
+            elif s.course_id != old["course_id"] and s.marks is not None and \
+                    self._grade_table(s.course_id) is not self._grade_table(old["course_id"]):
+                s.grade = self._grade_for(s.course_id, int(s.marks))
+        except Exception:
+            for f, v in old.items():
+                setattr(s, f, v)
+            self._index_student(slot, s)
+            raise
+        if s.email_address != email:
+            self.students.rekey(email, s.email_address)
+        self._index_student(slot, s)
+
+    # ---------- Bulk mutations ----------
+    # Each call validates the whole batch before touching anything, so a bad
+    # row raises ValueError and leaves the table as it was. Batches larger
+    # than BULK_PATCH_LIMIT drop the cached sorted views they touch (rebuilt
+    # once on next use) instead of patching them row by row.
+    BULK_PATCH_LIMIT = 64
+
+    def _drop_views(self, course_ids):
+        for k in [k for k in self._views if k[1] is None or k[1] in course_ids]:
+            del self._views[k]
+        for k in [k for k in self._marks_index if k is None or k in course_ids]:
+            del self._marks_index[k]
+
+    def add_students(self, records: Iterable[Student]) -> int:
+        records = list(records)
+        seen = set()
+        for s in records:
+            if not s.email_address:
+                raise ValueError("student email (id) cannot be empty")
+            if s.email_address in self._student_index or s.email_address in seen:
+                raise ValueError(f"student with email {s.email_address} already exists")
+            seen.add(s.email_address)
+        for course_id in {s.course_id for s in records}:
+            self._check_course(course_id)
+        for s in records:
+            s.marks = parse_marks(s.marks)
+        for s in records:
+            if (not s.grade or s.grade.strip() == "") and s.marks is not None:
+                s.grade = self._grade_for(s.course_id, s.marks)
+        self.students.check({"course_id": s.course_id, "grade": s.grade, "marks": s.marks} for s in records)
+        if len(records) > self.BULK_PATCH_LIMIT:
+            self._drop_views({s.course_id for s in records})
+        insert, index = self.students.insert, self._index_student
+        for s in records:
+            index(insert(s), s)
+        if records:
+            self._log("add_many", "students", rows=[{f: getattr(s, f) for f in STUDENT_FIELDS} for s in records])
+        return len(records)
+
+    def update_students(self, updates) -> int:
+        # updates: {email: {field: value}} or (email, {field: value}) pairs, e.g. a gradebook upload
+        items = list(updates.items() if isinstance(updates, dict) else updates)
+        index = self._student_index
+        renamed_to, seen = set(), set()
+        plan = []
+        for email, fields in items:
+            slot = index.get(email)
+            if slot is None:
+                raise ValueError(f"student with email {email} not found")
+            if email in seen:
+                raise ValueError(f"student with email {email} is listed twice")
+            seen.add(email)
+            unknown = set(fields) - set(STUDENT_FIELDS)
+            if unknown:
+                raise ValueError(f"unknown student fields: {', '.join(sorted(unknown))}")
+            fields = dict(fields)
+            if fields.get("marks") is not None:
+                fields["marks"] = parse_marks(fields["marks"])
+            if "course_id" in fields:
+                self._check_course(fields["course_id"])
+            new_email = fields.get("email_address")
+            if new_email is not None and new_email != email:
+                if not new_email:
+                    raise ValueError("student email (id) cannot be empty")
+                if new_email in index or new_email in renamed_to:
+                    raise ValueError(f"student with email {new_email} already exists")
+                renamed_to.add(new_email)
+            plan.append((slot, email, fields))
+        self.students.check(fields for _, _, fields in plan)
+        if len(plan) > self.BULK_PATCH_LIMIT:
+            get = self.students.get
+            touched = {get(slot).course_id for slot, _, _ in plan}
+            touched.update(f["course_id"] for _, _, f in plan if "course_id" in f)
+            self._drop_views(touched)
+        for slot, email, fields in plan:
+            self._apply_update(slot, email, fields)
+        if plan:
+            self._log("update_many", "students", changes=[[email, fields] for _, email, fields in plan])
+        return len(plan)
+
+    def delete_students(self, emails: Iterable[str], missing_ok: bool = False) -> int:
+        # missing emails raise ValueError unless missing_ok; returns how many were deleted
+        index = self._student_index
+        slots = {}
+        for email in emails:
+            slot = index.get(email)
+            if slot is None:
+                if missing_ok:
+                    continue
+                raise ValueError(f"student with email {email} not found")
+            slots[email] = slot
+        if len(slots) > self.BULK_PATCH_LIMIT:
+            get = self.students.get
+            self._drop_views({get(slot).course_id for slot in slots.values()})
+        remove, unindex = self.students.remove, self._unindex_student
+        for slot in slots.values():
+            unindex(slot, remove(slot))
+        if slots:
+            self._log("delete_many", "students", keys=list(slots))
+        return len(slots)
+
     def search_student_linear(self, email: str) -> Tuple[Optional[Student], float]:
         t0 = time.perf_counter()
         for s in self.students:
@@ -76,234 +392,785 @@ class CheckMyGradeDB:
 
     def search_student_indexed(self, email: str) -> Tuple[Optional[Student], float]:
         t0 = time.perf_counter()
-        idx = self._student_index.get(email)
-        s = self.students[idx] if idx is not None else None
+        slot = self._student_index.get(email)
+        s = self.students.get(slot) if slot is not None else None
         t1 = time.perf_counter()
         return s, (t1 - t0)
 
     def sort_students(self, by: str = "email", ascending: bool = True) -> float:
-        key_funcs = {
-            "email": lambda s: s.email_address.lower(),
-            "marks": lambda s: (s.marks if s.marks is not None else -1),
-            "name":  lambda s: (s.last_name.lower(), s.first_name.lower()),
-            "grade": lambda s: s.grade
-        }
-        if by not in key_funcs:
-            raise ValueError("by must be one of: " + ", ".join(key_funcs))
+        # reorders the roster itself; sorted_students()/students_page() leave it alone
+        key = sort_key(by)
         t0 = time.perf_counter()
-        self.students.sort(key=key_funcs[by], reverse=not ascending)
+        self.students.sort(key=key, reverse=not ascending)
         t1 = time.perf_counter()
         self._rebuild_index()
         return (t1 - t0)
 
+    # ---------- Grade scales ----------
+    def _grade_table(self, course_id: str) -> Optional[List[str]]:
+        t = self._grade_tables.get(course_id)
+        return t if t is not None else self._grade_tables.get(DEFAULT_SCALE_ID)
+
+    def _grade_for(self, course_id: str, marks: int) -> str:
+        t = self._grade_table(course_id)
+        if t is None:
+            return grade_from_marks(marks)
+        return t[0 if marks < 0 else 100 if marks > 100 else marks]
+
+    def _rebuild_grade_tables(self):
+        by_scale: Dict[str, List[GradeRange]] = {}
+        for r in self.grade_ranges:
+            by_scale.setdefault(r.grade_id, []).append(r)
+        self._grade_tables = {sid: compile_grade_scale(rs) for sid, rs in by_scale.items()}
+        self._touch("grade_scales")
+
+    def grade_scale(self, course_id: str) -> List[GradeRange]:
+        # the ranges in force for a course ("default" falls back to the built-in scale)
+        for sid in (course_id, DEFAULT_SCALE_ID):
+            rs = [r for r in self.grade_ranges if r.grade_id == sid]
+            if rs:
+                return rs
+        return list(DEFAULT_GRADE_RANGES)
+
+    def set_grade_scale(self, scale_id: str, ranges: List[GradeRange], regrade: bool = True) -> int:
+        # scale_id is a course_id, or "default" for every course without its own scale;
+        # returns how many students were regraded
+        ranges = [GradeRange(scale_id, r.grade, int(r.min_marks), int(r.max_marks)) for r in ranges]
+        table = compile_grade_scale(ranges)
+        self.grade_ranges = [r for r in self.grade_ranges if r.grade_id != scale_id] + ranges
+        self._grade_tables[scale_id] = table
+        self._log("set", "grade_scales", scale_id, rows=[asdict(r) for r in ranges], regrade=regrade)
+        return self._regrade_scale(scale_id) if regrade else 0
+
+    def clear_grade_scale(self, scale_id: str, regrade: bool = True) -> int:
+        self.grade_ranges = [r for r in self.grade_ranges if r.grade_id != scale_id]
+        self._grade_tables.pop(scale_id, None)
+        self._log("delete", "grade_scales", scale_id, regrade=regrade)
+        return self._regrade_scale(scale_id) if regrade else 0
+
+    def _rekey_grade_scale(self, course_id: str, new_id: Optional[str]):
+        # a course's own scale follows it to new_id, or goes with it when new_id is None;
+        # whatever scale new_id had before is dropped
+        if DEFAULT_SCALE_ID in (course_id, new_id):
+            return
+        ids = (course_id, new_id)
+        if not any(r.grade_id in ids for r in self.grade_ranges):
+            return
+        moved = [] if new_id is None else [GradeRange(new_id, r.grade, r.min_marks, r.max_marks)
+                                           for r in self.grade_ranges if r.grade_id == course_id]
+        self.grade_ranges = [r for r in self.grade_ranges if r.grade_id not in ids] + moved
+        self._rebuild_grade_tables()
+
+    def _regrade_scale(self, scale_id: str) -> int:
+        if scale_id != DEFAULT_SCALE_ID:
+            return self.regrade_course(scale_id)
+        return sum(self.regrade_course(cid) for cid in list(self._course_members)
+                   if cid not in self._grade_tables)
+
+    def regrade_course(self, course_id: str) -> int:
+        # one batched pass: grades from the lookup table, histogram from the mark counts
+        members = self._course_members.get(course_id)
+        if not members:
+            return 0
+        table = self._grade_table(course_id) or DEFAULT_GRADE_TABLE
+        get = self.students.get
+        before = [get(slot).grade for slot in members] if self._changes is not None else None
+        self.students.regrade(members, table)
+        self._touch("students")
+        if before is not None:
+            for slot, grade in zip(members, before):
+                s = get(slot)
+                if s.grade != grade:
+                    self._changes.record("update", "students", s.email_address, {"grade": s.grade})
+        self._dirty_courses.add(course_id)
+        agg = self._course_aggs[course_id]
+        if agg.count == sum(agg.grades.values()):
+            agg.grades.clear()
+            for m, n in agg._counts.items():
+                agg.grades[table[0 if m < 0 else 100 if m > 100 else m]] += n
+        else:
+            self._course_aggs[course_id] = CourseAggregate.build(map(get, members))
+        for k in [k for k in self._views if k[0] == "grade" and k[1] in (None, course_id)]:
+            del self._views[k]
+        return len(members)
+
+    # ---------- Sorted views ----------
+    MAX_VIEWS = 8
+
+    def _course_records(self, course_id: Optional[str]):
+        if course_id is None:
+            return self.students.items()
+        get = self.students.get
+        return ((slot, get(slot)) for slot in self._course_members.get(course_id, ()))
+
+    def _view(self, by: str, course_id: Optional[str] = None) -> SortedView:
+        if by == "marks":
+            return self._marks_view(course_id)
+        k = (by, course_id)
+        with self._cache_lock:
+            v = self._views.get(k)
+            if v is None:
+                v = self._views[k] = SortedView(by, self._course_records(course_id), course_id)
+                while len(self._views) > self.MAX_VIEWS:
+                    self._views.popitem(last=False)
+            else:
+                self._views.move_to_end(k)
+            return v
+
+    def sorted_students(self, by: str = "email", ascending: bool = True,
+                        course_id: Optional[str] = None) -> Iterator[Student]:
+        return map(self.students.get, self._view(by, course_id).slots(ascending))
+
+    def students_page(self, page: int, page_size: int = 20, by: str = "email", ascending: bool = True,
+                      course_id: Optional[str] = None) -> List[Student]:
+        # page is 0-based
+        start = page * page_size
+        slots = self._view(by, course_id).slots(ascending, start, start + page_size)
+        return [self.students.get(slot) for slot in slots]
+
+    def top_n(self, n: int, by: str = "marks", course_id: Optional[str] = None) -> List[Student]:
+        return self._extreme(n, by, course_id, largest=True)
+
+    def bottom_n(self, n: int, by: str = "marks", course_id: Optional[str] = None) -> List[Student]:
+        return self._extreme(n, by, course_id, largest=False)
+
+    def _extreme(self, n: int, by: str, course_id: Optional[str], largest: bool) -> List[Student]:
+        v = self._marks_index.get(course_id) if by == "marks" else self._views.get((by, course_id))
+        if v is not None:
+            return [self.students.get(slot) for slot in v.slots(not largest, 0, n)]
+        # (key, slot) like SortedView, so ties come out the same with or without a cached view
+        key = sort_key(by)
+        pick = heapq.nlargest if largest else heapq.nsmallest
+        return [s for _, s in pick(n, self._course_records(course_id), key=lambda e: (key(e[1]), e[0]))]
+
+    # ---------- Marks range / rank queries ----------
+    def _marks_view(self, course_id: Optional[str] = None) -> SortedView:
+        # one marks-ordered index per course plus one overall (course_id None), kept until the next reload
+        v = self._marks_index.get(course_id)
+        if v is None:
+            with self._cache_lock:
+                v = self._marks_index.get(course_id)
+                if v is None:
+                    v = self._marks_index[course_id] = SortedView("marks", self._course_records(course_id),
+                                                                  course_id)
+        return v
+
+    def students_in_range(self, lo: Optional[int] = None, hi: Optional[int] = None,
+                          course_id: Optional[str] = None) -> List[Student]:
+        # marks in lo..hi inclusive, lowest first
+        v = self._marks_view(course_id)
+        i, j = v.bounds(lo, hi)
+        return [self.students.get(slot) for slot in v.slots(True, i, j)]
+
+    def count_in_range(self, lo: Optional[int] = None, hi: Optional[int] = None,
+                       course_id: Optional[str] = None) -> int:
+        i, j = self._marks_view(course_id).bounds(lo, hi)
+        return j - i
+
+    def count_above(self, threshold: int, course_id: Optional[str] = None) -> int:
+        return self.count_in_range(threshold + 1, None, course_id)
+
+    def count_below(self, threshold: int, course_id: Optional[str] = None) -> int:
+        return self.count_in_range(None, threshold - 1, course_id)
+
+    def student_rank(self, email: str, course_id: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        # (rank, total) with 1 = highest marks; ties share the best rank
+        slot = self._student_index.get(email)
+        if slot is None:
+            return None
+        s = self.students.get(slot)
+        v = self._marks_view(course_id)
+        if not v.covers(s):
+            return None
+        _, j = v.bounds(v.key(s), v.key(s))
+        return len(v) - j + 1, len(v)
+
+    def student_percentile(self, email: str, course_id: Optional[str] = None) -> Optional[float]:
+        # percentile rank: share scoring below, counting half of the ties
+        slot = self._student_index.get(email)
+        if slot is None:
+            return None
+        s = self.students.get(slot)
+        v = self._marks_view(course_id)
+        if not v.covers(s):
+            return None
+        i, j = v.bounds(v.key(s), v.key(s))
+        return 100.0 * (i + (j - i) / 2) / len(v)
+
+    # ---------- Name search ----------
+    def _name_index(self) -> NameIndex:
+        names = self._names
+        if names is None:
+            with self._cache_lock:
+                names = self._names
+                if names is None:
+                    names = self._names = NameIndex(self.students.items(), self.students.get)
+        return names
+
+    def search_names(self, query: str, limit: int = 20) -> List[Tuple[Student, float]]:
+        # prefix match on first/last name words ("Ngu", "sam carp"; a trailing * is allowed), best first
+        get = self.students.get
+        return [(get(slot), score) for slot, score in self._name_index().search(query.rstrip("*"), limit)]
+
+    def fuzzy_search_names(self, query: str, limit: int = 20, min_score: float = 0.3) -> List[Tuple[Student, float]]:
+        # typo-tolerant: trigram similarity of each query word to the closest name word, best first
+        get = self.students.get
+        return [(get(slot), score)
+                for slot, score in self._name_index().search(query, limit, fuzzy=True, min_score=min_score)]
+
+    def complete_name(self, prefix: str, limit: int = 10) -> List[str]:
+        # distinct first/last names starting with the last word of prefix, shortest first
+        return self._name_index().completions(prefix, limit)
+
     def add_course(self, c: Course):
         if not c.course_id:
             raise ValueError("course_id cannot be empty")
-        if any(x.course_id == c.course_id for x in self.courses):
+        if c.course_id in self._course_index:
             raise ValueError(f"course {c.course_id} already exists")
+        self._course_index[c.course_id] = len(self.courses)
         self.courses.append(c)
+        self._log("add", "courses", row=asdict(c))
 
-    def delete_course(self, course_id: str) -> bool:
-        for i, c in enumerate(self.courses):
-            if c.course_id == course_id:
-                self.courses.pop(i)
-                return True
-        return False
+    def _course_references(self, course_id: str) -> Tuple[int, int]:
+        # (students, professors) pointing at course_id, straight from the member indexes
+        return len(self._course_members.get(course_id, ())), len(self._course_professors.get(course_id, ()))
 
-    def update_course(self, course_id: str, **updates) -> bool:
-        for i, c in enumerate(self.courses):
-            if c.course_id == course_id:
-                for k, v in updates.items():
-                    if hasattr(c, k):
-                        setattr(c, k, v)
-                self.courses[i] = c
-                return True
-        return False
+    def delete_course(self, course_id: str, on_delete: str = "restrict") -> bool:
+        # on_delete="restrict" refuses while students or professors reference the course;
+        # "cascade" deletes them too (O(k) in the course's members)
+        if on_delete not in ("restrict", "cascade"):
+            raise ValueError("on_delete must be restrict or cascade")
+        i = self._course_index.get(course_id)
+        if i is None:
+            return False
+        n_students, n_profs = self._course_references(course_id)
+        if on_delete == "restrict" and self.foreign_keys and (n_students or n_profs):
+            raise ValueError(f"course {course_id} is referenced by {n_students} students "
+                             f"and {n_profs} professors")
+        if on_delete == "cascade":
+            if n_students:
+                get = self.students.get
+                self.delete_students([get(slot).email_address
+                                      for slot in list(self._course_members[course_id])])
+            if n_profs:
+                if self._changes is not None:
+                    for pid in self._course_professors[course_id]:
+                        self._changes.record("delete", "professors", pid)
+                self.professors[:] = [p for p in self.professors if p.course_id != course_id]
+                self._rebuild_professor_index()
+        self.courses.pop(i)
+        self._rebuild_course_index()
+        self._rekey_grade_scale(course_id, None)
+        self._log("delete", "courses", course_id, on_delete=on_delete)
+        return True
+
+    def update_course(self, course_id: str, /, **updates) -> bool:
+        i = self._course_index.get(course_id)
+        if i is None:
+            return False
+        new_id = updates.get("course_id", course_id)
+        if new_id != course_id:
+            if not new_id:
+                raise ValueError("course_id cannot be empty")
+            if new_id in self._course_index:
+                raise ValueError(f"course {new_id} already exists")
+            if self.foreign_keys and any(self._course_references(course_id)):
+                raise ValueError(f"course {course_id} is still referenced; cannot rename it")
+        c = self.courses[i]
+        for k, v in updates.items():
+            if hasattr(c, k):
+                setattr(c, k, v)
+        if new_id != course_id:
+            del self._course_index[course_id]
+            self._course_index[new_id] = i
+            self._rekey_grade_scale(course_id, new_id)
+        self._log("update", "courses", course_id, fields=updates)
+        return True
 
     # ---------- CRUD: Professor ----------
     def add_professor(self, p: Professor):
         if not p.professor_id:
             raise ValueError("professor_id cannot be empty")
-        if any(x.professor_id == p.professor_id for x in self.professors):
+        if p.professor_id in self._professor_index:
             raise ValueError(f"professor {p.professor_id} already exists")
+        self._check_course(p.course_id)
+        self._professor_index[p.professor_id] = len(self.professors)
         self.professors.append(p)
+        self._professor_courses.setdefault(p.professor_id, []).append(p.course_id)
+        self._course_professors.setdefault(p.course_id, {})[p.professor_id] = None
+        self._log("add", "professors", row=asdict(p))
 
     def delete_professor(self, professor_id: str) -> bool:
-        for i, p in enumerate(self.professors):
-            if p.professor_id == professor_id:
-                self.professors.pop(i)
-                return True
-        return False
+        i = self._professor_index.get(professor_id)
+        if i is None:
+            return False
+        self.professors.pop(i)
+        self._rebuild_professor_index()
+        self._log("delete", "professors", professor_id)
+        return True
 
-    def update_professor(self, professor_id: str, **updates) -> bool:
-        for i, p in enumerate(self.professors):
-            if p.professor_id == professor_id:
-                for k, v in updates.items():
-                    if hasattr(p, k):
-                        setattr(p, k, v)
-                self.professors[i] = p
-                return True
-        return False
+    def update_professor(self, professor_id: str, /, **updates) -> bool:
+        i = self._professor_index.get(professor_id)
+        if i is None:
+            return False
+        new_id = updates.get("professor_id", professor_id)
+        if new_id != professor_id:
+            if not new_id:
+                raise ValueError("professor_id cannot be empty")
+            if new_id in self._professor_index:
+                raise ValueError(f"professor {new_id} already exists")
+        if "course_id" in updates:
+            self._check_course(updates["course_id"])
+        p = self.professors[i]
+        for k, v in updates.items():
+            if hasattr(p, k):
+                setattr(p, k, v)
+        if new_id != professor_id or "course_id" in updates:
+            self._rebuild_professor_index()
+        self._log("update", "professors", professor_id, fields=updates)
+        return True
 
     # ---------- Reports / Stats ----------
+    @versioned("students")
     def course_stats(self, course_id: str):
-        marks = [s.marks for s in self.students if s.course_id == course_id and s.marks is not None]
-        if not marks:
+        agg = self._course_aggs.get(course_id)
+        if agg is None or not agg.count:
             return {"count": 0, "average": None, "median": None}
         return {
-            "count": len(marks),
-            "average": sum(marks) / len(marks),
-            "median": statistics.median(marks)
+            "count": agg.count,
+            "average": agg.mean,
+            "median": agg.median
         }
 
+    def course_percentile(self, course_id: str, p: float) -> Optional[int]:
+        agg = self._course_aggs.get(course_id)
+        return agg.percentile(p) if agg is not None else None
+
+    @versioned("students")
+    def course_histogram(self, course_id: str) -> Dict[str, int]:
+        agg = self._course_aggs.get(course_id)
+        return agg.histogram() if agg is not None else CourseAggregate().histogram()
+
+    @versioned("students")
     def report_course_wise(self, course_id: str):
-        return [s for s in self.students if s.course_id == course_id]
+        return list(self.iter_course_wise(course_id))
+
+    def iter_course_wise(self, course_id: str) -> Iterator[Student]:
+        # lazy; don't add/delete students in this course while iterating
+        return map(self.students.get, self._course_members.get(course_id, ()))
 
     def report_student(self, email: str):
         s, _ = self.search_student_indexed(email)
         return s
 
+    @versioned("students", "professors")
     def report_professor_wise(self, professor_id: str):
-        taught_courses = [p.course_id for p in self.professors if p.professor_id == professor_id]
-        return [s for s in self.students if s.course_id in taught_courses]
+        return list(self.iter_professor_wise(professor_id))
+
+    def iter_professor_wise(self, professor_id: str) -> Iterator[Student]:
+        for course_id in dict.fromkeys(self._professor_courses.get(professor_id, ())):
+            yield from self.iter_course_wise(course_id)
+
+    # ---------- Change log ----------
+    def _change_log(self) -> ChangeLog:
+        if self._changes is None:
+            raise ValueError("the change log is off; open the db with change_log=N")
+        return self._changes
+
+    def change_cursor(self) -> Dict[str, object]:
+        log = self._change_log()
+        return {"log_id": log.log_id, "seq": log.seq}
+
+    def changes_since(self, seq: int, log_id: Optional[str] = None) -> Optional[List[dict]]:
+        """Changes after seq, oldest first: {"seq", "op", "table", "key", "row"|"fields"}.
+
+        op is insert (row), update (fields that changed; key is the key
+        before the change) or delete. None means the delta can't be given in
+        full any more; resync with export_changes(), which falls back to a
+        snapshot.
+        """
+        delta = self._change_log().since(seq, log_id)
+        return None if delta is None else [change_dict(c) for c in delta]
+
+    def _snapshot_changes(self, seq: int) -> Iterator[Change]:
+        # courses first, so a mirror with foreign keys can apply the rows in order
+        for c in self.courses:
+            yield seq, "insert", "courses", c.course_id, asdict(c)
+        for p in self.professors:
+            yield seq, "insert", "professors", p.professor_id, asdict(p)
+        for s in self.students:
+            yield seq, "insert", "students", s.email_address, {f: getattr(s, f) for f in STUDENT_FIELDS}
+
+    def export_changes(self, sink: IO[str], since: Optional[int] = None, log_id: Optional[str] = None,
+                       fmt: str = "jsonl") -> dict:
+        """Stream the changes after `since` to sink as JSON lines or CSV.
+
+        When since is None or changes_since() can't answer it, a full snapshot
+        is written instead: one "snapshot" record (key = log_id) meaning "empty
+        the mirror", then an insert per course, professor and student. Returns
+        the cursor for the next call: {"log_id", "seq", "snapshot", "lines"}.
+        """
+        log = self._change_log()
+        seq = log.seq
+        delta = None if since is None else log.since(since, log_id)
+        if delta is None:
+            changes = chain([(seq, "snapshot", "", log.log_id, None)], self._snapshot_changes(seq))
+        else:
+            # on SQLite another connection may have added changes after seq was read
+            changes, seq = delta, max(seq, delta[-1][0]) if delta else seq
+        lines = write_lines(iter_change_lines(changes, fmt), sink)
+        return {"log_id": log.log_id, "seq": seq, "snapshot": delta is None, "lines": lines}
 
     # ---------- CSV I/O ----------
     def save_all(self):
+        if self.journal is not None:
+            if self.journal.pending >= self.journal_compact_at:
+                # keep replay on the next load_all() short
+                self.compact_journal()
+            else:
+                # changes are already in the journal; just make them durable
+                self.journal.sync()
+            return
+        self._save_tables()
+
+    def _save_tables(self):
         self.save_students()
         self.save_courses()
         self.save_professors()
         self.save_logins()
+        self.save_grade_ranges()
+        if self.snapshot:
+            write_snapshot(self, self.snapshot_path)
+
+    def _snapshot_is_fresh(self) -> bool:
+        try:
+            snap = self.snapshot_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        for p in (self.student_csv, self.shard_dir / MANIFEST, self.course_csv, self.professor_csv,
+                  self.login_csv, self.grade_csv):
+            if p.exists() and p.stat().st_mtime_ns > snap:
+                return False
+        return True
 
     def load_all(self):
-        self.load_courses()
-        self.load_professors()
-        self.load_students()   
-        self.load_logins()
+        self._dirty_courses.clear()
+        self._reset_changes()
+        loaded = False
+        if self.snapshot and self._snapshot_is_fresh():
+            try:
+                with gc_paused():
+                    read_snapshot(self, self.snapshot_path)
+                loaded = True
+            except (SnapshotError, ValueError, KeyError):
+                loaded = False
+        if not loaded:
+            self.load_grade_ranges()
+            self.load_courses()
+            self.load_professors()
+            self.load_students()
+            self.load_logins()
+        if self.journal is not None:
+            self._replay_journal()
+
+    def compact_journal(self):
+        # fold the journal into the CSV snapshot, then start an empty log
+        self._save_tables()
+        if self.journal is not None:
+            self.journal.truncate()
+
+    def _replay_journal(self):
+        # records were checked when they were written; replay them as they are
+        journal, self.journal = self.journal, None
+        foreign_keys, self.foreign_keys = self.foreign_keys, False
+        changes, self._changes = self._changes, None
+        journal.pending = 0
+        try:
+            for rec in journal.replay():
+                self._apply_change(rec)
+                journal.pending += 1
+        finally:
+            self.journal = journal
+            self.foreign_keys = foreign_keys
+            self._changes = changes
+
+    def _apply_change(self, rec: dict):
+        # replay is idempotent: adds of existing keys become updates,
+        # updates/deletes of missing keys are no-ops
+        op, table, key = rec["op"], rec["table"], rec.get("key")
+        if table == "students":
+            if op == "add":
+                row = rec["row"]
+                if row["email_address"] in self._student_index:
+                    self.update_student(row["email_address"], **row)
+                else:
+                    self.add_student(Student(**row))
+            elif op == "update":
+                self._replay_update(table, key, rec["fields"])
+            elif op == "delete":
+                self.delete_student(key)
+            elif op == "add_many":
+                for row in rec["rows"]:
+                    self._apply_change({"op": "add", "table": table, "row": row})
+            elif op == "update_many":
+                for email, fields in rec["changes"]:
+                    self._replay_update(table, email, fields)
+            elif op == "delete_many":
+                for email in rec["keys"]:
+                    self.delete_student(email)
+        elif table == "courses":
+            if op == "add":
+                row = rec["row"]
+                if not self.update_course(row["course_id"], **row):
+                    self.add_course(Course(**row))
+            elif op == "update":
+                self._replay_update(table, key, rec["fields"])
+            elif op == "delete":
+                self.delete_course(key, rec.get("on_delete", "restrict"))
+        elif table == "professors":
+            if op == "add":
+                row = rec["row"]
+                if not self.update_professor(row["professor_id"], **row):
+                    self.add_professor(Professor(**row))
+            elif op == "update":
+                self._replay_update(table, key, rec["fields"])
+            elif op == "delete":
+                self.delete_professor(key)
+        elif table == "grade_scales":
+            # records from before the flag was journaled always regraded
+            regrade = rec.get("regrade", True)
+            if op == "set":
+                self.set_grade_scale(key, [GradeRange(**r) for r in rec["rows"]], regrade)
+            elif op == "delete":
+                self.clear_grade_scale(key, regrade)
+        elif table == "login_users" and op == "add":
+            self._put_login(LoginUser(**rec["row"]))
+
+    def _replay_update(self, table: str, key: str, fields: dict):
+        # a rename onto a key that already exists means the tables are ahead of this record
+        # (a compaction saved them but stopped before truncating the journal); later records
+        # bring that row to its final state, so the rename is skipped
+        index, update = {"students": (self._student_index, self.update_student),
+                         "courses": (self._course_index, self.update_course),
+                         "professors": (self._professor_index, self.update_professor)}[table]
+        new_key = fields.get(CHANGE_FIELDS[table][0], key)
+        if new_key != key and new_key in index:
+            return
+        update(key, **fields)
 
     def save_students(self):
-        with self.student_csv.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=STUDENT_HEADERS)
-            writer.writeheader()
-            for s in self.students:
-                writer.writerow({
-                    "Email_address": s.email_address,
-                    "First_name": s.first_name,
-                    "Last_name": s.last_name,
-                    "Course.id": s.course_id,
-                    "grades": s.grade,
-                    "Marks": s.marks,
-                })
+        if self.sharded:
+            return self.save_student_shards()
+        return self.export_students(self.student_csv)
 
     def load_students(self):
+        self._reset_changes()
         self.students.clear()
+        if self.sharded:
+            stats = self.load_student_shards()
+            if stats is not None:
+                return stats
         if not self.student_csv.exists():
             self._rebuild_index()
-            return
-        with self.student_csv.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                marks = int(row.get("Marks")) if (row.get("Marks","").strip() != "") else None
-                grade = row.get("grades", "").strip() or (grade_from_marks(marks) if marks is not None else "")
-                s = Student(
-                    email_address=row.get("Email_address","").strip(),
-                    first_name=row.get("First_name","").strip(),
-                    last_name=row.get("Last_name","").strip(),
-                    course_id=row.get("Course.id","").strip(),
-                    grade=grade,
-                    marks=marks if marks is not None else 0
-                )
-                self.students.append(s)
-        self._rebuild_index()
+            return io_stats(0, time.perf_counter())
+        return self.import_students(self.student_csv)
+
+    def import_students(self, path, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+        # rows for emails already present replace them, as a later CSV row would (SQLite: INSERT OR REPLACE)
+        t0 = time.perf_counter()
+        rows = 0
+        self._reset_changes()
+        store = self.students
+        index = store.index
+        with gc_paused():
+            for batch in iter_student_batches(path, STUDENT_HEADERS, batch_size, self._grade_for):
+                emails = {s.email_address for s in batch}
+                if len(emails) == len(batch) and not any(e in index for e in emails):
+                    store.extend(batch)
+                else:
+                    for s in batch:
+                        slot = index.get(s.email_address)
+                        if slot is not None:
+                            store.remove(slot)
+                        store.insert(s)
+                rows += len(batch)
+            self._rebuild_index()
+        return io_stats(rows, t0)
+
+    def export_students(self, path, buffer_size: int = WRITE_BUFFER_SIZE) -> dict:
+        t0 = time.perf_counter()
+        rows = write_rows(path, STUDENT_HEADERS, student_rows(self.students), buffer_size)
+        return io_stats(rows, t0)
+
+    # ---------- Sharded students (students/<course_id>.csv + manifest.json) ----------
+    def save_student_shards(self, full: bool = False, workers: Optional[int] = None) -> dict:
+        # only courses changed since the last load/save are rewritten, unless full or there is no manifest yet
+        t0 = time.perf_counter()
+        manifest = read_manifest(self.shard_dir)
+        if full or manifest is None:
+            courses = set(self._course_members) | set(manifest["shards"] if manifest else ())
+        else:
+            courses = set(self._dirty_courses)
+        get, members = self.students.get, self._course_members
+        rows = {cid: (len(members.get(cid, ())), student_rows(map(get, members.get(cid, ())))) for cid in courses}
+        n = save_shards(self.shard_dir, STUDENT_HEADERS, rows, workers)
+        self._dirty_courses.clear()
+        return io_stats(n, t0)
+
+    def load_student_shards(self, workers: Optional[int] = None) -> Optional[dict]:
+        # None when there is no manifest; shards are parsed in worker processes for large rosters
+        t0 = time.perf_counter()
+        with gc_paused():
+            cols = load_shards(self.shard_dir, STUDENT_HEADERS, self._grade_tables, workers)
+            if cols is None:
+                return None
+            self._reset_changes()
+            self.students.load_columns(*cols)
+            self._rebuild_index()
+        return io_stats(len(self.students), t0)
+
+    def load_course(self, course_id: str) -> int:
+        # re-read one course's shard, replacing only that course's students in memory
+        manifest = read_manifest(self.shard_dir)
+        entry = manifest["shards"].get(course_id) if manifest else None
+        self._drop_views({course_id})
+        self._touch("students")
+        self._reset_changes()
+        remove, insert = self.students.remove, self.students.insert
+        for slot in list(self._course_members.get(course_id, ())):
+            self._unindex_student(slot, remove(slot))
+        n = 0
+        if entry is not None:
+            emails, firsts, lasts, cvals, ccodes, gvals, gcodes, marks = read_shard(
+                (self.shard_dir / entry["file"], STUDENT_HEADERS, self._grade_tables))
+            index = self._student_index
+            for i, email in enumerate(emails):
+                slot = index.get(email)
+                if slot is not None:
+                    self._unindex_student(slot, remove(slot))
+                s = Student(email, firsts[i], lasts[i], cvals[ccodes[i]], gvals[gcodes[i]], marks[i])
+                self._index_student(insert(s), s)
+            n = len(emails)
+        self._dirty_courses.discard(course_id)
+        return n
 
     def save_courses(self):
-        with self.course_csv.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=COURSE_HEADERS)
-            writer.writeheader()
-            for c in self.courses:
-                writer.writerow({
-                    "Course_id": c.course_id,
-                    "Course_name": c.course_name,
-                    "Description": c.description,
-                    "Credits": c.credits
-                })
+        write_rows(self.course_csv, COURSE_HEADERS,
+                   ((c.course_id, c.course_name, c.description, c.credits) for c in self.courses))
 
     def load_courses(self):
+        self._reset_changes()
         self.courses.clear()
-        if not self.course_csv.exists():
-            return
-        with self.course_csv.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                credits = int(row.get("Credits", "3")) if row.get("Credits","").strip() else 3
-                c = Course(
-                    course_id=row.get("Course_id","").strip(),
-                    course_name=row.get("Course_name","").strip(),
-                    description=row.get("Description","").strip(),
-                    credits=credits
-                )
-                self.courses.append(c)
+        if self.course_csv.exists():
+            for batch in iter_row_batches(self.course_csv, COURSE_HEADERS):
+                for course_id, name, description, credits in batch:
+                    credits = int(credits) if credits.strip() else 3
+                    self.courses.append(Course(course_id.strip(), name.strip(), description.strip(), credits))
+        self._rebuild_course_index()
 
     def save_professors(self):
-        with self.professor_csv.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=PROF_HEADERS)
-            writer.writeheader()
-            for p in self.professors:
-                writer.writerow({
-                    "Professor_id": p.professor_id,
-                    "Professor_Name": p.professor_name,
-                    "Rank": p.rank,
-                    "Course.id": p.course_id
-                })
+        write_rows(self.professor_csv, PROF_HEADERS,
+                   ((p.professor_id, p.professor_name, p.rank, p.course_id) for p in self.professors))
 
     def load_professors(self):
+        self._reset_changes()
         self.professors.clear()
         if not self.professor_csv.exists():
+            self._rebuild_professor_index()
             return
-        with self.professor_csv.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                p = Professor(
-                    professor_id=row.get("Professor_id","").strip(),
-                    professor_name=row.get("Professor_Name","").strip(),
-                    rank=row.get("Rank","").strip(),
-                    course_id=row.get("Course.id","").strip(),
-                )
-                self.professors.append(p)
+        for batch in iter_row_batches(self.professor_csv, PROF_HEADERS):
+            for professor_id, name, rank, course_id in batch:
+                self.professors.append(Professor(professor_id.strip(), name.strip(), rank.strip(), course_id.strip()))
+        self._rebuild_professor_index()
 
     def save_logins(self):
-        with self.login_csv.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=LOGIN_HEADERS)
-            writer.writeheader()
-            for u in self.login_users:
-                writer.writerow({
-                    "User_id": u.user_id,
-                    "Password": u.password,
-                    "Role": u.role
-                })
+        write_rows(self.login_csv, LOGIN_HEADERS,
+                   ((u.user_id, u.password, u.role) for u in self.login_users))
 
     def load_logins(self):
         self.login_users.clear()
         if not self.login_csv.exists():
+            self._rebuild_login_index()
             return
-        with self.login_csv.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                u = LoginUser(
-                    user_id=row.get("User_id","").strip(),
-                    password=row.get("Password","").strip(),
-                    role=row.get("Role","").strip()
-                )
-                self.login_users.append(u)
+        for batch in iter_row_batches(self.login_csv, LOGIN_HEADERS):
+            for user_id, password, role in batch:
+                self.login_users.append(LoginUser(user_id.strip(), password.strip(), role.strip()))
+        self._rebuild_login_index()
+
+    def save_grade_ranges(self):
+        write_rows(self.grade_csv, GRADE_HEADERS,
+                   ((r.grade_id, r.grade, r.min_marks, r.max_marks) for r in self.grade_ranges))
+
+    def load_grade_ranges(self):
+        self.grade_ranges.clear()
+        if self.grade_csv.exists():
+            for batch in iter_row_batches(self.grade_csv, GRADE_HEADERS):
+                for grade_id, grade, lo, hi in batch:
+                    self.grade_ranges.append(GradeRange(grade_id.strip(), grade.strip(), int(lo), int(hi)))
+        self._rebuild_grade_tables()
+
+    # ---------- Login ----------
+    def _rebuild_login_index(self):
+        # first entry wins for duplicate user ids, as the old linear scan did
+        self._touch("login_users")
+        self._login_index.clear()
+        for i, u in enumerate(self.login_users):
+            self._login_index.setdefault(u.user_id, i)
+        self._login_cache.clear()
+
+    def _put_login(self, u: LoginUser):
+        i = self._login_index.get(u.user_id)
+        if i is None:
+            self._login_index[u.user_id] = len(self.login_users)
+            self.login_users.append(u)
+        else:
+            self.login_users[i] = u
+        self._login_cache.discard(u.user_id)
 
     def register_user(self, email: str, password_plain: str, role: str = "student"):
-        enc = encrypt_password(password_plain)
-        self.login_users.append(LoginUser(user_id=email, password=enc, role=role))
+        u = LoginUser(user_id=email, password=hash_password(password_plain, self.password_scheme, self.password_cost),
+                      role=role)
+        self._put_login(u)
+        self._log("add", "login_users", row=asdict(u))
+
+    def register_users(self, users: Iterable[Tuple[str, str, str]], workers: Optional[int] = None) -> int:
+        # (email, password, role) triples; passwords are hashed in a process pool
+        users = list(users)
+        tokens = hash_passwords((pw for _, pw, _ in users), self.password_scheme, self.password_cost, workers)
+        for (email, _, role), token in zip(users, tokens):
+            u = LoginUser(user_id=email, password=token, role=role)
+            self._put_login(u)
+            self._log("add", "login_users", row=asdict(u))
+        return len(users)
+
+    def migrate_legacy_passwords(self, workers: Optional[int] = None) -> int:
+        # re-hash reversible login.csv tokens with the KDF; returns how many were migrated
+        legacy = [(i, u) for i, u in enumerate(self.login_users) if not is_hashed(u.password)]
+        plains = []
+        for i, u in legacy:
+            try:
+                plains.append(decrypt_password(u.password))
+            except Exception:
+                plains.append(None)
+        legacy = [(iu, p) for iu, p in zip(legacy, plains) if p is not None]
+        tokens = hash_passwords((p for _, p in legacy), self.password_scheme, self.password_cost, workers)
+        for ((i, u), _), token in zip(legacy, tokens):
+            self.login_users[i] = LoginUser(user_id=u.user_id, password=token, role=u.role)
+            self._login_cache.discard(u.user_id)
+            self._log("add", "login_users", row=asdict(self.login_users[i]))
+        return len(legacy)
 
     def login(self, email: str, password_plain: str) -> bool:
-        for u in self.login_users:
-            if u.user_id == email:
-                try:
-                    return (password_plain == decrypt_password(u.password))
-                except Exception:
-                    return False
-        return False
+        i = self._login_index.get(email)
+        if i is None:
+            return False
+        token = self.login_users[i].password
+        if self._login_cache.check(email, token, password_plain):
+            return True
+        try:
+            ok = verify_password(token, password_plain)
+        except Exception:
+            return False
+        if ok:
+            self._login_cache.add(email, token, password_plain)
+        return ok
@@ -0,0 +1,410 @@
+import bisect, sys
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from .models import Student, GRADE_LETTERS
+
+
+class StudentStore:
+    """Slot-addressed student records.
+
+    Every record gets a slot id that never changes while the record is alive.
+    Deletes leave a tombstone (None) whose slot is reused by the next insert,
+    and updates happen on the record object itself, so the email index and
+    anything keyed by slot id stay valid without a rebuild.
+
+    Positional access (store[i], the i-th live record in slot order) is a
+    direct slot read while there are no tombstones. Once there are, the first
+    such access builds a sorted list of live slots in O(n); inserts and
+    removes then keep it current in O(log n) plus a list shift, and bulk
+    changes (extend, load_columns, sort, clear) drop it.
+    """
+
+    def __init__(self):
+        self._slots: List[Optional[Student]] = []
+        self._free: List[int] = []
+        self._live = None
+        self.index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __bool__(self) -> bool:
+        return bool(self.index)
+
+    def __iter__(self) -> Iterator[Student]:
+        for s in self._slots:
+            if s is not None:
+                yield s
+
+    def __getitem__(self, i: int) -> Student:
+        if not self._free:
+            return self._slots[i]
+        return self._slots[self._live_slots()[i]]
+
+    def _scan_live(self):
+        return [slot for slot, s in enumerate(self._slots) if s is not None]
+
+    def _live_slots(self):
+        live = self._live
+        if live is None:
+            live = self._live = self._scan_live()
+        return live
+
+    def _track_insert(self, slot: int):
+        live = self._live
+        if live is not None:
+            if not live or slot > live[-1]:
+                live.append(slot)
+            else:
+                bisect.insort(live, slot)
+
+    def _track_remove(self, slot: int):
+        live = self._live
+        if live is not None:
+            del live[bisect.bisect_left(live, slot)]
+
+    def __contains__(self, email: str) -> bool:
+        return email in self.index
+
+    def slot_of(self, email: str) -> Optional[int]:
+        return self.index.get(email)
+
+    def get(self, slot: int) -> Student:
+        return self._slots[slot]
+
+    def items(self) -> Iterator:
+        for slot, s in enumerate(self._slots):
+            if s is not None:
+                yield slot, s
+
+    def insert(self, s: Student) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._slots[slot] = s
+        else:
+            slot = len(self._slots)
+            self._slots.append(s)
+        self.index[s.email_address] = slot
+        self._track_insert(slot)
+        return slot
+
+    def extend(self, records: List[Student]):
+        # bulk append; caller rebuilds derived indexes once afterwards
+        if self._free:
+            for s in records:
+                self.insert(s)
+            return
+        base = len(self._slots)
+        self._slots.extend(records)
+        self._live = None
+        self.index.update((s.email_address, base + i) for i, s in enumerate(records))
+
+    def load_columns(self, emails, firsts, lasts, course_values, course_codes,
+                     grade_values, grade_codes, marks):
+        # replaces the contents with decoded snapshot columns; slots become 0..n-1
+        courses = [sys.intern(c) for c in course_values]
+        grades = [sys.intern(g) for g in grade_values]
+        self._slots[:] = map(Student, emails, firsts, lasts,
+                             [courses[c] for c in course_codes], [grades[g] for g in grade_codes],
+                             [None if m == NO_MARKS else m for m in marks])
+        self._free.clear()
+        self._live = None
+        self.index.clear()
+        self.index.update(zip(emails, range(len(emails))))
+
+    def regrade(self, slots: Iterable[int], table: List[str]):
+        # table is a 101-entry marks -> grade lookup; rows without marks keep their grade
+        for slot in slots:
+            s = self._slots[slot]
+            m = s.marks
+            if m is not None:
+                s.grade = table[0 if m < 0 else 100 if m > 100 else m]
+
+    def remove(self, slot: int) -> Student:
+        s = self._slots[slot]
+        self._slots[slot] = None
+        del self.index[s.email_address]
+        self._track_remove(slot)
+        if slot == len(self._slots) - 1:
+            self._slots.pop()
+        else:
+            self._free.append(slot)
+        return s
+
+    def rekey(self, old_email: str, new_email: str):
+        self.index[new_email] = self.index.pop(old_email)
+
+    def check(self, rows: Iterable[dict]):
+        # raise ValueError if any of these field values can't be stored; writes nothing
+        pass
+
+    def append(self, s: Student) -> int:
+        return self.insert(s)
+
+    def clear(self):
+        self._slots.clear()
+        self._free.clear()
+        self._live = None
+        self.index.clear()
+
+    def reindex(self):
+        self.index.clear()
+        self.index.update((s.email_address, slot) for slot, s in self.items())
+
+    def sort(self, key: Callable = None, reverse: bool = False):
+        # Compacts tombstones away and renumbers every slot.
+        live = [s for s in self._slots if s is not None]
+        live.sort(key=key, reverse=reverse)
+        self._slots[:] = live
+        self._free.clear()
+        self._live = None
+        self.index.clear()
+        self.index.update((s.email_address, i) for i, s in enumerate(live))
+
+
+class _Codes:
+    # small-int dictionary encoding for a repeated string column
+    def __init__(self, initial=()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for v in initial:
+            self.code(v)
+
+    def code(self, value: str) -> int:
+        c = self.codes.get(value)
+        if c is None:
+            c = self.codes[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return c
+
+
+class StudentView:
+    """Student-compatible live view of one row of a ColumnarStudentStore."""
+
+    __slots__ = ("_store", "_slot")
+    _fields = ("email_address", "first_name", "last_name", "course_id", "grade", "marks")
+
+    def __init__(self, store: "ColumnarStudentStore", slot: int):
+        object.__setattr__(self, "_store", store)
+        object.__setattr__(self, "_slot", slot)
+
+    @property
+    def email_address(self) -> str:
+        return self._store._email[self._slot]
+
+    @property
+    def first_name(self) -> str:
+        return self._store._first[self._slot]
+
+    @property
+    def last_name(self) -> str:
+        return self._store._last[self._slot]
+
+    @property
+    def course_id(self) -> str:
+        return self._store._course_codes.values[self._store._course[self._slot]]
+
+    @property
+    def grade(self) -> str:
+        return self._store._grade_codes.values[self._store._grade[self._slot]]
+
+    @property
+    def marks(self) -> Optional[int]:
+        m = self._store._marks[self._slot]
+        return None if m == NO_MARKS else m
+
+    def __setattr__(self, name, value):
+        if name not in self._fields:
+            raise AttributeError(name)
+        self._store._set(self._slot, name, value)
+
+    def to_student(self) -> Student:
+        return Student(*(getattr(self, f) for f in self._fields))
+
+    def __eq__(self, other):
+        if isinstance(other, (Student, StudentView)):
+            return all(getattr(self, f) == getattr(other, f) for f in self._fields)
+        return NotImplemented
+
+    def __repr__(self):
+        return "StudentView(" + ", ".join(f"{f}={getattr(self, f)!r}" for f in self._fields) + ")"
+
+
+NO_MARKS = -32768
+
+
+def _marks_cell(value) -> int:
+    # marks as stored in the int16 column; NO_MARKS stands for None
+    if value is None:
+        return NO_MARKS
+    m = int(value)
+    if not NO_MARKS < m <= 32767:
+        raise ValueError(f"marks {m} is outside the compact store's range ({NO_MARKS + 1}..32767)")
+    return m
+
+
+class ColumnarStudentStore(StudentStore):
+    """Compact column layout with the same slot API as StudentStore.
+
+    Marks live in an array('h'), course_id and grade are small-int codes into
+    shared string tables, and first/last names are interned. get() and
+    iteration hand out StudentView objects that read and write the columns.
+    """
+
+    def __init__(self):
+        self._email: List[Optional[str]] = []
+        self._first: List[str] = []
+        self._last: List[str] = []
+        self._course = array("H")
+        self._grade = array("B")
+        self._marks = array("h")
+        self._course_codes = _Codes()
+        self._grade_codes = _Codes([""] + GRADE_LETTERS)
+        self._free: List[int] = []
+        self._live = None
+        self.index: Dict[str, int] = {}
+
+    def __iter__(self) -> Iterator[StudentView]:
+        for slot, e in enumerate(self._email):
+            if e is not None:
+                yield StudentView(self, slot)
+
+    def __getitem__(self, i: int) -> StudentView:
+        if not self._free:
+            if i < 0:
+                i += len(self._email)
+            if not 0 <= i < len(self._email):
+                raise IndexError(i)
+            return StudentView(self, i)
+        return StudentView(self, self._live_slots()[i])
+
+    def _scan_live(self):
+        # 8 bytes per slot instead of an int object each
+        return array("q", (slot for slot, e in enumerate(self._email) if e is not None))
+
+    def get(self, slot: int) -> StudentView:
+        return StudentView(self, slot)
+
+    def items(self) -> Iterator:
+        for slot, e in enumerate(self._email):
+            if e is not None:
+                yield slot, StudentView(self, slot)
+
+    def check(self, rows: Iterable[dict]):
+        # marks must fit the int16 column and new course ids/grades the code tables
+        courses, grades = self._course_codes.codes, self._grade_codes.codes
+        new_courses, new_grades = set(), set()
+        for row in rows:
+            if "marks" in row:
+                _marks_cell(row["marks"])
+            if "course_id" in row and row["course_id"] not in courses:
+                new_courses.add(row["course_id"])
+            if "grade" in row and (row["grade"] or "") not in grades:
+                new_grades.add(row["grade"] or "")
+        if len(courses) + len(new_courses) > 1 << 16:
+            raise ValueError("the compact store holds at most 65536 distinct course ids")
+        if len(grades) + len(new_grades) > 1 << 8:
+            raise ValueError("the compact store holds at most 256 distinct grades")
+
+    def _set(self, slot: int, name: str, value):
+        if name == "email_address":
+            self._email[slot] = value
+        elif name == "first_name":
+            self._first[slot] = sys.intern(value)
+        elif name == "last_name":
+            self._last[slot] = sys.intern(value)
+        elif name == "course_id":
+            self._course[slot] = self._course_codes.code(value)
+        elif name == "grade":
+            self._grade[slot] = self._grade_codes.code(value or "")
+        elif name == "marks":
+            self._marks[slot] = _marks_cell(value)
+
+    def insert(self, s: Student) -> int:
+        # convert every field before a slot is taken, so a bad value leaves no half-written row
+        marks = _marks_cell(s.marks)
+        course = self._course_codes.code(s.course_id)
+        grade = self._grade_codes.code(s.grade or "")
+        first, last = sys.intern(s.first_name), sys.intern(s.last_name)
+        if self._free:
+            slot = self._free.pop()
+            self._email[slot], self._first[slot], self._last[slot] = s.email_address, first, last
+            self._course[slot], self._grade[slot], self._marks[slot] = course, grade, marks
+        else:
+            slot = len(self._email)
+            self._email.append(s.email_address)
+            self._first.append(first)
+            self._last.append(last)
+            self._course.append(course)
+            self._grade.append(grade)
+            self._marks.append(marks)
+        self.index[s.email_address] = slot
+        self._track_insert(slot)
+        return slot
+
+    def extend(self, records: List[Student]):
+        for s in records:
+            self.insert(s)
+
+    def load_columns(self, emails, firsts, lasts, course_values, course_codes,
+                     grade_values, grade_codes, marks):
+        self._email[:] = emails
+        self._first[:] = map(sys.intern, firsts)
+        self._last[:] = map(sys.intern, lasts)
+        self._course_codes = _Codes(course_values)
+        self._grade_codes = _Codes(grade_values)
+        self._course = course_codes if getattr(course_codes, "typecode", None) == "H" else array("H", course_codes)
+        self._grade = grade_codes if getattr(grade_codes, "typecode", None) == "B" else array("B", grade_codes)
+        self._marks = marks if getattr(marks, "typecode", None) == "h" else array("h", marks)
+        self._free.clear()
+        self._live = None
+        self.index.clear()
+        self.index.update(zip(emails, range(len(emails))))
+
+    def regrade(self, slots: Iterable[int], table: List[str]):
+        # translate marks straight to grade codes without building views
+        codes = [self._grade_codes.code(g) for g in table]
+        marks, grade = self._marks, self._grade
+        for slot in slots:
+            m = marks[slot]
+            if m != NO_MARKS:
+                grade[slot] = codes[0 if m < 0 else 100 if m > 100 else m]
+
+    def remove(self, slot: int) -> Student:
+        s = StudentView(self, slot).to_student()
+        del self.index[s.email_address]
+        self._track_remove(slot)
+        self._email[slot] = None
+        self._first[slot] = self._last[slot] = ""
+        if slot == len(self._email) - 1:
+            for col in (self._email, self._first, self._last, self._course, self._grade, self._marks):
+                col.pop()
+        else:
+            self._free.append(slot)
+        return s
+
+    def clear(self):
+        for col in (self._email, self._first, self._last):
+            col.clear()
+        for col in (self._course, self._grade, self._marks):
+            del col[:]
+        self._free.clear()
+        self._live = None
+        self.index.clear()
+
+    def sort(self, key: Callable = None, reverse: bool = False):
+        live = [slot for slot, e in enumerate(self._email) if e is not None]
+        if key is not None:
+            live.sort(key=lambda slot: key(StudentView(self, slot)), reverse=reverse)
+        else:
+            live.sort(key=self._email.__getitem__, reverse=reverse)
+        self._email[:] = [self._email[i] for i in live]
+        self._first[:] = [self._first[i] for i in live]
+        self._last[:] = [self._last[i] for i in live]
+        self._course = array("H", (self._course[i] for i in live))
+        self._grade = array("B", (self._grade[i] for i in live))
+        self._marks = array("h", (self._marks[i] for i in live))
+        self._free.clear()
+        self._live = None
+        self.index.clear()
+        self.index.update((e, i) for i, e in enumerate(self._email))
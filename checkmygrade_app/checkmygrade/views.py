@@ -0,0 +1,63 @@
+import bisect
+from typing import Iterable, Iterator, Optional, Tuple
+from .models import Student
+
+SORT_KEYS = {
+    "email": lambda s: s.email_address.lower(),
+    "marks": lambda s: (s.marks if s.marks is not None else -1),
+    "name":  lambda s: (s.last_name.lower(), s.first_name.lower()),
+    "grade": lambda s: s.grade
+}
+
+
+def sort_key(by: str):
+    if by not in SORT_KEYS:
+        raise ValueError("by must be one of: " + ", ".join(SORT_KEYS))
+    return SORT_KEYS[by]
+
+
+class SortedView:
+    """Ascending (key, slot) list for one sort key, optionally one course.
+
+    Built once, then patched with bisect on every insert/remove, so it never
+    has to be re-sorted while the records it covers change. The slot breaks
+    ties, which keeps equal keys in a stable order and makes removal exact.
+    """
+
+    def __init__(self, by: str, records: Iterable[Tuple[int, Student]], course_id: Optional[str] = None):
+        self.by = by
+        self.course_id = course_id
+        self.key = sort_key(by)
+        key = self.key
+        self._entries = sorted((key(s), slot) for slot, s in records)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def covers(self, s: Student) -> bool:
+        return self.course_id is None or self.course_id == s.course_id
+
+    def add(self, slot: int, s: Student):
+        bisect.insort(self._entries, (self.key(s), slot))
+
+    def remove(self, slot: int, s: Student):
+        e = (self.key(s), slot)
+        i = bisect.bisect_left(self._entries, e)
+        if i < len(self._entries) and self._entries[i] == e:
+            del self._entries[i]
+
+    def bounds(self, lo, hi) -> Tuple[int, int]:
+        # [i, j) positions whose key lies in lo..hi inclusive; None means unbounded
+        e = self._entries
+        i = 0 if lo is None else bisect.bisect_left(e, (lo,))
+        j = len(e) if hi is None else bisect.bisect_right(e, (hi, float("inf")))
+        return i, max(i, j)
+
+    def slots(self, ascending: bool = True, start: int = 0, stop: Optional[int] = None) -> Iterator[int]:
+        # start/stop count from the front in the requested direction
+        entries = self._entries
+        n = len(entries)
+        stop = n if stop is None else min(stop, n)
+        if ascending:
+            return (entries[i][1] for i in range(start, stop))
+        return (entries[n - 1 - i][1] for i in range(start, stop))
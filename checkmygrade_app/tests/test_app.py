@@ -1,13 +1,29 @@
-import unittest, tempfile, random, string
+import unittest, tempfile, random, string, statistics, io, json, csv
 from pathlib import Path
 from checkmygrade.storage import CheckMyGradeDB
-from checkmygrade.models import Student, Course, Professor, grade_from_marks
-from checkmygrade.security import encrypt_password, decrypt_password
+from checkmygrade.models import Student, Course, Professor, LoginUser, GradeRange, grade_from_marks
+from checkmygrade.security import encrypt_password, decrypt_password, hash_password, verify_password, is_hashed
+from checkmygrade.lazy import LazyCheckMyGradeDB
+from checkmygrade.aggregates import CourseAggregate
+from checkmygrade.names import NameIndex
+from checkmygrade.reports import (render_student_report, render_course_report, iter_course_report,
+                                  iter_professor_report, write_report)
+from checkmygrade import bench, shards, batch
+from checkmygrade.metrics import METRICS, Profiler
+from checkmygrade.concurrency import RWLock, SharedDB
+from checkmygrade.server import OPS, make_server, run_batch
+from checkmygrade.loadgen import run_load
+from checkmygrade.sqlstore import SqliteCheckMyGradeDB
+from checkmygrade.backends import open_db
+import threading, http.client, contextlib
+from unittest import mock
 
 class CheckMyGradeTests(unittest.TestCase):
+    db_kwargs = {}
+
     def setUp(self):
         self.tmp = tempfile.TemporaryDirectory()
-        self.db = CheckMyGradeDB(self.tmp.name)
+        self.db = CheckMyGradeDB(self.tmp.name, **self.db_kwargs)
         self.db.add_course(Course("DATA200","Data Science","Intro DS",3))
         self.db.add_course(Course("CS146","Data Structures","DS & Algos",3))
         self.db.add_professor(Professor("micheal@mycsu.edu","Micheal John","Senior Professor","DATA200"))
@@ -40,6 +56,53 @@ class CheckMyGradeTests(unittest.TestCase):
         s,_ = self.db.search_student_indexed(email)
         self.assertIsNone(s)
 
+    def test_bad_update_leaves_indexes_intact(self):
+        email = self.db.report_course_wise("DATA200")[0].email_address
+        before = self.db.course_stats("DATA200")
+        with self.assertRaises(ValueError):
+            self.db.update_student(email, marks="abc")
+        with self.assertRaises(ValueError):
+            self.db.update_students({email: {"marks": "abc"}})
+        self.assertEqual(self.db.course_stats("DATA200"), before)
+        self.assertTrue(self.db.update_student(email, marks="85"))
+        self.assertEqual(self.db.report_student(email).marks, 85)
+        self.assertEqual(self.db.report_student(email).grade, grade_from_marks(85))
+        self.assertEqual(self.db.course_stats("DATA200")["count"], before["count"])
+        self.assertTrue(self.db.delete_student(email))
+        self.assertEqual(self.db.course_stats("DATA200")["count"], before["count"] - 1)
+
+    def test_add_coerces_marks(self):
+        before = self.db.course_stats("CS146")
+        self.db.add_student(Student("str@sjsu.edu", "Str", "Marks", "CS146", "", "70"))
+        self.assertEqual(self.db.report_student("str@sjsu.edu").marks, 70)
+        self.assertEqual(self.db.course_stats("CS146")["count"], before["count"] + 1)
+        with self.assertRaises(ValueError):
+            self.db.add_student(Student("bad@sjsu.edu", "Bad", "Marks", "CS146", "", "seventy"))
+        with self.assertRaises(ValueError):
+            self.db.add_students([Student("ok@sjsu.edu", "Ok", "Row", "CS146", "", 50),
+                                  Student("bad@sjsu.edu", "Bad", "Marks", "CS146", "", "seventy")])
+        self.assertEqual(len(self.db.students), 1101)
+        self.assertEqual(self.db.course_stats("CS146")["count"], before["count"] + 1)
+        agg = CourseAggregate()
+        agg.add(70, "C-")
+        with self.assertRaises(TypeError):
+            agg.add("70", "C-")
+        self.assertEqual((agg.count, agg.total, dict(agg.grades)), (1, 70, {"C-": 1}))
+
+    def test_slots_stable_across_writes(self):
+        before = dict(self.db._student_index)
+        victim = self.db.students[10].email_address
+        self.assertTrue(self.db.delete_student(victim))
+        self.assertEqual(len(self.db.students), 1099)
+        self.db.add_student(Student("late@sjsu.edu","Late","Adder","CS146","",77))
+        self.assertEqual(self.db._student_index["late@sjsu.edu"], before[victim])
+        self.assertTrue(self.db.update_student("late@sjsu.edu", email_address="late2@sjsu.edu"))
+        self.assertIsNone(self.db._student_index.get("late@sjsu.edu"))
+        after = self.db._student_index
+        self.assertTrue(all(after[e] == i for e, i in before.items() if e != victim))
+        s, _ = self.db.search_student_indexed("late2@sjsu.edu")
+        self.assertEqual(s.first_name, "Late")
+
     def test_search_timing(self):
         target = self.db.students[0].email_address
         s1, t1 = self.db.search_student_linear(target)
@@ -62,11 +125,119 @@ class CheckMyGradeTests(unittest.TestCase):
         marks = [s.marks for s in self.db.students]
         self.assertTrue(all(marks[i] >= marks[i+1] for i in range(len(marks)-1)))
 
+    def test_positional_access_after_deletes(self):
+        students = self.db.students
+        for email in [students[i].email_address for i in (3, 40, 7)]:
+            self.db.delete_student(email)
+        with mock.patch.object(type(students), "_scan_live", autospec=True,
+                               side_effect=type(students)._scan_live) as scan:
+            self.assertEqual([students[i].email_address for i in range(len(students))],
+                             [s.email_address for s in students])
+            self.db.add_student(Student("aaa@sjsu.edu","Zed","Aaron","CS146","",3))
+            self.db.delete_student(students[0].email_address)
+            self.db.add_student(Student("bbb@sjsu.edu","Bea","Baker","CS146","",4))
+            self.assertEqual([students[i].email_address for i in range(len(students))],
+                             [s.email_address for s in students])
+            self.assertEqual(students[-1].email_address, list(students)[-1].email_address)
+            self.assertEqual(scan.call_count, 1)
+        with self.assertRaises(IndexError):
+            students[len(students)]
+
+    def test_cached_sorted_views(self):
+        order = [s.email_address for s in self.db.students]
+        page = self.db.students_page(0, 10, by="marks", ascending=False, course_id="CS146")
+        self.assertEqual([s.email_address for s in self.db.students], order)
+        top = self.db.top_n(10, by="marks", course_id="CS146")
+        self.assertEqual([s.marks for s in page], [s.marks for s in top])
+        first = self.db.students[0].email_address
+        self.db.update_student(first, marks=100, course_id="CS146")
+        self.db.delete_student(self.db.students[5].email_address)
+        self.db.add_student(Student("aaa@sjsu.edu","Zed","Aaron","CS146","",3))
+        expected = sorted((s for s in self.db.students if s.course_id == "CS146"),
+                          key=lambda s: s.marks, reverse=True)
+        got = list(self.db.sorted_students(by="marks", ascending=False, course_id="CS146"))
+        self.assertEqual([s.marks for s in got], [s.marks for s in expected])
+        self.assertIn(first, [s.email_address for s in got if s.marks == 100])
+        self.assertEqual(self.db.bottom_n(1, course_id="CS146")[0].email_address, "aaa@sjsu.edu")
+        names = [(s.last_name.lower(), s.first_name.lower()) for s in self.db.sorted_students(by="name")]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(self.db.students_page(0, 1, by="name")[0].last_name, "Aaron")
+        self.assertEqual(len(self.db.students_page(3, 500, by="email")), 0)
+        self.assertEqual(len(self.db.students_page(2, 500, by="email")), 100)
+
+    def test_marks_range_rank_percentile(self):
+        cs = [s for s in self.db.students if s.course_id == "CS146"]
+        band = self.db.students_in_range(80, 89, course_id="CS146")
+        self.assertEqual(sorted(s.email_address for s in band),
+                         sorted(s.email_address for s in cs if 80 <= s.marks <= 89))
+        self.assertEqual([s.marks for s in band], sorted(s.marks for s in band))
+        self.assertEqual(self.db.count_above(89), sum(1 for s in self.db.students if s.marks > 89))
+        self.assertEqual(self.db.count_below(60, "CS146"), sum(1 for s in cs if s.marks < 60))
+        self.db.add_student(Student("ace@sjsu.edu","Ace","High","CS146","",101))
+        self.assertEqual(self.db.student_rank("ace@sjsu.edu", "CS146"), (1, len(cs) + 1))
+        self.assertEqual(self.db.student_rank("ace@sjsu.edu"), (1, 1101))
+        self.db.update_student("ace@sjsu.edu", marks=0)
+        self.assertEqual(self.db.student_rank("ace@sjsu.edu")[0], 1101)
+        self.assertLess(self.db.student_percentile("ace@sjsu.edu", "CS146"), 1.0)
+        self.assertIsNone(self.db.student_rank("ace@sjsu.edu", "DATA200"))
+        self.db.delete_student("ace@sjsu.edu")
+        self.assertEqual(self.db.count_in_range(course_id="CS146"), len(cs))
+        self.assertIsNone(self.db.student_percentile("ace@sjsu.edu"))
+
     def test_course_professor_crud(self):
         self.assertTrue(self.db.update_course("DATA200", description="Updated desc"))
         self.assertTrue(self.db.update_professor("micheal@mycsu.edu", rank="Distinguished Professor"))
-        self.assertTrue(self.db.delete_course("CS146"))
         self.assertTrue(self.db.delete_professor("dev@mycsu.edu"))
+        with self.assertRaises(ValueError):
+            self.db.delete_course("CS146")
+        self.assertTrue(self.db.delete_course("CS146", on_delete="cascade"))
+        self.assertEqual(self.db.report_course_wise("CS146"), [])
+        self.assertEqual(len(self.db.students), 550)
+
+    def test_foreign_keys(self):
+        db = self.db
+        with self.assertRaises(ValueError):
+            db.add_student(Student("ghost@sjsu.edu", "Gh", "Ost", "NOPE1", "", 50))
+        with self.assertRaises(ValueError):
+            db.add_students([Student("ok@sjsu.edu", "O", "K", "CS146", "", 50),
+                             Student("ghost@sjsu.edu", "Gh", "Ost", "NOPE1", "", 50)])
+        self.assertIsNone(db.report_student("ok@sjsu.edu"))
+        email = db.report_course_wise("CS146")[0].email_address
+        with self.assertRaises(ValueError):
+            db.update_student(email, course_id="NOPE1")
+        with self.assertRaises(ValueError):
+            db.update_students({email: {"course_id": "NOPE1"}})
+        with self.assertRaises(ValueError):
+            db.add_professor(Professor("p@mycsu.edu", "P", "Lecturer", "NOPE1"))
+        with self.assertRaises(ValueError):
+            db.update_professor("dev@mycsu.edu", course_id="NOPE1")
+        with self.assertRaises(ValueError):
+            db.add_course(Course("CS146", "Dup", "", 3))
+        with self.assertRaises(ValueError):
+            db.update_course("CS146", course_id="CS147")
+        db.add_student(Student("blank@sjsu.edu", "No", "Course", "", "", 50))
+        db.add_course(Course("EMPTY1", "Empty", "", 3))
+        self.assertTrue(db.update_course("EMPTY1", course_id="EMPTY2"))
+        db.add_professor(Professor("p@mycsu.edu", "P", "Lecturer", "EMPTY2"))
+        self.assertEqual([p.professor_id for p in db.professors if p.course_id == "EMPTY2"], ["p@mycsu.edu"])
+        self.assertTrue(db.delete_professor("p@mycsu.edu"))
+        self.assertTrue(db.delete_course("EMPTY2"))
+        self.assertFalse(db.delete_course("EMPTY2"))
+        with self.assertRaises(ValueError):
+            db.delete_course("CS146", on_delete="ignore")
+        loose = CheckMyGradeDB(self.tmp.name, foreign_keys=False)
+        loose.add_student(Student("ghost@sjsu.edu", "Gh", "Ost", "NOPE1", "", 50))
+
+    def test_cascade_delete_replays_from_journal(self):
+        jdb = CheckMyGradeDB(self.tmp.name, journal=True)
+        jdb.load_all()
+        jdb.delete_course("CS146", on_delete="cascade")
+        jdb.save_all()
+        again = CheckMyGradeDB(self.tmp.name, journal=True)
+        again.load_all()
+        self.assertEqual(len(again.students), 550)
+        self.assertEqual([c.course_id for c in again.courses], ["DATA200"])
+        self.assertEqual([p.professor_id for p in again.professors], ["micheal@mycsu.edu"])
 
     def test_stats_and_reports(self):
         stats = self.db.course_stats("DATA200")
@@ -74,10 +245,1000 @@ class CheckMyGradeTests(unittest.TestCase):
         students_for_prof = self.db.report_professor_wise("micheal@mycsu.edu")
         self.assertTrue(all(s.course_id == "DATA200" for s in students_for_prof))
 
+    def test_result_cache(self):
+        db = self.db
+        stats = db.result_cache_stats()
+        first = db.course_stats("DATA200")
+        report = render_course_report(db, "DATA200")
+        by_prof = db.report_professor_wise("micheal@mycsu.edu")
+        self.assertEqual(db.course_stats("DATA200"), first)
+        self.assertEqual(render_course_report(db, "DATA200"), report)
+        self.assertEqual(db.report_professor_wise("micheal@mycsu.edu"), by_prof)
+        after = db.result_cache_stats()
+        self.assertEqual(after["hits"] - stats["hits"], 3)
+        self.assertEqual(after["misses"] - stats["misses"], 3)
+        # callers get copies, and every write moves the versions the cached results depend on
+        db.report_professor_wise("micheal@mycsu.edu").clear()
+        self.assertEqual(len(db.report_professor_wise("micheal@mycsu.edu")), 550)
+        versions = db.table_versions()
+        email = db.report_course_wise("DATA200")[0].email_address
+        db.update_student(email, marks=0)
+        self.assertEqual(db.course_stats("DATA200")["count"], 550)
+        self.assertNotEqual(db.course_stats("DATA200"), first)
+        self.assertIn("F", render_course_report(db, "DATA200").split(email)[1].splitlines()[0])
+        db.update_professor("micheal@mycsu.edu", course_id="CS146")
+        self.assertTrue(all(s.course_id == "CS146" for s in db.report_professor_wise("micheal@mycsu.edu")))
+        db.set_grade_scale("DATA200", [GradeRange("DATA200", "P", 0, 100)])
+        self.assertEqual(db.course_histogram("DATA200")["P"], 550)
+        moved = db.table_versions()
+        self.assertTrue(all(moved[t] > versions[t] for t in ("students", "professors", "grade_scales")))
+        self.assertEqual(moved["courses"], versions["courses"])
+        # bounded
+        for i in range(db._results.maxsize + 10):
+            db.course_stats(f"X{i}")
+        self.assertEqual(db.result_cache_stats()["size"], db._results.maxsize)
+        self.assertGreater(db.result_cache_stats()["evictions"], 0)
+        off = CheckMyGradeDB(self.tmp.name, result_cache=0)
+        off.load_all()
+        self.assertEqual(off.course_stats("CS146"), off.course_stats("CS146"))
+        self.assertEqual((off.result_cache_stats()["maxsize"], off.result_cache_stats()["hits"]), (0, 0))
+
+    def test_change_log(self):
+        db = CheckMyGradeDB(self.tmp.name, change_log=10, **self.db_kwargs)
+        db.load_all()
+        with self.assertRaises(ValueError):
+            self.db.changes_since(0)
+        start = db.change_cursor()
+        self.assertEqual(db.changes_since(start["seq"]), [])
+        db.add_student(Student("cdc@sjsu.edu", "Cee", "Dee", "DATA200", "", 75))
+        db.update_student("cdc@sjsu.edu", marks=30)
+        db.update_course("CS146", credits=4)
+        db.delete_student("cdc@sjsu.edu")
+        delta = db.changes_since(start["seq"], start["log_id"])
+        self.assertEqual([(c["op"], c["table"], c["key"]) for c in delta],
+                         [("insert", "students", "cdc@sjsu.edu"), ("update", "students", "cdc@sjsu.edu"),
+                          ("update", "courses", "CS146"), ("delete", "students", "cdc@sjsu.edu")])
+        self.assertEqual(delta[1]["fields"], {"marks": 30, "grade": "F"})
+        self.assertEqual(delta[2]["fields"], {"credits": 4})
+        self.assertEqual([c["seq"] for c in db.changes_since(delta[1]["seq"])], [delta[2]["seq"], delta[3]["seq"]])
+        # a mirror built from a snapshot plus deltas matches the db
+        def apply(mirror, records):
+            for r in records:
+                if r["op"] == "snapshot":
+                    mirror.clear()
+                elif r["op"] == "insert":
+                    mirror[(r["table"], r["key"])] = dict(r["row"])
+                elif r["op"] == "update":
+                    row = mirror.pop((r["table"], r["key"]))
+                    row.update(r["fields"])
+                    key = row.get({"students": "email_address", "courses": "course_id"}.get(r["table"], "professor_id"))
+                    mirror[(r["table"], key)] = row
+                else:
+                    del mirror[(r["table"], r["key"])]
+        def current():
+            return {**{("students", s.email_address): {f: getattr(s, f) for f in ("email_address", "first_name",
+                       "last_name", "course_id", "grade", "marks")} for s in db.students},
+                    **{("courses", c.course_id): vars(c).copy() for c in db.courses},
+                    **{("professors", p.professor_id): vars(p).copy() for p in db.professors}}
+        mirror = {}
+        buf = io.StringIO()
+        cursor = db.export_changes(buf)
+        self.assertTrue(cursor["snapshot"])
+        apply(mirror, map(json.loads, buf.getvalue().splitlines()))
+        self.assertEqual(mirror, current())
+        data200 = db.report_course_wise("DATA200")
+        db.update_student(data200[0].email_address, email_address="moved@sjsu.edu", course_id="CS146")
+        db.set_grade_scale("CS146", [GradeRange("CS146", "P", 50, 100), GradeRange("CS146", "F", 0, 49)])
+        # the regrade alone is more changes than the log keeps
+        buf = io.StringIO()
+        again = db.export_changes(buf, cursor["seq"], cursor["log_id"])
+        self.assertTrue(again["snapshot"])
+        self.assertIsNone(db.changes_since(cursor["seq"]))
+        apply(mirror, map(json.loads, buf.getvalue().splitlines()))
+        self.assertEqual(mirror, current())
+        cursor = again
+        db.update_student("moved@sjsu.edu", marks=99)
+        db.add_course(Course("TMP1", "Temp", "", 1))
+        db.add_professor(Professor("p9@mycsu.edu", "Pat Nine", "Lecturer", "TMP1"))
+        db.add_student(Student("t1@sjsu.edu", "Tee", "One", "TMP1", "", 60))
+        db.delete_course("TMP1", on_delete="cascade")
+        buf = io.StringIO()
+        cursor = db.export_changes(buf, cursor["seq"], cursor["log_id"], fmt="csv")
+        self.assertFalse(cursor["snapshot"])
+        rows = list(csv.DictReader(io.StringIO(buf.getvalue())))
+        self.assertEqual(rows[0]["key"], "moved@sjsu.edu")
+        self.assertEqual([(r["op"], r["key"]) for r in rows[-3:]],
+                         [("delete", "t1@sjsu.edu"), ("delete", "p9@mycsu.edu"), ("delete", "TMP1")])
+        apply(mirror, ({**r, "seq": int(r["seq"]), **({"row" if r["op"] == "insert" else "fields": json.loads(r["data"])}
+                                                       if r["data"] else {})} for r in rows))
+        self.assertEqual(mirror, current())
+        delta = db.changes_since(cursor["seq"] - 3)
+        self.assertLessEqual(len(delta), 3)
+        # re-sorting only moves rows around; cursors stay valid
+        db.sort_students(by="marks")
+        self.assertEqual(db.changes_since(cursor["seq"], cursor["log_id"]), [])
+        # reloading starts a new log, so old cursors resync from a snapshot
+        db.load_all()
+        self.assertIsNone(db.changes_since(cursor["seq"]))
+        self.assertIsNone(db.changes_since(0, cursor["log_id"]))
+        self.assertEqual(db.changes_since(db.change_cursor()["seq"], db.change_cursor()["log_id"]), [])
+
+    def test_top_n_ties_match_views(self):
+        def emails(rows):
+            return [s.email_address for s in rows]
+        for by in ("grade", "marks"):
+            for cid in (None, "CS146"):
+                fresh = [emails(self.db.top_n(30, by, cid)), emails(self.db.bottom_n(30, by, cid))]
+                self.db.students_page(0, 1, by=by, course_id=cid)  # caches the view top_n/bottom_n then use
+                self.assertEqual([emails(self.db.top_n(30, by, cid)), emails(self.db.bottom_n(30, by, cid))], fresh)
+
+    def test_course_and_professor_indexes(self):
+        data200 = self.db.report_course_wise("DATA200")
+        self.assertEqual(len(data200), 550)
+        self.db.update_student(data200[0].email_address, course_id="CS146")
+        self.assertEqual(len(self.db.report_course_wise("DATA200")), 549)
+        self.assertEqual(len(self.db.report_course_wise("CS146")), 551)
+        self.db.delete_student(data200[1].email_address)
+        self.assertEqual(self.db.course_stats("DATA200")["count"], 548)
+        self.db.update_professor("dev@mycsu.edu", course_id="DATA200")
+        self.assertEqual(len(self.db.report_professor_wise("dev@mycsu.edu")), 548)
+        self.db.delete_professor("micheal@mycsu.edu")
+        self.assertEqual(self.db.report_professor_wise("micheal@mycsu.edu"), [])
+
+    def test_incremental_course_aggregates(self):
+        data200 = self.db.report_course_wise("DATA200")
+        self.db.update_student(data200[0].email_address, marks=12)
+        self.db.update_student(data200[1].email_address, course_id="CS146")
+        self.db.delete_student(data200[2].email_address)
+        for cid in ("DATA200", "CS146"):
+            marks = [s.marks for s in self.db.students if s.course_id == cid]
+            stats = self.db.course_stats(cid)
+            self.assertEqual(stats["count"], len(marks))
+            self.assertAlmostEqual(stats["average"], sum(marks) / len(marks))
+            self.assertEqual(stats["median"], statistics.median(marks))
+            hist = self.db.course_histogram(cid)
+            self.assertEqual(sum(hist.values()), len(marks))
+            self.assertEqual(hist["F"], sum(1 for m in marks if m < 60))
+        self.assertEqual(self.db.course_percentile("DATA200", 0), 12)
+        self.assertEqual(self.db.course_stats("NOPE"), {"count": 0, "average": None, "median": None})
+
+    def test_streaming_csv_import_export(self):
+        out = Path(self.tmp.name) / "export.csv"
+        stats = self.db.export_students(out)
+        self.assertEqual(stats["rows"], 1100)
+        other = Path(self.tmp.name) / "reordered.csv"
+        other.write_text("Marks,Course.id,Email_address,Last_name,First_name,grades\n"
+                         " 91 ,CS146, a@x.edu ,Kim,Sam,\n"
+                         ",DATA200,b@x.edu,Park,Jo,B\n\n", encoding="utf-8")
+        db = CheckMyGradeDB(self.tmp.name, **self.db_kwargs)
+        stats = db.import_students(out, batch_size=64)
+        self.assertEqual(stats["rows"], 1100)
+        self.assertGreater(stats["rows_per_sec"], 0)
+        self.assertEqual([s.email_address for s in db.students], [s.email_address for s in self.db.students])
+        self.assertEqual(db.course_stats("CS146"), self.db.course_stats("CS146"))
+        db.import_students(other)
+        a, _ = db.search_student_indexed("a@x.edu")
+        b, _ = db.search_student_indexed("b@x.edu")
+        self.assertEqual((a.course_id, a.marks, a.grade), ("CS146", 91, "A-"))
+        self.assertEqual((b.marks, b.grade), (0, "B"))
+        # emails already loaded (or repeated in the file) replace the earlier row
+        first = db.report_course_wise("CS146")[5].email_address
+        dupes = Path(self.tmp.name) / "dupes.csv"
+        dupes.write_text("Email_address,First_name,Last_name,Course.id,grades,Marks\n"
+                         f"{first},Re,Placed,CS146,,12\nc@x.edu,C,One,CS146,,50\nc@x.edu,C,Two,CS146,,55\n",
+                         encoding="utf-8")
+        n, count = len(db.students), db.course_stats("CS146")["count"]
+        db.import_students(dupes)
+        self.assertEqual(len(db.students), n + 1)
+        self.assertEqual(sum(1 for _ in db.students), n + 1)
+        self.assertEqual(db.course_stats("CS146")["count"], count + 1)
+        self.assertEqual((db.search_student_indexed(first)[0].marks, db.search_student_indexed("c@x.edu")[0].marks),
+                         (12, 55))
+        self.assertTrue(db.delete_student(first))
+        self.assertNotIn(first, [s.email_address for s in db.students])
+
+    def test_journal_replay_and_compaction(self):
+        db = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        db.load_all()
+        before = db.student_csv.read_bytes()
+        first = db.students[0].email_address
+        db.update_student(first, marks=55)
+        db.delete_student(db.students[1].email_address)
+        db.add_student(Student("j@sjsu.edu","J","Ournal","CS146","",64))
+        db.update_course("CS146", credits=4)
+        db.save_all()
+        self.assertEqual(db.student_csv.read_bytes(), before)
+        self.assertEqual(len(db.journal), 4)
+        with db.journal_path.open("a", encoding="utf-8") as f:
+            f.write('{"op":"delete","tab')  # torn write
+        again = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        again.load_all()
+        self.assertEqual(len(again.students), 1100)
+        self.assertEqual(again.search_student_indexed(first)[0].marks, 55)
+        self.assertIsNotNone(again.search_student_indexed("j@sjsu.edu")[0])
+        self.assertEqual([c.credits for c in again.courses if c.course_id == "CS146"], [4])
+        again.load_all()  # replaying twice converges
+        self.assertEqual(len(again.students), 1100)
+        self.assertEqual(again.journal.pending, 4)
+        # save_all() compacts once the journal reaches journal_compact_at records
+        again.journal_compact_at = 5
+        again.save_all()
+        self.assertEqual(again.journal.pending, 4)
+        self.assertEqual(again.student_csv.read_bytes(), before)
+        again.update_student(first, marks=56)
+        again.save_all()
+        self.assertEqual((len(again.journal), again.journal.pending), (0, 0))
+        self.assertNotEqual(again.student_csv.read_bytes(), before)
+        plain = CheckMyGradeDB(self.tmp.name, **self.db_kwargs)
+        plain.load_all()
+        self.assertEqual(plain.course_stats("CS146"), again.course_stats("CS146"))
+
+    def test_journal_replay_after_interrupted_compaction(self):
+        db = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        db.load_all()
+        db.add_student(Student("a@x.edu", "A", "One", "CS146", "", 50))
+        db.update_student("a@x.edu", email_address="b@x.edu", marks=60)
+        db.add_student(Student("a@x.edu", "A", "Two", "CS146", "", 70))
+        db.add_course(Course("TMP1", "Temp", "", 1))
+        db.update_course("TMP1", course_id="TMP2")
+        db.add_course(Course("TMP1", "Temp again", "", 2))
+        db._save_tables()  # crash here: the tables are saved, the journal isn't truncated
+        again = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        again.load_all()
+        self.assertEqual(len(again.students), 1102)
+        self.assertEqual(sum(1 for _ in again.students), 1102)
+        self.assertEqual((again.search_student_indexed("a@x.edu")[0].last_name,
+                          again.search_student_indexed("a@x.edu")[0].marks), ("Two", 70))
+        self.assertEqual(again.search_student_indexed("b@x.edu")[0].marks, 60)
+        self.assertEqual({c.course_id: c.credits for c in again.courses if c.course_id.startswith("TMP")},
+                         {"TMP1": 2, "TMP2": 1})
+
+    def test_grade_scale_follows_course_rename_and_delete(self):
+        db = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        db.load_all()
+        db.add_course(Course("TMP1", "Temp", "", 1))
+        db.set_grade_scale("TMP1", [GradeRange("TMP1", "P", 50, 100), GradeRange("TMP1", "F", 0, 49)])
+        self.assertTrue(db.update_course("TMP1", course_id="TMP2"))
+        self.assertEqual([r.grade for r in db.grade_scale("TMP2")], ["P", "F"])
+        self.assertEqual(db.grade_scale("TMP1"), db.grade_scale("NOPE"))
+        db.add_student(Student("t@x.edu", "T", "Mp", "TMP2", "", 55))
+        self.assertEqual(db.search_student_indexed("t@x.edu")[0].grade, "P")
+        again = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        again.load_all()
+        self.assertEqual([r.grade_id for r in again.grade_ranges if r.grade_id.startswith("TMP")], ["TMP2"] * 2)
+        self.assertTrue(again.delete_course("TMP2", on_delete="cascade"))
+        again.compact_journal()
+        self.assertNotIn("TMP", again.grade_csv.read_text(encoding="utf-8"))
+
+    def test_journal_replays_grade_scale_without_regrade(self):
+        db = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        db.load_all()
+        email = db.report_course_wise("CS146")[0].email_address
+        db.update_student(email, marks=30)
+        self.assertEqual(db.set_grade_scale("CS146", [GradeRange("CS146", "P", 0, 100)], regrade=False), 0)
+        again = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        again.load_all()
+        self.assertEqual(again.search_student_indexed(email)[0].grade, "F")
+        self.assertEqual([r.grade for r in again.grade_scale("CS146")], ["P"])
+
+    def test_binary_snapshot_load(self):
+        db = CheckMyGradeDB(self.tmp.name, snapshot=True, **self.db_kwargs)
+        db.load_all()
+        db.register_user("snap@mycsu.edu", "pw", role="student")
+        db.save_all()
+        self.assertTrue(db.snapshot_path.exists())
+        fresh = CheckMyGradeDB(self.tmp.name, snapshot=True, **self.db_kwargs)
+        fresh.load_all()
+        self.assertEqual([s.email_address for s in fresh.students], [s.email_address for s in db.students])
+        self.assertEqual([s.marks for s in fresh.students], [s.marks for s in db.students])
+        self.assertEqual(fresh.course_stats("DATA200"), db.course_stats("DATA200"))
+        self.assertEqual(fresh.course_histogram("CS146"), db.course_histogram("CS146"))
+        self.assertEqual(len(fresh.report_professor_wise("dev@mycsu.edu")), 550)
+        self.assertTrue(fresh.login("snap@mycsu.edu", "pw"))
+        fresh.add_student(Student("after@sjsu.edu","Af","Ter","CS146","",70))
+        self.assertEqual(fresh.course_stats("CS146")["count"], 551)
+        # a hand-edited CSV is newer than the snapshot, so it wins
+        import os
+        os.utime(db.student_csv, ns=(db.snapshot_path.stat().st_mtime_ns + 10**9,) * 2)
+        db.student_csv.write_text("Email_address,First_name,Last_name,Course.id,grades,Marks\n"
+                                  "only@sjsu.edu,On,Ly,CS146,,50\n", encoding="utf-8")
+        fresh.load_all()
+        self.assertEqual(len(fresh.students), 1)
+        db.snapshot_path.write_bytes(b"garbage")
+        fresh.load_all()
+        self.assertEqual(len(fresh.students), 1)
+
+    def test_lazy_point_lookups(self):
+        self.db.register_user("lazy@mycsu.edu", "pw")
+        self.db.save_all()
+        target = self.db.students[500]
+        target = Student(target.email_address, target.first_name, target.last_name,
+                         target.course_id, target.grade, target.marks)
+        lazy = LazyCheckMyGradeDB(self.tmp.name, **self.db_kwargs)
+        s, _ = lazy.search_student_indexed(target.email_address)
+        self.assertEqual((s.email_address, s.marks, s.grade), (target.email_address, target.marks, target.grade))
+        self.assertIsNone(lazy.search_student_indexed("nobody@sjsu.edu")[0])
+        self.assertIn(target.email_address, render_student_report(lazy, target.email_address))
+        self.assertTrue(lazy.login("lazy@mycsu.edu", "pw"))
+        self.assertEqual(lazy._loaded, {"logins"})
+        self.assertTrue(lazy.student_idx.exists())
+        # a rewritten CSV invalidates the persisted offsets
+        self.db.delete_student(target.email_address)
+        self.db.save_students()
+        self.assertIsNone(lazy.search_student_indexed(target.email_address)[0])
+        self.assertEqual(len(lazy.report_course_wise("DATA200")) + len(lazy.report_course_wise("CS146")), 1099)
+        self.assertIn("students", lazy._loaded)
+        lazy.close()
+
+    def test_indexed_login_and_migration(self):
+        self.db.password_cost = 1000
+        self.db.login_users.append(LoginUser("old@mycsu.edu", encrypt_password("legacy!"), "student"))
+        self.db._rebuild_login_index()
+        self.db.register_users([(f"u{i}@mycsu.edu", f"pw{i}", "student") for i in range(12)], workers=2)
+        self.assertTrue(self.db.login("u7@mycsu.edu", "pw7"))
+        self.assertTrue(self.db.login("u7@mycsu.edu", "pw7"))  # served from the verification cache
+        self.assertFalse(self.db.login("u7@mycsu.edu", "pw8"))
+        self.assertFalse(self.db.login("ghost@mycsu.edu", "pw7"))
+        self.assertTrue(self.db.login("old@mycsu.edu", "legacy!"))
+        self.assertEqual(self.db.migrate_legacy_passwords(workers=1), 1)
+        self.assertTrue(all(is_hashed(u.password) for u in self.db.login_users))
+        self.assertTrue(self.db.login("old@mycsu.edu", "legacy!"))
+        self.db.register_user("u7@mycsu.edu", "changed")
+        self.assertFalse(self.db.login("u7@mycsu.edu", "pw7"))
+        self.assertTrue(self.db.login("u7@mycsu.edu", "changed"))
+        self.assertEqual(len(self.db.login_users), 13)
+
+    def test_streaming_reports(self):
+        text = render_course_report(self.db, "CS146").split("\n")
+        self.assertEqual(len(text), 552)
+        lines = iter_course_report(self.db, "CS146")
+        self.assertEqual(next(lines), text[0])
+        page = list(iter_course_report(self.db, "CS146", page=1, page_size=100))
+        self.assertEqual(page[2:], text[102:202])
+        sink = io.StringIO()
+        self.assertEqual(write_report(iter_professor_report(self.db, "micheal@mycsu.edu", "csv"), sink), 551)
+        rows = list(csv.reader(io.StringIO(sink.getvalue())))
+        self.assertEqual(rows[0][0], "Email_address")
+        self.assertTrue(all(r[3] == "DATA200" for r in rows[1:]))
+        sink = io.StringIO()
+        write_report(iter_course_report(self.db, "DATA200", "jsonl", page=0, page_size=5), sink)
+        recs = [json.loads(line) for line in sink.getvalue().splitlines()]
+        self.assertEqual(len(recs), 5)
+        self.assertEqual(set(recs[0]), {"email_address", "first_name", "last_name", "course_id", "grade", "marks"})
+        with self.assertRaises(ValueError):
+            list(iter_course_report(self.db, "DATA200", "xml"))
+
+    def test_grade_scale_and_bulk_regrade(self):
+        curve = [GradeRange("", "A", 85, 100), GradeRange("", "B", 70, 84),
+                 GradeRange("", "C", 55, 69), GradeRange("", "F", 0, 54)]
+        with self.assertRaises(ValueError):
+            self.db.set_grade_scale("CS146", curve[:3])
+        n = self.db.set_grade_scale("CS146", curve)
+        self.assertEqual(n, 550)
+        cs = list(self.db.iter_course_wise("CS146"))
+        self.assertTrue(all(s.grade == ("A" if s.marks >= 85 else "B" if s.marks >= 70 else
+                                        "C" if s.marks >= 55 else "F") for s in cs))
+        hist = self.db.course_histogram("CS146")
+        self.assertEqual(hist["A"], sum(1 for s in cs if s.marks >= 85))
+        self.assertEqual(hist["A+"], 0)
+        self.assertTrue(all(s.grade == grade_from_marks(s.marks) for s in self.db.iter_course_wise("DATA200")))
+        self.db.add_student(Student("curved@sjsu.edu","Cur","Ved","CS146","",86))
+        self.assertEqual(self.db.search_student_indexed("curved@sjsu.edu")[0].grade, "A")
+        self.db.update_student("curved@sjsu.edu", course_id="DATA200")
+        self.assertEqual(self.db.search_student_indexed("curved@sjsu.edu")[0].grade, "B")
+        self.db.save_all()
+        again = CheckMyGradeDB(self.tmp.name, **self.db_kwargs)
+        again.load_all()
+        self.assertEqual(len(again.grade_scale("CS146")), 4)
+        self.assertEqual(again.course_histogram("CS146"), self.db.course_histogram("CS146"))
+        self.assertEqual(again.clear_grade_scale("CS146"), 550)
+        self.assertTrue(all(s.grade == grade_from_marks(s.marks) for s in again.iter_course_wise("CS146")))
+
+    def test_metrics_and_profiler(self):
+        self.addCleanup(setattr, METRICS, "enabled", METRICS.enabled)
+        METRICS.enabled = True
+        METRICS.reset()
+        self.db.add_student(Student("metric@sjsu.edu", "Me", "Trics", "CS146", "", 70))
+        self.assertFalse(self.db.delete_student("nobody@sjsu.edu"))
+        self.db.save_all()
+        render_course_report(self.db, "CS146")
+        with self.assertRaises(ValueError):
+            list(iter_course_report(self.db, "CS146", fmt="xml"))
+        ops = METRICS.snapshot()["ops"]
+        self.assertEqual(ops["db.add_student"]["count"], 1)
+        self.assertEqual(ops["db.delete_student"]["count"], 1)
+        self.assertEqual(ops["db.save_students"]["count"], 1)
+        self.assertEqual(ops["report.course"]["count"], 2)
+        self.assertEqual(ops["report.course"]["errors"], 1)
+        r = ops["db.save_all"]
+        self.assertLessEqual(r["min_ms"], r["p50_ms"])
+        self.assertLessEqual(r["p99_ms"], r["max_ms"])
+        self.assertEqual(sum(r["histogram_us"].values()), 1)
+        path = METRICS.dump(Path(self.tmp.name) / "metrics.json")
+        self.assertIn("db.add_student", json.loads(path.read_text())["ops"])
+        METRICS.enabled = False
+        try:
+            self.db.delete_student("metric@sjsu.edu")
+        finally:
+            METRICS.enabled = True
+        self.assertEqual(METRICS.snapshot()["ops"]["db.delete_student"]["count"], 1)
+        # other threads count separately; a finished thread's counts are kept
+        worker = threading.Thread(target=lambda: [self.db.delete_student("nobody@sjsu.edu") for _ in range(3)])
+        worker.start()
+        worker.join()
+        self.assertEqual(METRICS.snapshot()["ops"]["db.delete_student"]["count"], 4)
+        self.assertEqual(METRICS.snapshot()["ops"]["db.delete_student"]["count"], 4)
+        prof = Profiler("all").start()
+        self.db.course_stats("CS146")
+        self.assertIn("peak_bytes", prof.snapshot())
+        written = prof.stop(self.tmp.name)
+        self.assertEqual(sorted(p.name for p in written), ["memory.txt", "profile.pstats", "profile.txt"])
+        self.assertIn("course_stats", (Path(self.tmp.name) / "profile.txt").read_text())
+
+    def test_bulk_mutations(self):
+        db = self.db
+        before = db.course_stats("CS146")
+        db.students_page(0, by="name")
+        db.students_in_range(50, 60, course_id="CS146")
+        rows = [Student(f"bulk{i}@sjsu.edu", "Bulk", "Row", "CS146", "", i % 101) for i in range(200)]
+        with self.assertRaises(ValueError):
+            db.add_students(rows + [Student(db.students[0].email_address, "Dup", "Row", "CS146", "", 50)])
+        self.assertEqual(len(db.students), 1100)
+        self.assertEqual(db.add_students(rows), 200)
+        self.assertEqual(db.course_stats("CS146")["count"], 750)
+        self.assertEqual(db.count_in_range(50, 60, course_id="CS146"),
+                         sum(50 <= s.marks <= 60 for s in db.iter_course_wise("CS146")))
+        upload = {f"bulk{i}@sjsu.edu": {"marks": 100} for i in range(100)}
+        with self.assertRaises(ValueError):
+            db.update_students({**upload, "ghost@sjsu.edu": {"marks": 1}})
+        with self.assertRaises(ValueError):
+            db.update_students({"bulk0@sjsu.edu": {"gpa": 4}})
+        self.assertEqual(db.search_student_indexed("bulk5@sjsu.edu")[0].marks, 5)
+        self.assertEqual(db.update_students(upload), 100)
+        self.assertEqual(db.search_student_indexed("bulk5@sjsu.edu")[0].grade, grade_from_marks(100))
+        self.assertEqual(db.bottom_n(1, by="name")[0].last_name, min(s.last_name for s in db.students))
+        marks = sorted(s.marks for s in db.iter_course_wise("CS146"))
+        self.assertEqual(db.course_stats("CS146")["median"], statistics.median(marks))
+        with self.assertRaises(ValueError):
+            db.delete_students(["bulk0@sjsu.edu", "ghost@sjsu.edu"])
+        self.assertEqual(db.delete_students([f"bulk{i}@sjsu.edu" for i in range(200)] + ["ghost@sjsu.edu"],
+                                            missing_ok=True), 200)
+        self.assertEqual(db.course_stats("CS146"), before)
+        self.assertEqual(len(db.students_in_range(course_id="CS146")), 550)
+        jdb = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        jdb.load_all()
+        jdb.add_students([Student(f"j{i}@sjsu.edu", "J", "R", "DATA200", "", 70) for i in range(3)])
+        jdb.update_students([("j0@sjsu.edu", {"marks": 99}), ("j1@sjsu.edu", {"email_address": "j9@sjsu.edu"})])
+        jdb.delete_students(["j2@sjsu.edu"])
+        self.assertEqual(len(jdb.journal), 3)
+        again = CheckMyGradeDB(self.tmp.name, journal=True, **self.db_kwargs)
+        again.load_all()
+        self.assertEqual(len(again.students), 1102)
+        self.assertEqual(again.search_student_indexed("j0@sjsu.edu")[0].marks, 99)
+        self.assertIsNotNone(again.search_student_indexed("j9@sjsu.edu")[0])
+        self.assertIsNone(again.search_student_indexed("j2@sjsu.edu")[0])
+
+    def test_sharded_students(self):
+        db = CheckMyGradeDB(self.tmp.name, sharded=True, **self.db_kwargs)
+        db.load_all()  # no manifest yet: falls back to students.csv
+        self.assertEqual(len(db.students), 1100)
+        db.save_all()
+        manifest = json.loads((db.shard_dir / "manifest.json").read_text())["shards"]
+        self.assertEqual({c: e["rows"] for c, e in manifest.items()}, {"DATA200": 550, "CS146": 550})
+        cs_file, ds_file = db.shard_dir / "CS146.csv", db.shard_dir / "DATA200.csv"
+        cs_mtime = cs_file.stat().st_mtime_ns
+        first = next(iter(db.iter_course_wise("DATA200"))).email_address
+        db.update_student(first, marks=12)
+        self.assertEqual(db.save_student_shards()["rows"], 550)  # only DATA200 is rewritten
+        self.assertEqual(cs_file.stat().st_mtime_ns, cs_mtime)
+        old = shards.PARALLEL_MIN_ROWS
+        shards.PARALLEL_MIN_ROWS = 0
+        try:
+            again = CheckMyGradeDB(self.tmp.name, sharded=True, **self.db_kwargs)
+            self.assertEqual(again.load_student_shards(workers=2)["rows"], 1100)
+        finally:
+            shards.PARALLEL_MIN_ROWS = old
+        self.assertEqual(again.search_student_indexed(first)[0].marks, 12)
+        for cid in ("DATA200", "CS146"):
+            self.assertEqual(again.course_stats(cid), db.course_stats(cid))
+            self.assertEqual(again.course_histogram(cid), db.course_histogram(cid))
+        cs = [s.email_address for s in again.iter_course_wise("CS146")]
+        again.update_students({e: {"marks": 0} for e in cs[:10]})
+        again.delete_student(cs[10])
+        self.assertEqual(again.load_course("CS146"), 550)
+        self.assertEqual(again.course_stats("CS146"), db.course_stats("CS146"))
+        self.assertEqual(len(again.students), 1100)
+        again.delete_students([s.email_address for s in list(again.iter_course_wise("DATA200"))])
+        again.save_all()
+        self.assertFalse(ds_file.exists())
+        self.assertEqual(list(json.loads((db.shard_dir / "manifest.json").read_text())["shards"]), ["CS146"])
+
+    def test_name_search(self):
+        db = self.db
+        nguyens = [s.email_address for s in db.students if s.last_name == "Nguyen"]
+        hits = db.search_names("Ngu*", limit=5000)
+        self.assertEqual(sorted(s.email_address for s, _ in hits), sorted(nguyens))
+        self.assertEqual(len(db.search_names("ngu", limit=7)), 7)
+        both = db.search_names("sam carp", limit=5000)
+        self.assertEqual(len(both), sum(s.first_name == "Sam" and s.last_name == "Carpenter" for s in db.students))
+        top, score = db.fuzzy_search_names("Carpentr", limit=3)[0]
+        self.assertEqual(top.last_name, "Carpenter")
+        self.assertGreater(score, 0.5)
+        self.assertEqual(db.fuzzy_search_names("Qqqxz"), [])
+        # exact words outrank longer ones sharing the prefix
+        db.add_student(Student("kimberly@sjsu.edu", "Kimberly", "Stone", "CS146", "", 80))
+        ranked = db.search_names("kim", limit=2000)
+        self.assertEqual(ranked[-1][0].email_address, "kimberly@sjsu.edu")
+        self.assertEqual(ranked[0][1], 1.0)
+        self.assertEqual(db.complete_name("Ki"), ["Kim", "Kimberly"])
+        # the index follows writes
+        db.update_student("kimberly@sjsu.edu", last_name="Zabriskie")
+        self.assertEqual([s.email_address for s, _ in db.search_names("Zabr*")], ["kimberly@sjsu.edu"])
+        self.assertEqual(db.search_names("Stone"), [])
+        db.delete_student("kimberly@sjsu.edu")
+        self.assertEqual(db.search_names("Zabr"), [])
+        self.assertEqual(db.complete_name("Ki"), ["Kim"])
+        db.load_all()
+        self.assertEqual(len(db.search_names("Ngu", limit=5000)), len(nguyens))
+
+    def test_batch_apply(self):
+        data200 = [s.email_address for s in self.db.report_course_wise("DATA200")]
+        lines = [json.dumps({"op": "update_student", "args": {"email": e, "marks": 100}}) for e in data200[:300]]
+        lines += [json.dumps({"op": "add_student", "args": {"email_address": f"b{i}@sjsu.edu", "first_name": "B",
+                                                           "last_name": "A", "course_id": "CS146", "marks": 60}})
+                  for i in range(5)]
+        lines += ["", "# comment", "{not json",
+                  json.dumps({"op": "update_student", "args": {"email": "nobody@sjsu.edu", "marks": 1}}),
+                  json.dumps({"op": "delete_student", "args": {"email": "b0@sjsu.edu"}}),
+                  json.dumps({"op": "delete_student", "args": {"email": "b0@sjsu.edu"}}),
+                  json.dumps({"op": "no_such_op"}),
+                  json.dumps({"op": "count_in_range", "args": {"lo": 100, "course_id": "DATA200"}})]
+        ops = self.tmp.name + "/ops.jsonl"
+        Path(ops).write_text("\n".join(lines) + "\n", encoding="utf-8")
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            rc = batch.main([ops, "--data-dir", self.tmp.name, "--batch-size", "128"])
+        self.assertEqual(rc, 1)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["op"], "count_in_range")
+        self.assertGreaterEqual(result["result"], 300)
+        self.assertEqual(err.getvalue().count("not found"), 2)
+        self.assertIn("not valid JSON", err.getvalue())
+        self.assertRegex(err.getvalue(), r"update_student\s+301\s+1\s")
+        again = CheckMyGradeDB(self.tmp.name)
+        again.load_all()
+        self.assertEqual(again.report_student(data200[0]).marks, 100)
+        self.assertEqual(len(again.students), 1104)
+        self.assertIsNone(again.report_student("b0@sjsu.edu"))
+        # a bad row only fails itself; the rest of its run still applies
+        runner = batch.BatchRunner(self.db)
+        tally = runner.run_all(batch.read_calls([
+            json.dumps({"op": "add_student", "args": {"email_address": "ok@sjsu.edu", "first_name": "O",
+                                                       "last_name": "K", "course_id": "CS146", "marks": 70}}),
+            json.dumps({"op": "add_student", "args": {"email_address": data200[1], "first_name": "D",
+                                                       "last_name": "Up", "course_id": "CS146", "marks": 70}})]))
+        self.assertEqual(tally["add_student"]["count"], 2)
+        self.assertEqual(tally["add_student"]["errors"], 1)
+        self.assertIsNotNone(self.db.report_student("ok@sjsu.edu"))
+
     def test_encryption(self):
         token = encrypt_password("Welcome12#_")
         plain = decrypt_password(token)
         self.assertEqual(plain, "Welcome12#_")
+        for scheme, cost in (("pbkdf2_sha256", 1000), ("scrypt", 2 ** 10)):
+            hashed = hash_password("Welcome12#_", scheme, cost)
+            self.assertTrue(verify_password(hashed, "Welcome12#_"))
+            self.assertFalse(verify_password(hashed, "welcome12#_"))
+
+class CompactCheckMyGradeTests(CheckMyGradeTests):
+    # same suite against the column store
+    db_kwargs = {"compact": True}
+
+    def test_views_write_through(self):
+        s, _ = self.db.search_student_indexed(self.db.students[3].email_address)
+        self.assertNotIsInstance(s, Student)
+        self.assertTrue(self.db.update_student(s.email_address, marks=91, last_name="Quinn"))
+        again, _ = self.db.search_student_indexed(s.email_address)
+        self.assertEqual((again.marks, again.grade, again.last_name), (91, "A-", "Quinn"))
+        self.assertEqual(again, again.to_student())
+
+    def test_out_of_range_marks_leave_no_row(self):
+        n, course = len(self.db.students), self.db.students[0].course_id
+        with self.assertRaises(ValueError):
+            self.db.add_student(Student("big@x.edu", "Big", "Marks", course, "", 40000))
+        self.assertEqual(len(self.db.students), n)
+        self.assertIsNone(self.db.search_student_indexed("big@x.edu")[0])
+        self.assertNotIn("big@x.edu", [s.email_address for s in self.db.students])
+        self.db.add_student(Student("ok@x.edu", "Ok", "Marks", course, "", 80))
+        self.assertEqual(self.db.search_student_indexed("ok@x.edu")[0].marks, 80)
+
+    def test_bulk_out_of_range_marks_change_nothing(self):
+        n, stats = len(self.db.students), self.db.course_stats("CS146")
+        with self.assertRaises(ValueError):
+            self.db.add_students([Student("b1@x.edu", "B", "One", "CS146", "", 70),
+                                  Student("b2@x.edu", "B", "Two", "CS146", "", 40000)])
+        self.assertEqual(len(self.db.students), n)
+        self.assertEqual(sum(1 for _ in self.db.students), n)
+        self.assertIsNone(self.db.search_student_indexed("b1@x.edu")[0])
+        self.assertEqual(self.db.course_stats("CS146"), stats)
+        first, last = (s.email_address for s in self.db.report_course_wise("CS146")[:2])
+        before = self.db.search_student_indexed(first)[0].marks
+        with self.assertRaises(ValueError):
+            self.db.update_students([(first, {"marks": 70 if before != 70 else 71}), (last, {"marks": -40000})])
+        self.assertEqual(self.db.search_student_indexed(first)[0].marks, before)
+        self.assertEqual(self.db.course_stats("CS146"), stats)
+
+class ConcurrencyTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = bench.make_db(500, self.tmp.name, courses=5)
+        self.shared = SharedDB(self.db)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rwlock(self):
+        lock = RWLock()
+        with lock.write():
+            with lock.write(), lock.read():
+                pass
+        readers, writers = [], []
+
+        def read():
+            with lock.read():
+                readers.append(1)
+
+        def write():
+            with lock.write():
+                writers.append(1)
+        with lock.read():
+            with lock.read():
+                pass
+            self.assertRaises(RuntimeError, lock.acquire_write)
+            t = threading.Thread(target=read)
+            t.start(); t.join(1)
+            self.assertEqual(readers, [1])   # readers share the lock
+            t = threading.Thread(target=write)
+            t.start(); t.join(0.1)
+            self.assertEqual(writers, [])    # the writer waits for the last reader
+        t.join(1)
+        self.assertEqual(writers, [1])
+
+    def test_shared_db_threads(self):
+        errors = []
+
+        def worker(k):
+            try:
+                for i in range(200):
+                    email = f"student{(k * 37 + i) % 500}@mycsu.edu"
+                    if i % 10 == 0:
+                        self.shared.update_student(email, marks=i % 101)
+                    else:
+                        self.shared.student_rank(email)
+                        self.shared.top_n(5, by="name")
+                        self.assertIsInstance(self.shared.iter_course_wise("C001"), list)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.db.count_in_range(), 500)
+        self.assertEqual(sum(a.count for a in self.db._course_aggs.values()), 500)
+
+    def test_http_api_and_load(self):
+        server = make_server(self.shared, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=10)
+
+            def post(path, body):
+                conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+                r = conn.getresponse()
+                return r.status, json.loads(r.read())
+
+            self.assertEqual(post("/call", {"op": "get_student", "args": {"email": "student3@mycsu.edu"}})[1]
+                             ["result"]["email_address"], "student3@mycsu.edu")
+            self.assertEqual(post("/call", {"op": "nope"})[0], 404)
+            self.assertEqual(post("/call", {"op": "add_student", "args": {"email_address": "x@mycsu.edu"}})[0], 400)
+            status, out = post("/batch", [
+                {"op": "add_student", "args": {"email_address": "new@mycsu.edu", "first_name": "N",
+                                               "last_name": "W", "course_id": "C001", "marks": 88}},
+                {"op": "get_student", "args": {"email": "new@mycsu.edu"}},
+                {"op": "course_stats", "args": {"course_id": "C001"}},
+                {"op": "bogus"},
+                {"op": "report_course", "args": {"key": "C001", "page": 0, "page_size": 3}},
+            ])
+            self.assertEqual(status, 200)
+            self.assertTrue(out[0]["result"])
+            self.assertEqual(out[1]["result"]["grade"], grade_from_marks(88))
+            self.assertEqual(out[2]["result"]["count"], 101)
+            self.assertIn("error", out[3])
+            self.assertEqual(len(out[4]["result"]), 3)
+            # an unexpected exception is a 500 with a JSON body, and the connection stays usable
+            with mock.patch.dict(OPS, {"boom": (False, lambda db: 1 / 0)}), \
+                    contextlib.redirect_stderr(io.StringIO()):
+                status, out = post("/call", {"op": "boom"})
+                self.assertEqual((status, out["internal"]), (500, True))
+                self.assertIn("ZeroDivisionError", out["error"])
+                status, out = post("/batch", [{"op": "boom"}, {"op": "course_stats", "args": {"course_id": "C001"}}])
+                self.assertEqual(status, 200)
+                self.assertTrue(out[0]["internal"])
+                self.assertEqual(out[1]["result"]["count"], 101)
+            conn.request("GET", "/health")
+            self.assertEqual(json.loads(conn.getresponse().read())["students"], 501)
+            conn.close()
+            r = run_load(f"http://127.0.0.1:{server.server_port}", clients=3, duration=0.3, batch=4)
+            self.assertGreater(r["ops"], 0)
+            self.assertEqual(r["errors"], 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(run_batch(self.shared, [{"op": "delete_student", "args": {"email": "new@mycsu.edu"}}]),
+                         [{"result": True}])
+
+class SqliteBackendTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mem = bench.make_db(600, self.tmp.name, courses=6)
+        self.mem.register_user("prof1@mycsu.edu", "Welcome12#_", role="professor")
+        self.mem.save_all()
+        self.db = open_db(self.tmp.name, "sqlite")
+        self.counts = self.db.migrate_from_csv()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    @staticmethod
+    def rows(students):
+        return [(s.email_address, s.grade, s.marks) for s in students]
+
+    def test_migrate_and_queries_match_memory(self):
+        self.assertIsInstance(self.db, SqliteCheckMyGradeDB)
+        self.assertEqual((self.counts["students"], self.counts["courses"], self.counts["login_users"]), (600, 6, 1))
+        self.assertEqual(len(self.db.students), 600)
+        for by in ("email", "marks", "name", "grade"):
+            for asc in (True, False):
+                self.assertEqual(self.rows(self.db.students_page(2, 15, by, asc)),
+                                 self.rows(self.mem.students_page(2, 15, by, asc)))
+                self.assertEqual(self.rows(self.db.students_page(0, 15, by, asc, "C002")),
+                                 self.rows(self.mem.students_page(0, 15, by, asc, "C002")))
+        self.assertEqual(self.rows(self.db.top_n(5)), self.rows(self.mem.top_n(5)))
+        self.assertEqual(self.rows(self.db.students_in_range(40, 60, "C001")),
+                         self.rows(self.mem.students_in_range(40, 60, "C001")))
+        self.assertEqual(self.db.count_above(70), self.mem.count_above(70))
+        for email in ("student3@mycsu.edu", "student250@mycsu.edu"):
+            self.assertEqual(self.db.student_rank(email), self.mem.student_rank(email))
+            self.assertEqual(self.db.student_percentile(email, "C004"), self.mem.student_percentile(email, "C004"))
+        for cid in ("C000", "C005", "missing"):
+            self.assertEqual(self.db.course_stats(cid), self.mem.course_stats(cid))
+            self.assertEqual(self.db.course_histogram(cid), self.mem.course_histogram(cid))
+            self.assertEqual(self.db.course_percentile(cid, 90), self.mem.course_percentile(cid, 90))
+            self.assertEqual(list(iter_course_report(self.db, cid, "csv")), list(iter_course_report(self.mem, cid, "csv")))
+        self.assertEqual(list(iter_professor_report(self.db, "prof2@mycsu.edu", "jsonl")),
+                         list(iter_professor_report(self.mem, "prof2@mycsu.edu", "jsonl")))
+        s, _ = self.db.search_student_linear("student9@mycsu.edu")
+        self.assertEqual(s, self.db.search_student_indexed("student9@mycsu.edu")[0])
+        self.db.sort_students("marks", ascending=False)
+        self.assertEqual(self.db.students[0].marks, max(s.marks for s in self.db.students))
+
+    def test_crud_bulk_and_grade_scale(self):
+        db = self.db
+        db.add_student(Student("new@mycsu.edu", "New", "Kid", "C001", "", 88))
+        self.assertEqual(db.report_student("new@mycsu.edu").grade, grade_from_marks(88))
+        with self.assertRaises(ValueError):
+            db.add_student(Student("new@mycsu.edu", "Dup", "Kid", "C001", "", 10))
+        self.assertTrue(db.update_student("new@mycsu.edu", email_address="renamed@mycsu.edu", marks=51))
+        self.assertIsNone(db.report_student("new@mycsu.edu"))
+        self.assertEqual(db.report_student("renamed@mycsu.edu").grade, grade_from_marks(51))
+        # bulk batches are all-or-nothing
+        with self.assertRaises(ValueError):
+            db.add_students([Student("b1@mycsu.edu", "B", "One", "C001", "", 70),
+                             Student("student1@mycsu.edu", "B", "Two", "C001", "", 70)])
+        self.assertIsNone(db.report_student("b1@mycsu.edu"))
+        with self.assertRaises(ValueError):
+            db.update_students({"student1@mycsu.edu": {"marks": 1}, "nobody@mycsu.edu": {"marks": 2}})
+        self.assertNotEqual(db.report_student("student1@mycsu.edu").marks, 1)
+        self.assertEqual(db.update_students({f"student{i}@mycsu.edu": {"marks": 100} for i in range(50)}), 50)
+        self.assertGreaterEqual(db.count_in_range(100, 100), 50)
+        self.assertEqual(db.delete_students(["student1@mycsu.edu", "nobody@mycsu.edu"], missing_ok=True), 1)
+        self.assertEqual(len(db.students), 600)
+        self.assertTrue(db.delete_student("renamed@mycsu.edu"))
+        db.add_course(Course("NEW1", "New", "", 3))
+        with self.assertRaises(ValueError):
+            db.add_course(Course("NEW1", "Again", "", 3))
+        self.assertTrue(db.update_course("NEW1", credits=4))
+        self.assertTrue(db.update_professor("prof0@mycsu.edu", rank="Professor"))
+        self.assertTrue(db.delete_professor("prof0@mycsu.edu"))
+        with self.assertRaises(ValueError):
+            db.add_student(Student("ghost@mycsu.edu", "Gh", "Ost", "NOPE1", "", 50))
+        with self.assertRaises(ValueError):
+            db.delete_course("C000")
+        before, members = len(db.students), db.course_stats("C000")["count"]
+        self.assertTrue(db.delete_course("C000", on_delete="cascade"))
+        self.assertEqual(len(db.students), before - members)
+        # per-course scale regrades in SQL and survives a reopen
+        n = db.set_grade_scale("C003", [GradeRange("C003", "A", 50, 100), GradeRange("C003", "F", 0, 49)])
+        self.assertEqual(n, db.course_stats("C003")["count"])
+        self.assertEqual(set(s.grade for s in db.iter_course_wise("C003")), {"A", "F"})
+        db.save_all()
+        db.close()
+        self.db = db = SqliteCheckMyGradeDB(self.tmp.name)
+        self.assertEqual([r.grade for r in db.grade_scale("C003")], ["A", "F"])
+        self.assertEqual(db.course_histogram("C003")["A"], db.count_in_range(50, None, "C003"))
+        self.assertEqual([c.credits for c in db.courses if c.course_id == "NEW1"], [4])
+        db.export_csv()
+        back = CheckMyGradeDB(self.tmp.name)
+        back.load_all()
+        self.assertEqual(sorted(self.rows(back.students)), sorted(self.rows(db.students)))
+        self.assertEqual(len(back.professors), 5)
+
+    def test_name_search(self):
+        carp = self.db.search_names("Carp*", limit=1000)
+        self.assertEqual(len(carp), sum(s.last_name == "Carpenter" for s in self.mem.students))
+        self.assertEqual(self.db.fuzzy_search_names("Carpentr", limit=1)[0][0].last_name, "Carpenter")
+        self.db.add_student(Student("z@mycsu.edu", "Zed", "Zabriskie", "C001", "", 50))
+        self.assertEqual([s.email_address for s, _ in self.db.search_names("zabr")], ["z@mycsu.edu"])
+        self.db.delete_student("z@mycsu.edu")
+        self.assertEqual(self.db.search_names("zabr"), [])
+
+    def test_name_index_is_patched_not_rebuilt(self):
+        db = self.db
+        db.search_names("Carp")
+        names = db._names
+        db.add_students([Student("z@mycsu.edu", "Zed", "Zabriskie", "C001", "", 50),
+                         Student("y@mycsu.edu", "Yan", "Zabel", "C002", "", 60)])
+        db.update_student("z@mycsu.edu", email_address="zz@mycsu.edu", last_name="Quill")
+        db.update_students({"y@mycsu.edu": {"first_name": "Yara"}})
+        self.assertEqual([s.email_address for s, _ in db.search_names("quill")], ["zz@mycsu.edu"])
+        self.assertEqual([s.first_name for s, _ in db.search_names("zab")], ["Yara"])
+        self.assertEqual(db.search_names("yan"), [])
+        db.delete_students(["zz@mycsu.edu", "y@mycsu.edu"])
+        self.assertEqual(db.search_names("quill") + db.search_names("zab"), [])
+        self.assertIs(db._names, names)
+        self.assertEqual(names._postings, NameIndex(db.students.items(), db.students.get)._postings)
+        # a write rolled back by an enclosing transaction must not stay in the index
+        with self.assertRaises(RuntimeError), db._tx():
+            db.add_student(Student("r@mycsu.edu", "Rolled", "Back", "C001", "", 50))
+            raise RuntimeError
+        self.assertEqual(db.search_names("rolled"), [])
+
+    def test_result_cache_sees_other_connections(self):
+        stats = self.db.course_stats("C001")
+        self.assertEqual(self.db.course_stats("C001"), stats)
+        self.assertEqual(self.db.result_cache_stats()["hits"], 1)
+        other = SqliteCheckMyGradeDB(self.tmp.name)
+        other.add_student(Student("late@mycsu.edu", "La", "Te", "C001", "", 77))
+        other.close()
+        self.assertEqual(self.db.course_stats("C001")["count"], stats["count"] + 1)
+        with self.assertRaises(ValueError):
+            with self.db._tx():
+                self.db.delete_student("late@mycsu.edu")
+                self.assertEqual(self.db.course_stats("C001")["count"], stats["count"])
+                raise ValueError("roll back")
+        self.assertEqual(self.db.course_stats("C001")["count"], stats["count"] + 1)
+
+    def test_change_log(self):
+        with self.assertRaises(ValueError):
+            self.db.change_cursor()
+        self.db.close()
+        self.db = db = SqliteCheckMyGradeDB(self.tmp.name, change_log=50)
+        start = db.change_cursor()
+        self.assertEqual(db.changes_since(start["seq"], start["log_id"]), [])
+        db.add_student(Student("cdc@mycsu.edu", "Cee", "Dee", "C001", "", 75))
+        db.update_student("cdc@mycsu.edu", marks=30)
+        db.update_course("C002", credits=5)
+        other = SqliteCheckMyGradeDB(self.tmp.name)
+        other.delete_student("cdc@mycsu.edu")
+        other.close()
+        delta = db.changes_since(start["seq"], start["log_id"])
+        self.assertEqual([(c["op"], c["table"], c["key"]) for c in delta],
+                         [("insert", "students", "cdc@mycsu.edu"), ("update", "students", "cdc@mycsu.edu"),
+                          ("update", "courses", "C002"), ("delete", "students", "cdc@mycsu.edu")])
+        self.assertEqual(delta[0]["row"]["marks"], 75)
+        self.assertEqual(delta[1]["fields"], {"marks": 30, "grade": "F"})
+        self.assertEqual(delta[2]["fields"], {"credits": 5})
+        # the log is in the file, so a new connection resumes it
+        cursor = db.change_cursor()
+        db.close()
+        self.db = db = SqliteCheckMyGradeDB(self.tmp.name, change_log=50)
+        self.assertEqual(db.change_cursor(), cursor)
+        db.set_grade_scale("C003", [GradeRange("C003", "P", 0, 100)])
+        db.delete_course("C000", on_delete="cascade")
+        buf = io.StringIO()
+        again = db.export_changes(buf, cursor["seq"], cursor["log_id"])
+        self.assertTrue(again["snapshot"])
+        db.update_student("student3@mycsu.edu", first_name="Trey")
+        delta = db.changes_since(again["seq"], again["log_id"])
+        self.assertEqual([(c["op"], c["key"], c["fields"]) for c in delta],
+                         [("update", "student3@mycsu.edu", {"first_name": "Trey"})])
+        self.assertLessEqual(len(db._changes), 50)
+        # reloading the table starts a new log instead of logging the rows
+        db.load_students()
+        self.assertIsNone(db.changes_since(again["seq"]))
+        self.assertEqual(db.changes_since(db.change_cursor()["seq"]), [])
+        self.assertEqual(len(db._changes), 0)
+
+    def test_grade_scale_follows_course_rename_and_delete(self):
+        db = self.db
+        db.add_course(Course("TMP1", "Temp", "", 1))
+        db.set_grade_scale("TMP1", [GradeRange("TMP1", "P", 50, 100), GradeRange("TMP1", "F", 0, 49)])
+        self.assertTrue(db.update_course("TMP1", course_id="TMP2"))
+        self.assertEqual([r.grade for r in db.grade_scale("TMP2")], ["P", "F"])
+        db.add_student(Student("t@x.edu", "T", "Mp", "TMP2", "", 55))
+        self.assertEqual(db.report_student("t@x.edu").grade, "P")
+        self.assertTrue(db.delete_course("TMP2", on_delete="cascade"))
+        db.close()
+        self.db = db = SqliteCheckMyGradeDB(self.tmp.name)
+        self.assertEqual([r for r in db.grade_ranges if r.grade_id.startswith("TMP")], [])
+
+    def test_marks_are_parsed_like_memory(self):
+        for db in (self.db, self.mem):
+            db.add_student(Student("str@mycsu.edu", "S", "Tr", "C001", "", "85"))
+            db.update_student("str@mycsu.edu", marks="61")
+            db.update_students({"student4@mycsu.edu": {"marks": "77"}})
+            for bad in (lambda: db.add_student(Student("f@mycsu.edu", "F", "L", "C001", "", "85.0")),
+                        lambda: db.update_student("str@mycsu.edu", marks="high"),
+                        lambda: db.update_students({"student4@mycsu.edu": {"marks": "7.5"}})):
+                with self.assertRaises(ValueError):
+                    bad()
+        for email in ("str@mycsu.edu", "student4@mycsu.edu", "f@mycsu.edu"):
+            self.assertEqual(self.db.report_student(email), self.mem.report_student(email))
+        self.assertEqual(self.db.report_student("str@mycsu.edu").marks, 61)
+
+    def test_import_replaces_existing_rows_like_memory(self):
+        path = Path(self.tmp.name) / "dupes.csv"
+        path.write_text("Email_address,First_name,Last_name,Course.id,grades,Marks\n"
+                        "student4@mycsu.edu,Re,Placed,C001,,12\nc@x.edu,C,One,C001,,50\nc@x.edu,C,Two,C001,,55\n",
+                        encoding="utf-8")
+        self.assertEqual(self.db.import_students(path)["rows"], self.mem.import_students(path)["rows"])
+        self.assertEqual(sorted(self.rows(self.db.students)), sorted(self.rows(self.mem.students)))
+        self.assertEqual(self.db.course_stats("C001"), self.mem.course_stats("C001"))
+
+    def test_student_shards(self):
+        db = self.db
+        self.assertIsNone(db.load_student_shards())
+        self.assertEqual(db.save_student_shards()["rows"], 600)
+        self.assertEqual(sorted(shards.read_manifest(db.shard_dir)["shards"]), [f"C00{i}" for i in range(6)])
+        before = sorted(self.rows(db.students))
+        db.update_student("student1@mycsu.edu", marks=3)
+        db.delete_students([s.email_address for s in db.iter_course_wise("C002")])
+        self.assertEqual(db.load_course("C002"), 100)
+        self.assertEqual(db.report_student("student1@mycsu.edu").marks, 3)
+        self.assertEqual(db.load_student_shards()["rows"], 600)
+        self.assertEqual(sorted(self.rows(db.students)), before)
+        # the CSV backend reads what SQLite wrote
+        mem = CheckMyGradeDB(self.tmp.name, sharded=True)
+        mem.load_all()
+        self.assertEqual(sorted(self.rows(mem.students)), before)
+        db.delete_course("C005", on_delete="cascade")
+        db.save_student_shards()
+        self.assertNotIn("C005", shards.read_manifest(db.shard_dir)["shards"])
+
+    def test_login(self):
+        self.assertTrue(self.db.login("prof1@mycsu.edu", "Welcome12#_"))
+        self.assertTrue(self.db.login("prof1@mycsu.edu", "Welcome12#_"))
+        self.assertFalse(self.db.login("prof1@mycsu.edu", "nope"))
+        self.db.register_user("prof1@mycsu.edu", "Changed1!", role="professor")
+        self.assertFalse(self.db.login("prof1@mycsu.edu", "Welcome12#_"))
+        self.assertTrue(self.db.login("prof1@mycsu.edu", "Changed1!"))
+        self.assertEqual(len(self.db.login_users), 1)
+
+class BenchTests(unittest.TestCase):
+    def test_bench_run_and_compare(self):
+        result = bench.run([300], repeat=2, warmup=1, kdf_cost=1000)
+        ops = result["results"]["300"]
+        self.assertIn("search_indexed", ops)
+        self.assertIn("load_all", ops)
+        self.assertTrue(all(r["n"] == 2 and r["min"] <= r["p50"] <= r["max"] for r in ops.values()))
+        json.dumps(result)
+        self.assertEqual(bench.compare(result, result), [])
+        faster = json.loads(json.dumps(result))
+        faster["results"]["300"]["sort_name"]["p50"] /= 2
+        self.assertEqual([r["op"] for r in bench.compare(result, faster)], ["sort_name"])
 
 if __name__ == "__main__":
     unittest.main()